@@ -1,9 +1,10 @@
 from flask import Flask, request, jsonify
 import os
+import base64
 import dotenv
 from PIL import Image
 import numpy as np
-from src.support_cv import image_feed
+from src.support_cv import detect_ingredients, render_annotation, get_detection_cache, decode_image
 from src.support_etl import get_nutrients, get_supabase_client, process_recipes
 from src.support_recsys import get_filtered_recommendations
 
@@ -25,9 +26,26 @@ def process_image():
         return jsonify({"error": "No se encontró imagen en la solicitud"}), 400
     
     image_file = request.files['image']
-    image_pil = Image.open(image_file)
-    detected_items = image_feed(image_pil)
-    return jsonify({"detected_items": detected_items})
+    try:
+        image = decode_image(image_file.read())
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    detections = detect_ingredients(image)
+    response = {
+        "detected_items": detections["phrases"],
+        "boxes": detections["boxes"].tolist(),
+        "scores": detections["scores"].tolist()
+    }
+
+    # La imagen anotada solo se genera si se pide (?annotate=1), en memoria
+    if request.args.get('annotate') in ('1', 'true'):
+        annotated = render_annotation(image, detections)
+        response["annotated_image"] = base64.b64encode(annotated).decode("utf-8")
+    return jsonify(response)
+
+@app.route('/detection-cache-stats', methods=['GET'])
+def detection_cache_stats():
+    return jsonify(get_detection_cache().stats())
 
 @app.route('/get-nutrients', methods=['POST'])
 def get_nutritional_info():
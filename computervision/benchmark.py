@@ -0,0 +1,158 @@
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+import itertools
+import threading
+
+import cv2
+import numpy as np
+import pandas as pd
+import psutil
+import torch
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(project_root)
+os.chdir(project_root)
+
+from src.support_cv import transform_image, get_detector, annotate, resolve_short_side
+
+CONFIG_KEYS = ["backend", "resolution", "box_threshold", "text_threshold", "threads", "batch_size"]
+
+
+class PeakRSS:
+    """Muestrea la memoria residente del proceso en segundo plano y guarda el máximo."""
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._process = psutil.Process()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self._process.memory_info().rss)
+            time.sleep(self.interval)
+
+    def __enter__(self):
+        self.peak = self._process.memory_info().rss
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def percentiles(values, prefix):
+    values = np.asarray(values) * 1000
+    return {f"{prefix}_p50_ms": np.percentile(values, 50), f"{prefix}_p90_ms": np.percentile(values, 90),
+            f"{prefix}_p99_ms": np.percentile(values, 99)}
+
+
+def run_config(detector, frames, backend, resolution, box_threshold, text_threshold, threads, batch_size, runs):
+    """Ejecuta una configuración y devuelve un registro con latencias por etapa, imágenes/s y pico de RSS."""
+    torch.set_num_threads(threads)
+    stages = {"transform": [], "predict": [], "annotate": []}
+    n_images = 0
+
+    with PeakRSS() as rss:
+        start_total = time.perf_counter()
+        for _ in range(runs):
+            for i in range(0, len(frames), batch_size):
+                batch = frames[i:i + batch_size]
+
+                start = time.perf_counter()
+                # Se clona el tensor: la ruta rápida reutiliza el mismo buffer en cada llamada
+                prepared = [transform_image(frame, resolution=resolution) for frame in batch]
+                prepared = [(rgb, tensor.clone()) for rgb, tensor in prepared]
+                stages["transform"].append((time.perf_counter() - start) / len(batch))
+
+                start = time.perf_counter()
+                if batch_size > 1:
+                    outputs = detector.predict_batch([t for _, t in prepared], box_threshold, text_threshold)
+                else:
+                    outputs = [detector.predict(prepared[0][1], box_threshold=box_threshold, text_threshold=text_threshold)]
+                stages["predict"].append((time.perf_counter() - start) / len(batch))
+
+                start = time.perf_counter()
+                for (rgb, _), (boxes, logits, phrases) in zip(prepared, outputs):
+                    annotate(image_source=rgb, boxes=boxes, logits=logits, phrases=phrases)
+                stages["annotate"].append((time.perf_counter() - start) / len(batch))
+                n_images += len(batch)
+        total = time.perf_counter() - start_total
+
+    record = {"backend": backend, "resolution": resolve_short_side(resolution), "box_threshold": box_threshold,
+              "text_threshold": text_threshold, "threads": threads, "batch_size": batch_size}
+    for name, values in stages.items():
+        record.update(percentiles(values, name))
+    record["images_per_sec"] = n_images / total
+    record["peak_rss_mb"] = rss.peak / 2**20
+    return record
+
+
+def compare(baseline_path, candidate_path):
+    """Compara dos ficheros de resultados configuración a configuración."""
+    read = lambda path: pd.read_csv(path) if path.endswith(".csv") else pd.read_json(path)
+    base, cand = read(baseline_path), read(candidate_path)
+    merged = base.merge(cand, on=CONFIG_KEYS, suffixes=("_base", "_new"))
+    if merged.empty:
+        print("No hay configuraciones comunes entre los dos ficheros.")
+        return
+    for metric in ["predict_p50_ms", "images_per_sec", "peak_rss_mb"]:
+        merged[f"{metric}_delta_%"] = (merged[f"{metric}_new"] / merged[f"{metric}_base"] - 1) * 100
+    columns = CONFIG_KEYS[1:] + [c for c in merged.columns if c.endswith("_delta_%")]
+    print(merged[columns].to_string(index=False, float_format="%.1f"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark en CPU de transform_image + predict + annotate.")
+    parser.add_argument("--images", default=os.path.join("computervision", "test.jpg"), help="Patrón glob de imágenes")
+    parser.add_argument("--backend", default="torch", choices=["torch", "onnx"])
+    parser.add_argument("--resolutions", nargs="+", default=["fast", "balanced", "full"])
+    parser.add_argument("--box-thresholds", type=float, nargs="+", default=[0.30])
+    parser.add_argument("--text-thresholds", type=float, nargs="+", default=[0.25])
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--output", default=os.path.join("computervision", "benchmark_results.json"),
+                        help="Fichero .json o .csv de resultados")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NUEVO"), help="Compara dos ficheros de resultados (.json o .csv)")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    frames = [cv2.imread(path) for path in sorted(glob.glob(args.images))]
+    detector = get_detector(args.backend)
+    if args.backend == "onnx" and max(args.batch_sizes) > 1:
+        print("El backend ONNX solo admite batch 1; se ignoran los demás tamaños.")
+        args.batch_sizes = [1]
+
+    # Calentamiento
+    _, warm = transform_image(frames[0])
+    detector.predict(warm)
+
+    records = []
+    for resolution, box_t, text_t, threads, batch_size in itertools.product(
+            args.resolutions, args.box_thresholds, args.text_thresholds, args.threads, args.batch_sizes):
+        record = run_config(detector, frames, args.backend, resolution, box_t, text_t, threads, batch_size, args.runs)
+        records.append(record)
+        print(f"{resolution:>8} | box {box_t:.2f} text {text_t:.2f} | {threads} hilos | batch {batch_size} -> "
+              f"predict p50 {record['predict_p50_ms']:.0f} ms | {record['images_per_sec']:.2f} img/s | "
+              f"RSS {record['peak_rss_mb']:.0f} MiB")
+
+    df = pd.DataFrame(records)
+    if args.output.endswith(".csv"):
+        df.to_csv(args.output, index=False)
+    else:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(records, f, indent=2)
+    print(f"Resultados guardados en {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+import os
+import sys
+import glob
+import time
+import argparse
+import cv2
+import numpy as np
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(project_root)
+os.chdir(project_root)
+
+from src.support_cv import (preprocess_frame, get_detector, get_clip_prefilter, cascade_predict,
+                            BOX_THRESHOLD, TEXT_THRESHOLD)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara la cascada CLIP -> GroundingDINO con la detección en una etapa.")
+    parser.add_argument("--images", default=os.path.join("computervision", "*.jpg"), help="Patrón glob de imágenes")
+    parser.add_argument("--top-n", type=int, nargs="+", default=[5, 10, 15, 25])
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(args.images))
+    detector = get_detector("torch")
+    get_clip_prefilter()  # carga CLIP y los embeddings de texto fuera de la medición
+
+    # Línea base: GroundingDINO con el vocabulario completo
+    baseline, baseline_times = {}, []
+    for path in paths:
+        img = cv2.imread(path)
+        start = time.perf_counter()
+        _, _, phrases = detector.predict(preprocess_frame(img), box_threshold=BOX_THRESHOLD, text_threshold=TEXT_THRESHOLD)
+        baseline_times.append(time.perf_counter() - start)
+        baseline[path] = set(phrases)
+    base_ms = np.mean(baseline_times) * 1000
+    print(f"{len(paths)} imágenes | una etapa: {base_ms:.0f} ms/imagen")
+
+    for top_n in args.top_n:
+        found, total, times = 0, 0, []
+        for path in paths:
+            img = cv2.imread(path)
+            start = time.perf_counter()
+            _, _, phrases = cascade_predict(img, preprocess_frame(img), detector, top_n=top_n)
+            times.append(time.perf_counter() - start)
+            found += len(baseline[path] & set(phrases))
+            total += len(baseline[path])
+        recall = found / total if total else 1.0
+        cascade_ms = np.mean(times) * 1000
+        print(f"top-{top_n:<3} recall {recall:.3f} | {cascade_ms:.0f} ms/imagen | ahorro {base_ms - cascade_ms:+.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import os
+import sys
+import time
+import argparse
+import cv2
+import numpy as np
+import torch
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(project_root)
+os.chdir(project_root)
+
+from src.support_cv import (transform_image, get_detector, TEXT_PROMPT, ONNX_PATH,
+                            BOX_THRESHOLD, TEXT_THRESHOLD)
+from src.support_onnx import export_onnx
+
+
+def time_detector(detector, image, n_runs):
+    """Ejecuta el detector n_runs veces (más una de calentamiento) y devuelve la salida y los tiempos en ms."""
+    output = detector.predict(image, box_threshold=BOX_THRESHOLD, text_threshold=TEXT_THRESHOLD)
+    times = []
+    for _ in range(n_runs):
+        start = time.perf_counter()
+        detector.predict(image, box_threshold=BOX_THRESHOLD, text_threshold=TEXT_THRESHOLD)
+        times.append((time.perf_counter() - start) * 1000)
+    return output, np.array(times)
+
+
+def compare_outputs(torch_out, onnx_out, atol):
+    """Comprueba que boxes, logits y phrases coinciden entre ambos backends."""
+    boxes_t, logits_t, phrases_t = torch_out
+    boxes_o, logits_o, phrases_o = onnx_out
+    if len(phrases_t) != len(phrases_o):
+        print(f"Número de detecciones distinto: torch={len(phrases_t)} onnx={len(phrases_o)}")
+        return False
+    box_diff = (boxes_t - boxes_o).abs().max().item() if len(boxes_t) else 0.0
+    logit_diff = (logits_t - logits_o).abs().max().item() if len(logits_t) else 0.0
+    same_phrases = list(phrases_t) == list(phrases_o)
+    print(f"Máx. diferencia boxes: {box_diff:.2e} | logits: {logit_diff:.2e} | frases iguales: {same_phrases}")
+    return box_diff <= atol and logit_diff <= atol and same_phrases
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara el backend ONNX Runtime con el de PyTorch.")
+    parser.add_argument("--image", default=os.path.join("computervision", "test.jpg"))
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--atol", type=float, default=1e-3)
+    parser.add_argument("--export", action="store_true", help="Exporta (o re-exporta) el modelo ONNX antes de medir")
+    args = parser.parse_args()
+
+    torch_detector = get_detector("torch")
+    if args.export or not os.path.exists(ONNX_PATH):
+        export_onnx(torch_detector.model.to("cpu"), TEXT_PROMPT, ONNX_PATH)
+        torch_detector.device = "cpu"
+    onnx_detector = get_detector("onnx")
+
+    _, image = transform_image(cv2.imread(args.image))
+
+    with torch.no_grad():
+        torch_out, torch_times = time_detector(torch_detector, image, args.runs)
+    onnx_out, onnx_times = time_detector(onnx_detector, image, args.runs)
+
+    print(f"PyTorch: media {torch_times.mean():.1f} ms | p50 {np.percentile(torch_times, 50):.1f} ms")
+    print(f"ONNX:    media {onnx_times.mean():.1f} ms | p50 {np.percentile(onnx_times, 50):.1f} ms")
+    print(f"Speedup: x{torch_times.mean() / onnx_times.mean():.2f}")
+
+    ok = compare_outputs(torch_out, onnx_out, args.atol)
+    print("Salidas equivalentes" if ok else "Las salidas NO coinciden dentro de la tolerancia")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import os
+import sys
+import time
+import argparse
+import cv2
+import numpy as np
+from memory_profiler import memory_usage
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(project_root)
+os.chdir(project_root)
+
+from src.support_cv import preprocess_frame, transform_image_legacy, decode_image, RESOLUTION_PRESETS
+
+
+def measure(func, n_runs):
+    """Devuelve los tiempos en ms de n_runs llamadas y el pico de memoria (MiB) de una llamada."""
+    func()  # calentamiento (reserva de buffers)
+    times = []
+    for _ in range(n_runs):
+        start = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - start) * 1000)
+    peak = memory_usage((func, (), {}), interval=0.001, max_usage=True, include_children=False)
+    baseline = memory_usage(-1, interval=0.001, timeout=0.01, max_usage=True)
+    return np.array(times), peak - baseline
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara la decodificación y el preprocesado originales con las rutas rápidas.")
+    parser.add_argument("--image", default=os.path.join("computervision", "test.jpg"))
+    parser.add_argument("--runs", type=int, default=50)
+    args = parser.parse_args()
+
+    with open(args.image, "rb") as f:
+        data = f.read()
+
+    # Decodificación completa frente a decodificación reducida (JPEG draft + EXIF)
+    times, peak = measure(lambda: cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR), args.runs)
+    print(f"{'imdecode completo':<18} p50 {np.percentile(times, 50):7.2f} ms | p95 {np.percentile(times, 95):7.2f} ms | pico {peak:6.1f} MiB")
+    times, peak = measure(lambda: decode_image(data), args.runs)
+    print(f"{'decode_image':<18} p50 {np.percentile(times, 50):7.2f} ms | p95 {np.percentile(times, 95):7.2f} ms | pico {peak:6.1f} MiB")
+
+    frame = cv2.imread(args.image)
+    print(f"Imagen {args.image}: {frame.shape[1]}x{frame.shape[0]}")
+
+    # Diferencia numérica respecto al pipeline original a 800 px
+    _, legacy = transform_image_legacy(frame)
+    fast = preprocess_frame(frame, resolution="full")
+    if tuple(legacy.shape) == tuple(fast.shape):
+        print(f"Máx. diferencia con el pipeline original: {(legacy - fast).abs().max().item():.3f}")
+    else:
+        print(f"Formas distintas: original {tuple(legacy.shape)} vs rápida {tuple(fast.shape)}")
+
+    times, peak = measure(lambda: transform_image_legacy(frame), args.runs)
+    print(f"{'original (800)':<18} p50 {np.percentile(times, 50):7.2f} ms | p95 {np.percentile(times, 95):7.2f} ms | pico {peak:6.1f} MiB")
+
+    for name, short_side in RESOLUTION_PRESETS.items():
+        times, peak = measure(lambda: preprocess_frame(frame, resolution=name), args.runs)
+        label = f"{name} ({short_side})"
+        print(f"{label:<18} p50 {np.percentile(times, 50):7.2f} ms | p95 {np.percentile(times, 95):7.2f} ms | pico {peak:6.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
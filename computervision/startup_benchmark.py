@@ -0,0 +1,55 @@
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# Código que ejecuta cada proceso: carga el modelo, mide y espera para que convivan en memoria
+CHILD = """
+import os, sys, time, json, psutil
+os.chdir({root!r}); sys.path.append({root!r})
+start = time.perf_counter()
+from src.support_cv import initialize_model, BASE_DIR
+model, _ = initialize_model(BASE_DIR)
+elapsed = time.perf_counter() - start
+time.sleep({hold})
+info = psutil.Process().memory_full_info()
+print(json.dumps({{"seconds": elapsed, "rss": info.rss / 2**20, "uss": info.uss / 2**20,
+                  "pss": getattr(info, "pss", 0) / 2**20}}))
+"""
+
+
+def run(mmap, n_workers, hold):
+    env = dict(os.environ, cv_mmap_weights="1" if mmap else "0")
+    code = CHILD.format(root=project_root, hold=hold)
+    procs = [subprocess.Popen([sys.executable, "-c", code], env=env, stdout=subprocess.PIPE, text=True)
+             for _ in range(n_workers)]
+    results = []
+    for proc in procs:
+        out, _ = proc.communicate()
+        results.append(json.loads(out.strip().splitlines()[-1]))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tiempo de arranque y memoria con y sin pesos mapeados en memoria.")
+    parser.add_argument("--workers", type=int, default=2, help="Procesos simultáneos en el mismo host")
+    parser.add_argument("--hold", type=float, default=3.0, help="Segundos que cada proceso espera antes de medir")
+    args = parser.parse_args()
+
+    for mmap in (False, True):
+        results = run(mmap, args.workers, args.hold)
+        seconds = max(r["seconds"] for r in results)
+        rss = sum(r["rss"] for r in results)
+        uss = sum(r["uss"] for r in results)
+        pss = sum(r["pss"] for r in results)
+        label = "mmap" if mmap else "torch.load"
+        print(f"{label:<11} arranque {seconds:6.2f} s | RSS total {rss:7.0f} MiB | "
+              f"USS total {uss:7.0f} MiB | PSS total {pss:7.0f} MiB ({args.workers} procesos)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+import cv2
+import numpy as np
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(project_root)
+os.chdir(project_root)
+
+from src.support_cv import preprocess_frame, get_detector, tiled_detect, BOX_THRESHOLD, TEXT_THRESHOLD
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latencia y recall del modo por tiles frente a una sola pasada.")
+    parser.add_argument("--images", default=os.path.join("computervision", "*.jpg"), help="Patrón glob de imágenes")
+    parser.add_argument("--labels", help="JSON {ruta_imagen: [ingredientes]} con las etiquetas reales (opcional)")
+    parser.add_argument("--tile-sizes", type=int, nargs="+", default=[640, 800, 1024])
+    parser.add_argument("--overlaps", type=float, nargs="+", default=[0.1, 0.2])
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(args.images))
+    detector = get_detector()
+
+    runs = {}
+    single, times = {}, []
+    for path in paths:
+        img = cv2.imread(path)
+        start = time.perf_counter()
+        _, _, phrases = detector.predict(preprocess_frame(img), box_threshold=BOX_THRESHOLD, text_threshold=TEXT_THRESHOLD)
+        times.append(time.perf_counter() - start)
+        single[path] = set(phrases)
+    runs["una pasada"] = (single, np.mean(times) * 1000)
+
+    for tile_size in args.tile_sizes:
+        for overlap in args.overlaps:
+            found, times = {}, []
+            for path in paths:
+                img = cv2.imread(path)
+                start = time.perf_counter()
+                _, _, phrases = tiled_detect(img, detector, tile_size=tile_size, overlap=overlap)
+                times.append(time.perf_counter() - start)
+                found[path] = set(phrases)
+            runs[f"tiles {tile_size} / {overlap:.0%}"] = (found, np.mean(times) * 1000)
+
+    # Referencia: etiquetas reales si se dan; si no, la unión de todo lo detectado
+    if args.labels:
+        with open(args.labels, "r", encoding="utf-8") as f:
+            reference = {k: set(v) for k, v in json.load(f).items()}
+    else:
+        reference = {path: set().union(*(found[path] for found, _ in runs.values())) for path in paths}
+
+    total = sum(len(reference.get(path, ())) for path in paths)
+    for name, (found, ms) in runs.items():
+        hits = sum(len(found[path] & reference.get(path, set())) for path in paths)
+        recall = hits / total if total else 1.0
+        print(f"{name:<20} recall {recall:.3f} | {ms:7.0f} ms/imagen")
+
+
+if __name__ == "__main__":
+    main()
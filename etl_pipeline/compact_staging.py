@@ -0,0 +1,28 @@
+import os
+import sys
+import argparse
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(project_root)
+os.chdir(project_root)
+
+from src.support_staging import compact_staging, STAGING_TABLES, table_files
+
+STAGING_DIR = os.getenv("etl_staging_dir", os.path.join(project_root, "etl_staging"))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compacta el staging en Parquet del ETL (un fichero por partición y tabla). "
+                    "Lanzarlo sin workers del ETL escribiendo.")
+    parser.add_argument("--staging-dir", default=STAGING_DIR)
+    args = parser.parse_args()
+
+    before = {table: len(table_files(args.staging_dir, table)) for table in STAGING_TABLES}
+    compact_staging(args.staging_dir)
+    for table in STAGING_TABLES:
+        print(f"{table}: {before[table]} -> {len(table_files(args.staging_dir, table))} ficheros")
+
+
+if __name__ == "__main__":
+    main()
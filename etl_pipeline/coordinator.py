@@ -0,0 +1,98 @@
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+from datetime import datetime
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(project_root)
+os.chdir(project_root)
+
+from src.support_journal import ShardJournal, shard_of, journal_path, STAGES, FINAL_STAGES
+
+JOURNAL_DIR = os.getenv("etl_journal_dir", os.path.join(project_root, "etl_journal"))
+
+
+def shard_totals(file_path, n_shards):
+    """Número de URLs distintas de cada partición en el JSONL (lectura en streaming)."""
+    urls = [set() for _ in range(n_shards)]
+    with open(file_path, "rb") as file:
+        for line in file:
+            if line.strip():
+                url = json.loads(line)["url"]
+                urls[shard_of(url, n_shards)].add(url)
+    return [len(u) for u in urls]
+
+
+def status(totals, n_shards, journal_dir, window):
+    """Imprime el progreso y el ritmo de cada partición y del total (totals: de `shard_totals`)."""
+    header = f"{'shard':>5} | " + " | ".join(f"{s:>10}" for s in STAGES) + f" | {'total':>7} | {'%':>5} | {'rec/min':>7} | última"
+    print(header)
+    print("-" * len(header))
+    overall = dict.fromkeys(STAGES, 0)
+    overall_rate = 0.0
+    for shard in range(n_shards):
+        path = journal_path(journal_dir, shard, n_shards)
+        if os.path.exists(path):
+            journal = ShardJournal(path, readonly=True)
+            counts, rate, last = journal.counts(), journal.throughput(window), journal.last_update()
+            journal.close()
+        else:
+            counts, rate, last = dict.fromkeys(STAGES, 0), 0.0, None
+        done = sum(counts[s] for s in FINAL_STAGES)
+        pct = done / totals[shard] * 100 if totals[shard] else 100.0
+        last = datetime.fromtimestamp(last).strftime("%H:%M:%S") if last else "-"
+        print(f"{shard:>5} | " + " | ".join(f"{counts[s]:>10}" for s in STAGES)
+              + f" | {totals[shard]:>7} | {pct:>5.1f} | {rate:>7.1f} | {last}")
+        for s in STAGES:
+            overall[s] += counts[s]
+        overall_rate += rate
+    done = sum(overall[s] for s in FINAL_STAGES)
+    total = sum(totals)
+    pct = done / total * 100 if total else 100.0
+    print("-" * len(header))
+    print(f"{'total':>5} | " + " | ".join(f"{overall[s]:>10}" for s in STAGES)
+          + f" | {total:>7} | {pct:>5.1f} | {overall_rate:>7.1f} |")
+    if overall_rate:
+        print(f"Tiempo restante estimado: {(total - done) / overall_rate:.0f} min")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Coordinador del ETL particionado por hash de URL.")
+    parser.add_argument("command", choices=["run", "status"],
+                        help="run: lanza un worker por partición y muestra el progreso; status: solo el progreso")
+    parser.add_argument("--shards", type=int, default=4)
+    parser.add_argument("--file", default="recetas_scrapper/recetas_scrapper/spiders/data/dap.jsonl")
+    parser.add_argument("--journal-dir", default=JOURNAL_DIR)
+    parser.add_argument("--window", type=float, default=600, help="Ventana (s) para calcular el ritmo")
+    parser.add_argument("--interval", type=float, default=30, help="Segundos entre informes con 'run'")
+    args = parser.parse_args()
+
+    totals = shard_totals(args.file, args.shards)
+    if args.command == "status":
+        status(totals, args.shards, args.journal_dir, args.window)
+        return
+
+    etl = os.path.join(project_root, "etl_pipeline", "etl.py")
+    env = dict(os.environ, etl_journal_dir=args.journal_dir)
+    workers = [
+        subprocess.Popen([sys.executable, etl, "--shard", str(k), "--shards", str(args.shards),
+                          "--file", os.path.abspath(args.file)], env=env)
+        for k in range(args.shards)
+    ]
+    try:
+        while any(w.poll() is None for w in workers):
+            time.sleep(args.interval)
+            status(totals, args.shards, args.journal_dir, args.window)
+    except KeyboardInterrupt:
+        for w in workers:
+            w.terminate()
+    for k, w in enumerate(workers):
+        print(f"Partición {k}: código de salida {w.wait()}")
+    status(totals, args.shards, args.journal_dir, args.window)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+import os
+import sys
+import json
+import time
+import argparse
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(project_root)
+os.chdir(project_root)
+
+from src.support_dedup import DedupIndex
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Informe de las recetas casi duplicadas de un JSONL (MinHash LSH), sin tocar el índice del ETL.")
+    parser.add_argument("--file", default="recetas_scrapper/recetas_scrapper/spiders/data/dap.jsonl")
+    # El índice del ETL (etl_dedup_path) solo debe tener recetas cargadas: aquí se usa otro
+    parser.add_argument("--index", default=":memory:", help="SQLite donde guardar el índice del informe")
+    parser.add_argument("--threshold", type=float, default=0.8, help="Similitud de Jaccard mínima")
+    parser.add_argument("--verbose", action="store_true", help="Imprime cada pareja encontrada")
+    args = parser.parse_args()
+
+    index = DedupIndex(args.index, threshold=args.threshold)
+    n_records = n_duplicates = 0
+    start = time.perf_counter()
+    with open(args.file, "rb") as file:
+        for line in file:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            original, similarity = index.check(record)
+            n_records += 1
+            if original is not None:
+                n_duplicates += 1
+                if args.verbose:
+                    print(f"{record['url']} ~ {original} ({similarity:.2f})")
+            if n_records % 1000 == 0:
+                print(f"{n_records} recetas | {n_duplicates} casi duplicadas | "
+                      f"{(time.perf_counter() - start) / n_records * 1000:.2f} ms/receta")
+    elapsed = time.perf_counter() - start
+    print(f"{n_records} recetas | {n_duplicates} casi duplicadas | "
+          f"{elapsed / max(n_records, 1) * 1000:.2f} ms/receta | índice: {index.stats()}")
+    index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+import os
+import sys
+import argparse
+import dotenv
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(project_root)
+os.chdir(project_root)
+
+dotenv.load_dotenv()
+
+from src.support_etl import DeadLetterStore, DEAD_LETTERS_PATH, print_dead_letter_counts, process_dead_letters
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recetas fallidas del ETL: recuento por motivo y reprocesado.")
+    parser.add_argument("command", choices=["stats", "retry"])
+    parser.add_argument("--path", default=DEAD_LETTERS_PATH)
+    parser.add_argument("--reason", help="Solo las fallidas por este motivo (p. ej. edamam_555, parse)")
+    parser.add_argument("--max-attempts", type=int, help="Ignora las que ya han fallado este número de veces")
+    parser.add_argument("--translate-workers", type=int, default=2)
+    parser.add_argument("--enrich-workers", type=int, default=2)
+    parser.add_argument("--load-workers", type=int, default=1)
+    parser.add_argument("--batch-size", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.command == "stats":
+        dead_letters = DeadLetterStore(args.path)
+        print_dead_letter_counts(dead_letters)
+        dead_letters.close()
+        return
+
+    process_dead_letters(
+        reason=args.reason,
+        max_attempts=args.max_attempts,
+        translate_workers=args.translate_workers,
+        enrich_workers=args.enrich_workers,
+        load_workers=args.load_workers,
+        batch_size=args.batch_size,
+        dead_letters_path=args.path,
+    )
+
+
+if __name__ == "__main__":
+    main()
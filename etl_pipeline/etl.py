@@ -1,7 +1,7 @@
 import sys
 import os
+import argparse
 import dotenv
-from bs4 import BeautifulSoup
 
 
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
@@ -11,47 +11,49 @@ dotenv.load_dotenv()
 
 
 from src.support_etl import *
+from src.support_images import backfill_images
 
 # Configuración de rutas de archivos
 jsonl_file_path = "recetas_scrapper/recetas_scrapper/spiders/data/dap.jsonl"  # Ruta al archivo JSONL con las recetas
-leftoff_file_path = "dap_leftoff.json"  # Archivo para guardar el progreso del ETL
-
-# Crear archivo de progreso si no existe
-if not os.path.exists(leftoff_file_path):
-    with open(leftoff_file_path, "w", encoding="utf-8") as f:
-        f.write('{"Position": 0}')
+leftoff_file_path = "dap_leftoff.json"  # Archivo para guardar el progreso del ETL (se crea en la primera ejecución)
 
 def images():
-    supabase = get_supabase_client()
     print("Insertando imágenes faltantes")
-    n_img = 0
-    for e in supabase.table("recipes").select("url").is_("img_url", None).execute().data:
-        response = requests.get(e["url"])
-        soup = BeautifulSoup(response.content, 'html.parser')
-        img = soup.find('img')["src"]
-        supabase.table("recipes").update({"img_url": img}).eq("url", e["url"]).execute()
-        n_img += 1
-    print(f"Se han insertado {n_img} imágenes")
+    backfill_images(get_supabase_client())
 
 def main():
     """
     Función principal para ejecutar el proceso ETL de recetas.
+    - Con --shards K --shard k procesa solo la partición k (ver etl_pipeline/coordinator.py).
+    - --file: JSONL de entrada (por defecto, jsonl_file_path).
     """
-    images()    
+    parser = argparse.ArgumentParser(description="ETL de recetas (una partición si se indica --shards).")
+    parser.add_argument("--shard", type=int, default=0)
+    parser.add_argument("--shards", type=int, default=1)
+    parser.add_argument("--file", default=jsonl_file_path, help="JSONL con las recetas")
+    args = parser.parse_args()
+
+    # Las imágenes se rellenan una sola vez, desde la partición 0
+    if args.shard == 0:
+        images()
     try:
         print("Iniciando el proceso ETL...")
+        warm_translation_cache(get_supabase_client())
         
         # Ejecutar el proceso ETL
         process_recipes(
-            file_path=jsonl_file_path,
+            file_path=args.file,
             leftoff_path=leftoff_file_path,
+            shard=args.shard,
+            n_shards=args.shards,
         )
         
         print("Proceso ETL completado con éxito.")
     except Exception as e: 
         print(f"Error durante la ejecución del proceso ETL: {e}")
     except KeyboardInterrupt:
-        images()
+        if args.shard == 0:
+            images()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
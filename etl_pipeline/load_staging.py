@@ -0,0 +1,25 @@
+import os
+import sys
+import argparse
+import dotenv
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(project_root)
+os.chdir(project_root)
+
+dotenv.load_dotenv()
+
+from src.support_etl import STAGING_DIR, load_staging
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Carga en Supabase el staging en Parquet del ETL, sin llamar a Edamam ni a DeepL.")
+    parser.add_argument("--staging-dir", default=STAGING_DIR)
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    load_staging(args.staging_dir, batch_size=args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+-- Restricciones únicas que necesita la carga en bloque del ETL (BulkLoader en src/support_etl.py):
+-- sus upserts usan on_conflict sobre estas columnas y PostgREST rechaza el lote entero si no existen.
+-- Ejecutar una vez en el editor SQL de Supabase. Es idempotente.
+
+-- Columnas únicas de cada tabla que usa la carga (tabla, columnas separadas por comas)
+CREATE OR REPLACE FUNCTION public.etl_missing_constraints()
+RETURNS TABLE (missing text)
+LANGUAGE sql STABLE AS $$
+    SELECT t.tbl || '(' || t.cols || ')'
+    FROM (VALUES
+        ('recipes', 'url'),
+        ('ingredients', 'name'),
+        ('tags', 'name'),
+        ('steps', 'recipe_id'),
+        ('recipe_tags', 'recipe_id,tag_id'),
+        ('recipe_ingredients', 'recipe_id,ingredient_id')
+    ) AS t (tbl, cols)
+    WHERE NOT EXISTS (
+        -- Vale cualquier índice único (no parcial) sobre exactamente esas columnas, en cualquier orden
+        SELECT 1
+        FROM pg_index i
+        WHERE i.indrelid = ('public.' || t.tbl)::regclass
+          AND i.indisunique
+          AND i.indpred IS NULL
+          AND (SELECT string_agg(a.attname, ',' ORDER BY a.attname)
+               FROM pg_attribute a
+               WHERE a.attrelid = i.indrelid AND a.attnum = ANY (i.indkey))
+            = (SELECT string_agg(c, ',' ORDER BY c) FROM unnest(string_to_array(t.cols, ',')) AS c)
+    );
+$$;
+
+-- Las cargas fila a fila anteriores pudieron repetir pasos y relaciones: se queda una fila por clave
+DELETE FROM public.steps a USING public.steps b
+ WHERE a.recipe_id = b.recipe_id AND a.ctid < b.ctid;
+DELETE FROM public.recipe_tags a USING public.recipe_tags b
+ WHERE a.recipe_id = b.recipe_id AND a.tag_id = b.tag_id AND a.ctid < b.ctid;
+
+-- Un ingrediente repetido en una receta (dos líneas con el mismo ingrediente) era una fila por
+-- línea con su cantidad: se juntan en una sola con la suma, como hace la carga en bloque.
+-- El DELETE y el UPDATE de la misma sentencia ven la misma instantánea: la fila que se queda
+-- (min(ctid)) no se mueve antes de borrar las demás.
+WITH dups AS (
+    SELECT recipe_id, ingredient_id, min(ctid) AS keep, sum(amount) AS total
+    FROM public.recipe_ingredients
+    GROUP BY recipe_id, ingredient_id
+    HAVING count(*) > 1
+), removed AS (
+    DELETE FROM public.recipe_ingredients ri USING dups d
+     WHERE ri.recipe_id = d.recipe_id AND ri.ingredient_id = d.ingredient_id AND ri.ctid <> d.keep
+)
+UPDATE public.recipe_ingredients ri SET amount = d.total
+  FROM dups d
+ WHERE ri.ctid = d.keep;
+
+-- Crea las restricciones que falten (si recipes, ingredients o tags tienen nombres repetidos,
+-- este paso falla y hay que resolverlos a mano, porque hay relaciones que apuntan a ellos)
+DO $$
+DECLARE
+    m text;
+BEGIN
+    FOR m IN SELECT missing FROM public.etl_missing_constraints() LOOP
+        EXECUTE format('ALTER TABLE public.%I ADD UNIQUE (%s)', split_part(m, '(', 1), rtrim(split_part(m, '(', 2), ')'));
+    END LOOP;
+END $$;
+
+-- PostgREST tiene que ver la función nueva
+NOTIFY pgrst, 'reload schema';
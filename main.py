@@ -19,9 +19,9 @@ import random
 import streamlit_tags as stt
 
 # Importa tus módulos o funciones personalizadas
-from src.support_cv import image_feed
-from src.support_recsys import connect_supabase, get_filtered_recommendations
-from src.support_etl import translate_es_en, translate_en_es
+from src.support_cv import image_feed, decode_image, INGREDIENT_VOCAB
+from src.support_recsys import connect_supabase, get_filtered_recommendations, build_label_resolver, resolve_detections
+from src.support_etl import translate_es_en, translate_en_es, translate_many
 
 import pandas as pd
 import matplotlib.pyplot as plt
@@ -266,6 +266,11 @@ def get_food_options():
 
 food_options = get_food_options()
 
+@st.cache_resource(ttl=3600)
+def get_label_resolver(vocabulary):
+    # Se reconstruye si cambia el vocabulario del detector (argumento de la caché) o cada hora
+    return build_label_resolver(supabase, list(vocabulary))
+
 if 'detection_list' not in st.session_state:
     st.session_state.detection_list = []
 if 'last_uploaded_image' not in st.session_state:
@@ -348,16 +353,11 @@ with tab_reco:
         bytes_data = img_file_buffer.getvalue()
         if bytes_data != st.session_state.last_uploaded_image:
             try:
-                image = cv2.imdecode(np.frombuffer(bytes_data, np.uint8), cv2.IMREAD_COLOR)
+                image = decode_image(bytes_data)
                 detection_result = image_feed(image)  # Asume que da lista en inglés
-                # Traducir a ES
-                detection_checked_ind = supabase.table("ingredients").select("name").in_("name", detection_result).execute().data
-                l_ind = {a["name"] for a in detection_checked_ind}
-                detection_checked_coll = supabase.table("ingredients").select("name").in_("name", [p for l in detection_result for p in l.split()]).execute().data
-                l_coll = {b["name"] for b in detection_checked_coll}
-                elementos_unicos = l_ind | l_coll
-
-                detected_es = [translate_en_es(e) for e in elementos_unicos]
+                # Resolver a ingredientes de la base de datos (nombre en ES) en memoria
+                resolver = get_label_resolver(tuple(INGREDIENT_VOCAB))
+                detected_es = [ing["name_es"] for ing in resolve_detections(resolver, detection_result) if ing["name_es"]]
                 if not st.session_state.detection_list:
                     st.session_state.detection_list = detected_es
                 else:
@@ -422,7 +422,7 @@ with tab_recom:
             random.shuffle(filtered)
             st.session_state["recipe_data"] = filtered
         else:
-            es_to_en_ings = [translate_es_en(ing).strip().lower() for ing in st.session_state.selected_ingredients]
+            es_to_en_ings = [ing.strip().lower() for ing in translate_many(st.session_state.selected_ingredients, "es", "en")]
             for i in es_to_en_ings:
                 searched_id = supabase.table("searched_ingredient").select("id").eq("name", i).execute().data
                 if searched_id:
@@ -0,0 +1,61 @@
+import os
+import hashlib
+import cv2
+import torch
+from PIL import Image
+
+
+class ClipPrefilter:
+    """
+    Primera etapa de la cascada: CLIP (ViT-B/32) puntúa todo el vocabulario de ingredientes
+    y se queda con las N clases más probables para la imagen.
+    - Los embeddings de texto se calculan una sola vez y se guardan en disco, indexados por
+      un hash del vocabulario y del modelo, así que arrancar de nuevo no los recalcula.
+    """
+    def __init__(self, vocabulary, model_name="openai/clip-vit-base-patch32", cache_dir=None,
+                 prompt_template="a photo of {}", device="cpu"):
+        from transformers import CLIPModel, CLIPProcessor
+
+        self.vocabulary = list(vocabulary)
+        self.device = device
+        self.model = CLIPModel.from_pretrained(model_name).to(device).eval()
+        self.processor = CLIPProcessor.from_pretrained(model_name)
+        self.text_features = self._load_text_features(model_name, prompt_template, cache_dir)
+
+    def _load_text_features(self, model_name, prompt_template, cache_dir):
+        key = hashlib.md5("|".join([model_name, prompt_template] + self.vocabulary).encode()).hexdigest()[:12]
+        cache_path = os.path.join(cache_dir, f"clip_text_{key}.pt") if cache_dir else None
+        if cache_path and os.path.exists(cache_path):
+            return torch.load(cache_path, map_location=self.device)
+
+        prompts = [prompt_template.format(label) for label in self.vocabulary]
+        inputs = self.processor(text=prompts, return_tensors="pt", padding=True).to(self.device)
+        with torch.no_grad():
+            features = self.model.get_text_features(**inputs)
+        features = features / features.norm(dim=-1, keepdim=True)
+
+        if cache_path:
+            os.makedirs(cache_dir, exist_ok=True)
+            torch.save(features, cache_path)
+        return features
+
+    def scores(self, img):
+        """
+        Similitud (softmax sobre el vocabulario) de la imagen con cada ingrediente.
+
+        Args:
+            img (np.ndarray): imagen en BGR (OpenCV).
+        """
+        image_pil = Image.fromarray(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
+        inputs = self.processor(images=image_pil, return_tensors="pt").to(self.device)
+        with torch.no_grad():
+            image_features = self.model.get_image_features(**inputs)
+        image_features = image_features / image_features.norm(dim=-1, keepdim=True)
+        logits = self.model.logit_scale.exp() * image_features @ self.text_features.T
+        return logits.softmax(dim=-1)[0]
+
+    def top_n(self, img, n=15):
+        """Devuelve las n etiquetas del vocabulario más probables para la imagen."""
+        scores = self.scores(img)
+        indices = scores.topk(min(n, len(self.vocabulary))).indices.tolist()
+        return [self.vocabulary[i] for i in indices]
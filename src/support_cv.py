@@ -1,77 +1,317 @@
 import os
 import cv2
 import torch
-from PIL import Image
+from PIL import Image, ImageOps
+import io
 import sys
+import time
+import threading
 import numpy as np
 
 sys.path.append(r'GroundingDINO')
 
 # GroundingDINO imports
 from groundingdino.util.inference import load_model, predict, annotate, load_image
+from groundingdino.util.slconfig import SLConfig
+from groundingdino.util.utils import clean_state_dict
+from groundingdino.models import build_model
 import groundingdino.datasets.transforms as T
+import psutil
 
-def transform_image(frame):
+from src.support_detection_cache import DetectionCache, dhash
+
+# ====================================================
+# CONFIGURACIÓN DEL DETECTOR
+# ====================================================
+# Ruta base del proyecto
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# Backend de inferencia: "torch" (por defecto) u "onnx" (ONNX Runtime en CPU)
+CV_BACKEND = os.getenv("cv_backend", "torch")
+# Ruta del modelo exportado a ONNX y número de hilos intra-op (0 = los decide ONNX Runtime)
+ONNX_PATH = os.getenv("onnx_path", os.path.join(BASE_DIR, "GroundingDINO", "weights", "groundingdino_swint_ogc.onnx"))
+ONNX_THREADS = int(os.getenv("onnx_threads", "0"))
+
+# Carga de pesos con memory-map (el checkpoint se convierte una vez a un state_dict plano)
+CV_MMAP_WEIGHTS = os.getenv("cv_mmap_weights", "1") in ("1", "true")
+
+# Vocabulario de ingredientes que se pasa como caption a GroundingDINO
+TEXT_PROMPT = '''
+        potato, onion, garlic, carrot, tomato, lettuce, spinach, cucumber, zucchini, broccoli,
+        cauliflower, apple, banana, orange, lemon, grape, pear, peach, plum, watermelon, pineapple,
+        strawberry, blueberry, raspberry, blackberry, mango, kiwi, avocado, ginger, parsley, cilantro,
+        mint, rosemary, thyme, basil, bay leaf, chili pepper, mushroom, green bean, pea, brussels sprout,
+        kale, cabbage, celery, asparagus, leek, eggplant, radish, pumpkin, butternut squash,
+        okra, artichoke, corn, fig, date, papaya, lime, coconut, melon,
+        cantaloupe, peanut, almond, walnut, chia seed, sunflower seed, sesame seed, bread, pasta,
+        chicken, beef, pork, egg, ham, tofu, milk, yogurt, cheese, butter, tuna, salmon,
+        honey, jam, peanut butter, coffee, tea, chocolate, 
+        rice, lentil, chickpeas, black bean, bell pepper, sausage
+        '''
+BOX_THRESHOLD = 0.30
+TEXT_THRESHOLD = 0.25
+INGREDIENT_VOCAB = [label.strip() for label in TEXT_PROMPT.split(",") if label.strip()]
+
+# Cascada CLIP -> GroundingDINO: CLIP preselecciona las N clases más probables (solo backend torch)
+CV_CASCADE = os.getenv("cv_cascade", "0") in ("1", "true")
+CV_CASCADE_TOP_N = int(os.getenv("cv_cascade_top_n", "15"))
+CLIP_CACHE_DIR = os.path.join(BASE_DIR, "computervision", "cache")
+
+# Modo por tiles para fotos de alta resolución (objetos pequeños: ajos, especias, laurel...)
+CV_TILED = os.getenv("cv_tiled", "0") in ("1", "true")
+CV_TILE_SIZE = int(os.getenv("cv_tile_size", "800"))
+CV_TILE_OVERLAP = float(os.getenv("cv_tile_overlap", "0.2"))
+CV_TILE_WORKERS = int(os.getenv("cv_tile_workers", "2"))
+CV_TILE_MERGE = os.getenv("cv_tile_merge", "nms")  # "nms" o "wbf"
+
+# Pool de procesos de detección (0 = detección en el propio proceso)
+CV_POOL_WORKERS = int(os.getenv("cv_pool_workers", "0"))
+CV_POOL_THREADS = int(os.getenv("cv_pool_threads", "1"))
+
+# Caché de detecciones por hash perceptual (tamaño 0 = desactivada)
+CV_CACHE_SIZE = int(os.getenv("cv_cache_size", "256"))
+CV_CACHE_DISTANCE = int(os.getenv("cv_cache_distance", "4"))
+
+# Resolución de entrada (lado corto) del modelo. Presets: 512 (rápido), 640 (equilibrado), 800 (original)
+RESOLUTION_PRESETS = {"fast": 512, "balanced": 640, "full": 800}
+CV_RESOLUTION = os.getenv("cv_resolution", "full")
+
+# Límites de las imágenes subidas (bytes y megapíxeles) antes de decodificar
+CV_MAX_UPLOAD_BYTES = int(os.getenv("cv_max_upload_mb", "20")) * 2**20
+CV_MAX_PIXELS = int(float(os.getenv("cv_max_megapixels", "50")) * 1e6)
+
+# Normalización de ImageNet fusionada en una sola operación: x * scale + bias (sobre valores 0-255)
+_MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+_STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+_SCALE = 1.0 / (255.0 * _STD)
+_BIAS = -_MEAN / _STD
+
+# Pipeline original de GroundingDINO, construido una sola vez (se conserva como referencia)
+LEGACY_TRANSFORM = T.Compose(
+    [
+        T.RandomResize([800], max_size=1333),
+        T.ToTensor(),
+        T.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225]),
+    ]
+)
+
+# Buffers preasignados por hilo (para el último tamaño de salida)
+_buffers = threading.local()
+
+
+def resolve_short_side(resolution=None):
+    """
+    Traduce un preset ("fast", "balanced", "full") o un número a la longitud del lado corto.
+    """
+    resolution = resolution or CV_RESOLUTION
+    if isinstance(resolution, str):
+        resolution = RESOLUTION_PRESETS[resolution] if resolution in RESOLUTION_PRESETS else int(resolution)
+    return resolution
+
+
+def get_resize_shape(height, width, short_side=800, max_size=1333):
+    """
+    Calcula el tamaño de salida (alto, ancho) con la misma regla que `T.RandomResize`:
+    lado corto = short_side, sin que el lado largo supere max_size.
+    """
+    min_original = float(min(height, width))
+    max_original = float(max(height, width))
+    if max_original / min_original * short_side > max_size:
+        short_side = int(round(max_size * min_original / max_original))
+
+    if (width <= height and width == short_side) or (height <= width and height == short_side):
+        return height, width
+    if width < height:
+        return int(short_side * height / width), short_side
+    return short_side, int(short_side * width / height)
+
+
+def _get_buffers(out_h, out_w):
+    """
+    Devuelve (buffer uint8 HWC, buffer float32 CHW) reutilizables para este hilo y tamaño.
+    Solo se guarda el último tamaño de cada hilo: un proceso largo que recibe fotos de muchos
+    tamaños no acumula un par de buffers por tamaño (el vídeo repite siempre el mismo).
+    """
+    if getattr(_buffers, "shape", None) != (out_h, out_w):
+        _buffers.arrays = (
+            np.empty((out_h, out_w, 3), dtype=np.uint8),
+            np.empty((3, out_h, out_w), dtype=np.float32),
+        )
+        _buffers.shape = (out_h, out_w)
+    return _buffers.arrays
+
+
+def preprocess_frame(frame, resolution=None, rgb=False):
+    """
+    Ruta rápida de preprocesado: de un array uint8 (H, W, 3) al tensor normalizado del modelo.
+    - Un único resize con cv2 sobre un buffer preasignado.
+    - Normalización fusionada que a la vez reordena canales (BGR->RGB) y pasa de HWC a CHW,
+      escribiendo directamente en un buffer float32 preasignado.
+
+    Args:
+        frame (np.ndarray): imagen uint8 en BGR (OpenCV) o RGB si rgb=True.
+        resolution (str | int, optional): preset o lado corto. Por defecto, `CV_RESOLUTION`.
+        rgb (bool): indica que la imagen de entrada ya está en RGB.
+
+    Returns:
+        torch.Tensor: imagen (3, H', W') lista para el modelo. Comparte memoria con el buffer
+        del hilo, así que hay que clonarla si se quiere conservar tras la siguiente llamada.
+    """
+    short_side = resolve_short_side(resolution)
+    max_size = int(round(1333 * short_side / 800))
+    out_h, out_w = get_resize_shape(frame.shape[0], frame.shape[1], short_side, max_size)
+    resized, chw = _get_buffers(out_h, out_w)
+
+    if (out_h, out_w) == frame.shape[:2]:
+        resized = frame
+    else:
+        # INTER_AREA al reducir (equivalente al antialias de PIL), bilineal al ampliar
+        interpolation = cv2.INTER_AREA if out_h < frame.shape[0] else cv2.INTER_LINEAR
+        cv2.resize(frame, (out_w, out_h), dst=resized, interpolation=interpolation)
+
+    channel_order = (0, 1, 2) if rgb else (2, 1, 0)
+    for c, src_c in enumerate(channel_order):
+        np.multiply(resized[:, :, src_c], _SCALE[c], out=chw[c], casting="unsafe")
+        chw[c] += _BIAS[c]
+
+    return torch.from_numpy(chw)
+
+
+def decode_image(data, target_side=None, max_bytes=None, max_pixels=None):
+    """
+    Decodifica una imagen subida (bytes) directamente cerca de la resolución de trabajo.
+    - Rechaza ficheros o dimensiones por encima de los límites antes de decodificar.
+    - En JPEG usa `Image.draft` para que libjpeg decodifique a escala 1/2, 1/4 o 1/8, sin
+      pasar por la imagen completa de 12 MP; el lado corto nunca baja de target_side.
+    - Aplica la orientación EXIF (las fotos de móvil suelen venir giradas).
+
+    Args:
+        data (bytes): contenido del fichero.
+        target_side (int, optional): lado corto mínimo. Por defecto, la resolución del modelo
+            (o sin reducción si el modo por tiles está activo, que necesita el detalle).
+        max_bytes (int, optional): tamaño máximo del fichero. Por defecto, `CV_MAX_UPLOAD_BYTES`.
+        max_pixels (int, optional): número máximo de píxeles. Por defecto, `CV_MAX_PIXELS`.
+
+    Returns:
+        np.ndarray: imagen en BGR (OpenCV).
+
+    Raises:
+        ValueError: si el fichero supera los límites o no es una imagen válida (PIL no la
+            reconoce o está truncada).
+    """
+    max_bytes = max_bytes or CV_MAX_UPLOAD_BYTES
+    max_pixels = max_pixels or CV_MAX_PIXELS
+    if target_side is None and not CV_TILED:
+        target_side = resolve_short_side()
+
+    if len(data) > max_bytes:
+        raise ValueError(f"La imagen ocupa {len(data) / 2**20:.1f} MB (máximo {max_bytes / 2**20:.0f} MB)")
+
+    try:
+        image = Image.open(io.BytesIO(data))
+    except OSError as e:  # incluye PIL.UnidentifiedImageError
+        raise ValueError(f"El fichero no es una imagen válida: {e}") from e
+    width, height = image.size
+    if width * height > max_pixels:
+        raise ValueError(f"La imagen tiene {width * height / 1e6:.1f} MP (máximo {max_pixels / 1e6:.0f} MP)")
+
+    # Decodificación reducida en JPEG: tamaño pedido con el lado corto igual a target_side
+    if target_side and min(width, height) > target_side:
+        scale = target_side / min(width, height)
+        image.draft("RGB", (int(np.ceil(width * scale)), int(np.ceil(height * scale))))
+
+    try:
+        image = ImageOps.exif_transpose(image).convert("RGB")
+    except OSError as e:  # imagen truncada o corrupta
+        raise ValueError(f"No se pudo decodificar la imagen: {e}") from e
+    return cv2.cvtColor(np.asarray(image), cv2.COLOR_RGB2BGR)
+
+def transform_image(frame, resolution=None):
     """
     Transforma un frame de OpenCV (BGR) a formato de entrada del modelo GroundingDINO.
-    - Convierte el frame de BGR a RGB.
-    - Lo transforma a objeto PIL.
-    - Aplica las transformaciones de GroundingDINO (normalización, resize, etc.)
+    - Convierte el frame de BGR a RGB (para anotaciones posteriores).
+    - Aplica el preprocesado rápido (resize + normalización fusionada, ver `preprocess_frame`).
     
     Retorna:
         frame_rgb (np.ndarray): imagen en formato RGB (para anotaciones posteriores).
         image_transformed (torch.Tensor): imagen lista para ingresar al modelo.
     """
-    transform = T.Compose(
-        [
-            T.RandomResize([800], max_size=1333),
-            T.ToTensor(),
-            T.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225]),
-        ]
-    )
-
     # OpenCV usa BGR, convertimos a RGB
     frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
 
-    # Convertir a formato PIL
-    image_source = Image.fromarray(frame_rgb)
-
     # Aplicar las transformaciones
-    image_transformed, _ = transform(image_source, None)
+    image_transformed = preprocess_frame(frame_rgb, resolution=resolution, rgb=True)
 
     return frame_rgb, image_transformed
 
-def transform_pil_image(image_pil):
+def transform_image_legacy(frame):
+    """
+    Versión original de `transform_image` (cv2 -> PIL -> RandomResize -> ToTensor -> Normalize).
+    Se mantiene como referencia para comparar precisión y rendimiento.
+    """
+    frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    image_source = Image.fromarray(frame_rgb)
+    image_transformed, _ = LEGACY_TRANSFORM(image_source, None)
+    return frame_rgb, image_transformed
+
+def transform_pil_image(image_pil, resolution=None):
     """
     Transforma una imagen PIL a formato de entrada del modelo GroundingDINO.
-    - Aplica las transformaciones de GroundingDINO (normalización, resize, etc.)
+    - Aplica el preprocesado rápido (resize + normalización fusionada).
     
     Args:
         image_pil (PIL.Image.Image): Imagen en formato PIL.
+        resolution (str | int, optional): preset o lado corto.
 
     Returns:
         image_rgb (np.ndarray): Imagen en formato RGB (para anotaciones posteriores).
         image_transformed (torch.Tensor): Imagen lista para ingresar al modelo.
     """
-    transform = T.Compose([
-        T.RandomResize([800], max_size=1333),
-        T.ToTensor(),
-        T.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225]),
-    ])
-
     # Convertir PIL a NumPy array (para anotaciones posteriores)
-    image_rgb = np.array(image_pil)
+    image_rgb = np.asarray(image_pil.convert("RGB"))
 
     # Aplicar las transformaciones
-    image_transformed, _ = transform(image_pil, None)
+    image_transformed = preprocess_frame(image_rgb, resolution=resolution, rgb=True)
 
     return image_rgb, image_transformed
 
+def convert_checkpoint_for_mmap(weights_path, mmap_path):
+    """
+    Convierte una sola vez el checkpoint de GroundingDINO a un state_dict plano (solo tensores,
+    formato zip de torch) que se puede abrir con `torch.load(mmap=True, weights_only=True)`.
+    """
+    checkpoint = torch.load(weights_path, map_location="cpu")
+    state_dict = {k: v.contiguous() for k, v in clean_state_dict(checkpoint["model"]).items()}
+    tmp_path = mmap_path + ".tmp"
+    torch.save(state_dict, tmp_path)
+    os.replace(tmp_path, mmap_path)
+    print(f"Checkpoint convertido para memory-map en {mmap_path}")
+
+def load_model_mmap(config_path, weights_path, device="cpu"):
+    """
+    Construye GroundingDINO con los pesos mapeados en memoria.
+    - Los tensores apuntan al fichero mapeado (load_state_dict con assign=True), así que
+      no se copian al heap y varios procesos del mismo host comparten la page cache.
+    """
+    mmap_path = os.path.splitext(weights_path)[0] + ".mmap.pt"
+    if not os.path.exists(mmap_path):
+        convert_checkpoint_for_mmap(weights_path, mmap_path)
+
+    args = SLConfig.fromfile(config_path)
+    args.device = device
+    model = build_model(args)
+    state_dict = torch.load(mmap_path, map_location="cpu", mmap=True, weights_only=True)
+    model.load_state_dict(state_dict, strict=False, assign=True)
+    model.eval()
+    return model.to(device)
+
 def initialize_model(base_dir):
     """
     Inicializa el modelo GroundingDINO.
     - Carga configuraciones y pesos desde las rutas especificadas.
     - Detecta si existe GPU, en caso contrario usa CPU.
+    - Con `CV_MMAP_WEIGHTS`, los pesos se mapean en memoria en lugar de leerse con torch.load.
+    - Muestra el tiempo de arranque y la memoria residente del proceso.
     
     Retorna:
         model (nn.Module): modelo de GroundingDINO listo para predecir.
@@ -85,10 +325,28 @@ def initialize_model(base_dir):
     print(f"Utilizando dispositivo: {device}")
 
     # Carga el modelo
-    model = load_model(config_path, weights_path, device=device)
+    start = time.perf_counter()
+    if CV_MMAP_WEIGHTS:
+        model = load_model_mmap(config_path, weights_path, device=device)
+    else:
+        model = load_model(config_path, weights_path, device=device)
+    rss = psutil.Process().memory_info().rss / 2**20
+    print(f"Modelo cargado en {time.perf_counter() - start:.2f} s (RSS {rss:.0f} MiB, mmap={CV_MMAP_WEIGHTS})")
     return model, device
 
-def remote_feed():
+def remote_feed(continuous=False, source=0):
+    """
+    Muestra la cámara en vivo y detecta ingredientes.
+    - Modo por defecto: 'p' congela el frame actual y muestra su predicción.
+    - Modo continuo (continuous=True): captura, inferencia y visualización en hilos
+      separados, con el overlay mantenido por un tracker IoU entre inferencias.
+    """
+    if continuous:
+        from src.support_live import live_feed
+        live_feed(get_detector(), preprocess_frame, source=source,
+                  box_threshold=BOX_THRESHOLD, text_threshold=TEXT_THRESHOLD)
+        return
+
     # Define la ruta base de tu proyecto
     BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 
@@ -113,7 +371,7 @@ def remote_feed():
 
     # Fuente de video (cámara IP, archivo, cámara local, etc.)
     # En tu ejemplo usas la IP: 'http://172.26.1.129:4747/video'
-    cap = cv2.VideoCapture(0)  # Cambia aquí según necesites
+    cap = cv2.VideoCapture(source)  # Cambia aquí según necesites
     cv2.namedWindow("Live Feed", cv2.WINDOW_NORMAL)
 
     # Indica al usuario cómo interactuar
@@ -182,53 +440,245 @@ def remote_feed():
     cap.release()
     cv2.destroyAllWindows()
 
-def image_feed(img):
-    # Define la ruta base de tu proyecto
-    BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+class TorchDetector:
+    """
+    Backend de detección con PyTorch: envuelve `predict` de GroundingDINO con el
+    modelo y el caption fijos.
+    """
+    def __init__(self, model, device, caption=TEXT_PROMPT):
+        self.model = model
+        self.device = device
+        self.caption = caption
+
+    def predict(self, image, box_threshold=BOX_THRESHOLD, text_threshold=TEXT_THRESHOLD, caption=None):
+        return predict(
+            model=self.model,
+            image=image,
+            caption=caption or self.caption,
+            box_threshold=box_threshold,
+            text_threshold=text_threshold,
+            device=self.device
+        )
+
+    def predict_batch(self, images, box_threshold=BOX_THRESHOLD, text_threshold=TEXT_THRESHOLD):
+        """
+        Predice un lote de imágenes con una sola pasada del modelo (se rellenan al mayor tamaño).
+
+        Returns:
+            list: una tupla (boxes, logits, phrases) por imagen.
+        """
+        from groundingdino.util.inference import preprocess_caption
+        from src.support_onnx import postprocess_outputs
+
+        caption = preprocess_caption(self.caption)
+        images = [image.to(self.device) for image in images]
+        with torch.no_grad():
+            outputs = self.model(images, captions=[caption] * len(images))
+        tokenized = self.model.tokenizer(caption)
+        return [
+            postprocess_outputs(outputs["pred_logits"][i].cpu(), outputs["pred_boxes"][i].cpu(),
+                                tokenized, self.model.tokenizer, box_threshold, text_threshold)
+            for i in range(len(images))
+        ]
 
-    # Inicializa el modelo
-    model, device = initialize_model(BASE_DIR)
 
-    # Parámetros para la detección
-    TEXT_PROMPT =  '''
-        potato, onion, garlic, carrot, tomato, lettuce, spinach, cucumber, zucchini, broccoli,
-        cauliflower, apple, banana, orange, lemon, grape, pear, peach, plum, watermelon, pineapple,
-        strawberry, blueberry, raspberry, blackberry, mango, kiwi, avocado, ginger, parsley, cilantro,
-        mint, rosemary, thyme, basil, bay leaf, chili pepper, mushroom, green bean, pea, brussels sprout,
-        kale, cabbage, celery, asparagus, leek, eggplant, radish, pumpkin, butternut squash,
-        okra, artichoke, corn, fig, date, papaya, lime, coconut, melon,
-        cantaloupe, peanut, almond, walnut, chia seed, sunflower seed, sesame seed, bread, pasta,
-        chicken, beef, pork, egg, ham, tofu, milk, yogurt, cheese, butter, tuna, salmon,
-        honey, jam, peanut butter, coffee, tea, chocolate, 
-        rice, lentil, chickpeas, black bean, bell pepper, sausage
-        '''
-    BOX_THRESHOLD = 0.30
-    TEXT_THRESHOLD = 0.25
+_detectors = {}
+
+def get_detector(backend=None):
+    """
+    Devuelve el detector del backend configurado, cargándolo una sola vez por proceso.
 
+    Args:
+        backend (str, optional): "torch" u "onnx". Por defecto, `CV_BACKEND`.
 
-    frame_source, captured_frame = transform_image(img)
+    Returns:
+        Objeto con el método `predict(image, box_threshold, text_threshold)` que
+        devuelve (boxes, logits, phrases) igual que `predict` de GroundingDINO.
+    """
+    backend = backend or CV_BACKEND
+    if backend not in _detectors:
+        if backend == "torch":
+            model, device = initialize_model(BASE_DIR)
+            _detectors[backend] = TorchDetector(model, device)
+        elif backend == "onnx":
+            from src.support_onnx import OnnxDetector
+            _detectors[backend] = OnnxDetector(ONNX_PATH, TEXT_PROMPT, intra_op_threads=ONNX_THREADS)
+        else:
+            raise ValueError(f"Backend de detección desconocido: {backend}")
+    return _detectors[backend]
 
-    # Realizar predicción con el modelo
-    boxes, logits, phrases = predict(
-        model=model,
-        image=captured_frame,
-        caption=TEXT_PROMPT,
+_detection_cache = DetectionCache(max_entries=CV_CACHE_SIZE, max_distance=CV_CACHE_DISTANCE)
+
+_clip_prefilter = None
+
+def get_clip_prefilter():
+    """Carga (una sola vez) el prefiltro CLIP con los embeddings del vocabulario cacheados."""
+    global _clip_prefilter
+    if _clip_prefilter is None:
+        from src.support_clip import ClipPrefilter
+        _clip_prefilter = ClipPrefilter(INGREDIENT_VOCAB, cache_dir=CLIP_CACHE_DIR)
+    return _clip_prefilter
+
+def cascade_predict(img, image_transformed, detector=None, top_n=None):
+    """
+    Detección en dos etapas: CLIP reduce el vocabulario a las top_n clases y
+    GroundingDINO se ejecuta con ese caption más corto.
+
+    Args:
+        img (np.ndarray): imagen original en BGR (para CLIP).
+        image_transformed (torch.Tensor): imagen preprocesada para GroundingDINO.
+        detector (TorchDetector, optional): por defecto, el detector torch del proceso.
+        top_n (int, optional): clases que pasan a la segunda etapa. Por defecto, `CV_CASCADE_TOP_N`.
+
+    Returns:
+        tuple: (boxes, logits, phrases)
+    """
+    detector = detector or get_detector("torch")
+    if not isinstance(detector, TorchDetector):
+        raise ValueError("La cascada CLIP necesita el backend torch (el caption del modelo ONNX es fijo)")
+    labels = get_clip_prefilter().top_n(img, n=top_n or CV_CASCADE_TOP_N)
+    return detector.predict(
+        image_transformed,
         box_threshold=BOX_THRESHOLD,
         text_threshold=TEXT_THRESHOLD,
-        device=device
+        caption=", ".join(labels)
     )
 
-    # Anotar el frame original (en RGB)
+def detection_version(backend=None, resolution=None):
+    """
+    Identifica el modelo/vocabulario con el que se generan las detecciones, para que la
+    caché no devuelva resultados de otra configuración.
+    """
+    cascade = CV_CASCADE_TOP_N if CV_CASCADE else 0
+    tiling = (CV_TILE_SIZE, CV_TILE_OVERLAP, CV_TILE_MERGE) if CV_TILED else None
+    return (backend or CV_BACKEND, resolve_short_side(resolution), TEXT_PROMPT, BOX_THRESHOLD, TEXT_THRESHOLD,
+            cascade, tiling)
+
+def tiled_detect(img, detector=None, tile_size=None, overlap=None):
+    """
+    Detección por tiles solapados con la configuración del proceso (ver `support_tiling.tiled_predict`).
+
+    Returns:
+        tuple: (boxes, logits, phrases) referidos a la imagen completa.
+    """
+    from src.support_tiling import tiled_predict
+    return tiled_predict(
+        img,
+        detector or get_detector(),
+        preprocess_frame,
+        box_threshold=BOX_THRESHOLD,
+        text_threshold=TEXT_THRESHOLD,
+        tile_size=tile_size or CV_TILE_SIZE,
+        overlap=CV_TILE_OVERLAP if overlap is None else overlap,
+        workers=CV_TILE_WORKERS,
+        merge=CV_TILE_MERGE
+    )
+
+def get_detection_cache():
+    """Devuelve la caché de detecciones del proceso (p. ej. para consultar `stats()`)."""
+    return _detection_cache
+
+def render_annotation(img, detections, ext=".jpg"):
+    """
+    Dibuja las detecciones sobre la imagen y la codifica en memoria.
+
+    Args:
+        img (np.ndarray): imagen original en BGR (OpenCV).
+        detections (dict): salida de `detect_ingredients`.
+        ext (str): formato de salida para cv2.imencode.
+
+    Returns:
+        bytes: imagen anotada codificada.
+    """
     annotated_frame = annotate(
-        image_source=frame_source,
-        boxes=boxes,
-        logits=logits,
-        phrases=phrases
+        image_source=cv2.cvtColor(img, cv2.COLOR_BGR2RGB),
+        boxes=detections["boxes"],
+        logits=detections["scores"],
+        phrases=detections["phrases"]
     )
+    ok, buffer = cv2.imencode(ext, annotated_frame)
+    if not ok:
+        raise ValueError(f"No se pudo codificar la imagen anotada como {ext}")
+    return buffer.tobytes()
 
-    # Guardar la imagen anotada
-    output_path = os.path.join(BASE_DIR, "computervision", "live_annotated_image.jpg")
-    cv2.imwrite(output_path, annotated_frame)
-    
-    print(f"Predicción completada. Frases detectadas: {phrases}")
-    return phrases
+def run_detector(img, detector=None):
+    """
+    Ejecuta la detección según la configuración (una pasada, cascada CLIP o tiles), sin caché.
+
+    Returns:
+        tuple: (boxes, logits, phrases)
+    """
+    # Detector del backend configurado (se carga una sola vez)
+    detector = detector or get_detector()
+
+    if CV_TILED:
+        return tiled_detect(img, detector)
+    if CV_CASCADE:
+        return cascade_predict(img, preprocess_frame(img), detector)
+    return detector.predict(
+        preprocess_frame(img),
+        box_threshold=BOX_THRESHOLD,
+        text_threshold=TEXT_THRESHOLD
+    )
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """
+    Arranca (una sola vez) el pool de procesos de detección.
+    - El modelo se carga antes de hacer fork, para que los workers compartan los pesos.
+    - Hay que arrancarlo antes de ejecutar inferencias en el proceso principal: los
+      runtimes de OpenMP no se llevan bien con un fork posterior.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            from src.support_pool import DetectorPool
+            detector = get_detector()
+            if CV_CASCADE:
+                get_clip_prefilter()
+            _pool = DetectorPool(
+                run_detector,
+                model=getattr(detector, "model", None),
+                n_workers=CV_POOL_WORKERS,
+                threads_per_worker=CV_POOL_THREADS
+            )
+    return _pool
+
+def detect_ingredients(img):
+    """
+    Detecta ingredientes en una imagen y devuelve las detecciones estructuradas.
+    - Consulta antes la caché por hash perceptual.
+    - No dibuja ni escribe nada en disco: la anotación se genera aparte con
+      `render_annotation` solo si se pide.
+
+    Args:
+        img (np.ndarray): imagen en BGR (OpenCV).
+
+    Returns:
+        dict: boxes (cxcywh normalizadas), scores y phrases.
+    """
+    # Buscar primero en la caché: las fotos repetidas o casi idénticas no pasan por GroundingDINO
+    # (el dHash solo se calcula si la caché está activa)
+    if CV_CACHE_SIZE > 0:
+        version = detection_version()
+        image_hash = dhash(img)
+        cached = _detection_cache.get(version, image_hash)
+        if cached is not None:
+            return cached
+
+    # Realizar predicción con el modelo (en el pool de procesos si está activo)
+    if CV_POOL_WORKERS > 0:
+        boxes, logits, phrases = get_pool().detect(img)
+    else:
+        boxes, logits, phrases = run_detector(img)
+    detections = {"boxes": boxes, "scores": logits, "phrases": phrases}
+    if CV_CACHE_SIZE > 0:
+        _detection_cache.put(version, image_hash, detections)
+    return detections
+
+def image_feed(img):
+    detections = detect_ingredients(img)
+    print(f"Predicción completada. Frases detectadas: {detections['phrases']}")
+    return detections["phrases"]
@@ -0,0 +1,199 @@
+import os
+import re
+import time
+import hashlib
+import sqlite3
+import threading
+import unicodedata
+
+import numpy as np
+
+# Primo de Mersenne 2^61 - 1 para las permutaciones a * x + b mod p
+_PRIME = np.uint64((1 << 61) - 1)
+# Versión de las firmas guardadas (PRAGMA user_version): cambia si cambia MinHasher
+INDEX_VERSION = 2
+
+
+def normalize_text(text) -> str:
+    """Minúsculas, sin tildes y solo letras/números separados por un espacio."""
+    text = unicodedata.normalize("NFKD", str(text or "").lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", text).split())
+
+
+def recipe_shingles(record: dict) -> set:
+    """
+    Shingles de una receta del JSONL: pares de palabras consecutivas del título normalizado
+    (o la palabra si solo hay una) y el nombre normalizado de cada ingrediente.
+    """
+    words = normalize_text(record.get("titulo")).split()
+    shingles = {"t:" + " ".join(pair) for pair in zip(words, words[1:])} or {"t:" + w for w in words}
+    names = (record.get("ingredientes") or {}).get("nombre") or []
+    shingles.update("i:" + normalize_text(name) for name in names if normalize_text(name))
+    return shingles
+
+
+class MinHasher:
+    """
+    Firma MinHash de num_perm valores de un conjunto de shingles.
+    - Cada shingle se reduce a 32 bits (BLAKE2b) y se le aplican num_perm permutaciones
+      a * x + b mod (2^61 - 1) vectorizadas con numpy.
+    - a y b se eligen en todo el rango [0, 2^61 - 1): el producto desborda uint64 (da la vuelta
+      módulo 2^64), lo que mezcla bien los bits. Con a, b < 2^32 el módulo apenas daba vueltas,
+      las permutaciones seguían casi el orden de x y la similitud salía sesgada al alza.
+    """
+    def __init__(self, num_perm: int = 128, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.a = rng.integers(1, _PRIME, size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, _PRIME, size=num_perm, dtype=np.uint64)
+
+    def signature(self, shingles) -> np.ndarray:
+        if not shingles:
+            return None
+        hashes = np.array(
+            [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little") for s in shingles],
+            dtype=np.uint64
+        )
+        return ((hashes[:, None] * self.a + self.b) % _PRIME).min(axis=0)
+
+
+class DedupIndex:
+    """
+    Índice LSH persistente (SQLite) de firmas MinHash para detectar recetas casi duplicadas.
+    - La firma se divide en `bands` bandas; dos recetas son candidatas si coinciden en alguna
+      banda entera, y se confirma con la similitud de Jaccard estimada (>= threshold).
+    - Cada consulta hace `bands` búsquedas por índice más la lectura de las pocas candidatas,
+      así que el coste por receta nueva es casi constante con el tamaño del índice.
+    - Las originales son las recetas indexadas (tabla signatures); las casi duplicadas de una
+      original se guardan en la tabla duplicates apuntando a ella. Compartido por procesos
+      (WAL + espera por bloqueo).
+    - En el ETL solo se indexan las recetas ya cargadas (`add_many` al escribir su lote) y la
+      comprobación al leer no indexa (`check(add=False)`): una receta solo se salta como
+      duplicada de una original que está en la base, nunca de una que aún puede fallar.
+    """
+    def __init__(self, path: str, num_perm: int = 128, bands: int = 16, threshold: float = 0.8, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm debe ser múltiplo de bands")
+        self.hasher = MinHasher(num_perm, seed)
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        (version,) = self._db.execute("PRAGMA user_version").fetchone()
+        indexed = self._db.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'signatures'").fetchone()
+        if indexed and version != INDEX_VERSION:
+            # Las firmas de otra versión de MinHasher no son comparables con las nuevas
+            raise ValueError(f"{path} es un índice de otra versión; bórralo para empezar de cero")
+        self._db.execute(f"PRAGMA user_version = {INDEX_VERSION}")
+        self._db.execute("CREATE TABLE IF NOT EXISTS signatures (url TEXT PRIMARY KEY, signature BLOB)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS buckets (band INTEGER, key INTEGER, url TEXT)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS buckets_key ON buckets (band, key)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS duplicates (url TEXT PRIMARY KEY, duplicate_of TEXT, similarity REAL, found REAL)"
+        )
+        self._db.commit()
+
+    def _band_keys(self, signature: np.ndarray) -> list:
+        return [
+            int.from_bytes(hashlib.blake2b(band.tobytes(), digest_size=8).digest(), "little", signed=True)
+            for band in signature.reshape(self.bands, self.rows)
+        ]
+
+    def _query(self, signature: np.ndarray, keys: list):
+        """Mejor candidata (url, similitud) por encima del umbral, o (None, 0.0)."""
+        candidates = set()
+        for band, key in enumerate(keys):
+            candidates.update(url for (url,) in self._db.execute(
+                "SELECT url FROM buckets WHERE band = ? AND key = ?", (band, key)))
+        best, best_similarity = None, 0.0
+        for url in candidates:
+            (blob,) = self._db.execute("SELECT signature FROM signatures WHERE url = ?", (url,)).fetchone()
+            similarity = float(np.mean(np.frombuffer(blob, dtype=np.uint64) == signature))
+            if similarity >= self.threshold and similarity > best_similarity:
+                best, best_similarity = url, similarity
+        return best, best_similarity
+
+    def check(self, record: dict, add: bool = True):
+        """
+        Comprueba si la receta es casi duplicada de una ya indexada y, si no lo es y add es True,
+        la añade como original.
+
+        Returns:
+            tuple: (url de la receta original o None, similitud estimada)
+        """
+        url = record["url"]
+        with self._lock:
+            if add:
+                # Transacción de escritura desde el principio: otro proceso no puede indexar a la
+                # vez una receta casi igual entre la consulta y la inserción
+                self._db.execute("BEGIN IMMEDIATE")
+            # Sin add solo se lee (sin el bloqueo de escritura de SQLite, que frenaría a los demás
+            # workers); anotar una duplicada abre una transacción normal solo para esa fila
+            try:
+                return self._check(record, url, add)
+            finally:
+                self._db.commit()
+
+    def _check(self, record: dict, url: str, add: bool):
+        row = self._db.execute("SELECT duplicate_of, similarity FROM duplicates WHERE url = ?", (url,)).fetchone()
+        if row:
+            return row[0], row[1]
+        if self._db.execute("SELECT 1 FROM signatures WHERE url = ?", (url,)).fetchone():
+            return None, 0.0  # ya indexada como original (ejecución anterior)
+        signature = self.hasher.signature(recipe_shingles(record))
+        if signature is None:
+            return None, 0.0
+        keys = self._band_keys(signature)
+        original, similarity = self._query(signature, keys)
+        if original is not None:
+            self._db.execute("INSERT OR REPLACE INTO duplicates VALUES (?, ?, ?, ?)",
+                             (url, original, similarity, time.time()))
+        elif add:
+            self._insert(url, signature, keys)
+        return original, similarity
+
+    def _insert(self, url: str, signature: np.ndarray, keys: list):
+        self._db.execute("INSERT INTO signatures VALUES (?, ?)", (url, signature.tobytes()))
+        self._db.executemany("INSERT INTO buckets VALUES (?, ?, ?)", [(band, key, url) for band, key in enumerate(keys)])
+
+    def add_many(self, records) -> int:
+        """
+        Indexa como originales las recetas que no lo están ya ni son casi duplicadas de una
+        indexada (p. ej. las de un lote recién cargado).
+
+        Returns:
+            int: recetas añadidas al índice.
+        """
+        added = 0
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                for record in records:
+                    url = record["url"]
+                    if self._db.execute("SELECT 1 FROM signatures WHERE url = ?", (url,)).fetchone():
+                        continue
+                    signature = self.hasher.signature(recipe_shingles(record))
+                    if signature is None:
+                        continue
+                    keys = self._band_keys(signature)
+                    if self._query(signature, keys)[0] is not None:
+                        continue  # del mismo grupo que una ya indexada (se procesaron a la vez)
+                    self._insert(url, signature, keys)
+                    added += 1
+            finally:
+                self._db.commit()
+        return added
+
+    def stats(self) -> dict:
+        with self._lock:
+            (originals,) = self._db.execute("SELECT COUNT(*) FROM signatures").fetchone()
+            (duplicates,) = self._db.execute("SELECT COUNT(*) FROM duplicates").fetchone()
+        return {"originals": originals, "duplicates": duplicates}
+
+    def close(self):
+        self._db.close()
@@ -0,0 +1,138 @@
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+
+def dhash(frame, hash_size=8):
+    """
+    Calcula el hash perceptual por diferencias (dHash) de una imagen.
+    - Reduce la imagen a (hash_size + 1) x hash_size, la pasa a gris y compara píxeles vecinos.
+    - Imágenes casi idénticas (recompresión, pequeños cambios de luz) dan hashes a poca
+      distancia de Hamming.
+
+    Args:
+        frame (np.ndarray): imagen uint8 en BGR (OpenCV).
+        hash_size (int): lado del hash; 8 da un hash de 64 bits.
+
+    Returns:
+        int: hash de hash_size * hash_size bits.
+    """
+    small = cv2.resize(frame, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    if small.ndim == 3:
+        small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming(a, b):
+    """Distancia de Hamming entre dos hashes enteros."""
+    return bin(a ^ b).count("1")
+
+
+class DetectionCache:
+    """
+    Caché LRU de detecciones indexada por hash perceptual.
+    - La clave es (versión del modelo/vocabulario, dHash), de modo que cambiar de backend,
+      caption o umbrales invalida las entradas antiguas.
+    - Las búsquedas por distancia de Hamming usan multi-index hashing: el hash de 64 bits se
+      divide en max_distance + 1 bloques y, por el principio del palomar, cualquier hash a
+      distancia <= max_distance coincide exactamente en al menos un bloque.
+    """
+    def __init__(self, max_entries=256, max_distance=4, hash_bits=64):
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self.hash_bits = hash_bits
+
+        # Anchos de bloque lo más parecidos posible (p. ej. 13, 13, 13, 13, 12 para 64 bits y distancia 4)
+        n_blocks = max_distance + 1
+        base, extra = divmod(hash_bits, n_blocks)
+        self._blocks = []
+        offset = 0
+        for i in range(n_blocks):
+            width = base + (1 if i < extra else 0)
+            self._blocks.append((offset, (1 << width) - 1))
+            offset += width
+
+        self._entries = OrderedDict()                       # (version, hash) -> detecciones
+        self._index = [dict() for _ in self._blocks]        # (version, bloque) -> set(hash)
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _chunks(self, h):
+        return [(h >> offset) & mask for offset, mask in self._blocks]
+
+    def get(self, version, h):
+        """
+        Busca la entrada más cercana a h (distancia <= max_distance) para esa versión.
+
+        Returns:
+            Las detecciones guardadas o None si no hay ninguna suficientemente cercana.
+        """
+        with self._lock:
+            best, best_distance = None, self.max_distance + 1
+            if (version, h) in self._entries:
+                best, best_distance = h, 0
+            else:
+                candidates = set()
+                for i, chunk in enumerate(self._chunks(h)):
+                    candidates |= self._index[i].get((version, chunk), set())
+                for candidate in candidates:
+                    distance = hamming(h, candidate)
+                    if distance < best_distance:
+                        best, best_distance = candidate, distance
+
+            if best is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            if best_distance > 0:
+                self.near_hits += 1
+            self._entries.move_to_end((version, best))
+            return self._entries[(version, best)]
+
+    def put(self, version, h, value):
+        """Guarda las detecciones de h, expulsando la entrada menos usada si la caché está llena."""
+        with self._lock:
+            key = (version, h)
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self._entries[key] = value
+                return
+            self._entries[key] = value
+            for i, chunk in enumerate(self._chunks(h)):
+                self._index[i].setdefault((version, chunk), set()).add(h)
+
+            while len(self._entries) > self.max_entries:
+                (old_version, old_h), _ = self._entries.popitem(last=False)
+                for i, chunk in enumerate(self._chunks(old_h)):
+                    bucket = self._index[i].get((old_version, chunk))
+                    if bucket is not None:
+                        bucket.discard(old_h)
+                        if not bucket:
+                            del self._index[i][(old_version, chunk)]
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            for index in self._index:
+                index.clear()
+
+    def stats(self):
+        """Devuelve tamaño, aciertos (exactos y aproximados), fallos, expulsiones y tasa de acierto."""
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
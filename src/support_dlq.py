@@ -0,0 +1,94 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+
+import requests
+
+from src.support_ratelimit import CircuitOpenError
+
+
+def failure_reason(error) -> str:
+    """
+    Motivo agregable de un fallo: código de Edamam / HTTP, "parse" para datos mal formados
+    de la receta, o el nombre de la excepción.
+    """
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return f"edamam_{status}"
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        return f"http_{error.response.status_code}"
+    if isinstance(error, CircuitOpenError):
+        return f"circuit_{error.provider}"
+    if isinstance(error, (KeyError, ValueError, TypeError, IndexError)):
+        return "parse"
+    return type(error).__name__
+
+
+class DeadLetterStore:
+    """
+    Almacén (SQLite) de recetas que han fallado en el ETL, una fila por URL: etapa, motivo,
+    error, receta completa (payload) e intentos.
+    - Compartido por todas las particiones (varios procesos: WAL + espera por bloqueo).
+    - Se reprocesa con `etl_pipeline/dlq.py` sin volver a leer el JSONL.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS dead_letters ("
+            "url TEXT PRIMARY KEY, stage TEXT, reason TEXT, error TEXT, payload TEXT, "
+            "journal TEXT, attempts INTEGER, updated REAL)"
+        )
+        self._db.commit()
+
+    def put(self, recipe: dict, stage: str, error, journal: str = None, reason: str = None):
+        """Guarda (o actualiza, sumando un intento) el fallo de una receta."""
+        reason = reason or failure_reason(error)
+        payload = json.dumps(recipe, default=str, ensure_ascii=False)
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO dead_letters VALUES (?, ?, ?, ?, ?, ?, 1, ?) "
+                "ON CONFLICT(url) DO UPDATE SET stage = excluded.stage, reason = excluded.reason, "
+                "error = excluded.error, payload = excluded.payload, "
+                "journal = COALESCE(excluded.journal, journal), attempts = attempts + 1, updated = excluded.updated",
+                (recipe["url"], stage, reason, str(error), payload, journal, time.time())
+            )
+            self._db.commit()
+
+    def remove(self, urls):
+        with self._lock:
+            self._db.executemany("DELETE FROM dead_letters WHERE url = ?", [(url,) for url in urls])
+            self._db.commit()
+
+    def entries(self, reason: str = None, max_attempts: int = None):
+        """
+        Recetas guardadas (payload, journal), filtradas por motivo y número de intentos.
+        Se leen de una vez para no mantener un cursor abierto mientras se reprocesan.
+        """
+        query = "SELECT payload, journal FROM dead_letters WHERE 1 = 1"
+        params = []
+        if reason:
+            query += " AND reason = ?"
+            params.append(reason)
+        if max_attempts:
+            query += " AND attempts < ?"
+            params.append(max_attempts)
+        with self._lock:
+            rows = self._db.execute(query + " ORDER BY updated", params).fetchall()
+        return [(json.loads(payload), journal) for payload, journal in rows]
+
+    def counts(self) -> list:
+        """Fallos por (etapa, motivo), de más a menos frecuente."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT stage, reason, COUNT(*), SUM(attempts) FROM dead_letters "
+                "GROUP BY stage, reason ORDER BY COUNT(*) DESC"
+            ).fetchall()
+
+    def close(self):
+        self._db.close()
@@ -4,20 +4,290 @@ import pandas as pd
 import inflect
 import time
 import json  
+import threading
+import sqlite3
+from collections import OrderedDict
 import dotenv
 import sys
 sys.path.append("..")
 dotenv.load_dotenv()
 
 from deep_translator import GoogleTranslator, DeeplTranslator
+from deep_translator.exceptions import TooManyRequests, ServerException
+import httpx
+from postgrest.exceptions import APIError
 from supabase import create_client, Client
+from src.support_pipeline import Stage, run_pipeline
+from src.support_ratelimit import RateLimiter, CircuitOpenError, exception_status
+from src.support_journal import ShardJournal, shard_of, shard_path, journal_path
+from src.support_dlq import DeadLetterStore
+from src.support_staging import StagingWriter, read_rows
+from src.support_dedup import DedupIndex
 deepl_key = os.getenv("deepl_key")
+# Endpoint de DeepL: el de la API gratuita para las claves que terminan en ":fx" (o el de deepl_url)
+DEEPL_FREE_API = (deepl_key or "").endswith(":fx")
+DEEPL_URL = os.getenv("deepl_url") or (
+    "https://api-free.deepl.com/v2/translate" if DEEPL_FREE_API else "https://api.deepl.com/v2/translate"
+)
+
+# Caché persistente de traducciones (SQLite) y tamaño de la caché en memoria
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+TRANSLATION_CACHE_PATH = os.getenv("translation_cache_path", os.path.join(project_root, "translation_cache.sqlite"))
+TRANSLATION_MEMORY_ENTRIES = int(os.getenv("translation_memory_entries", "20000"))
+# Caché persistente (SQLite) del análisis de Edamam por línea de ingrediente
+NUTRITION_CACHE_PATH = os.getenv("nutrition_cache_path", os.path.join(project_root, "nutrition_cache.sqlite"))
+# Diarios de las particiones del ETL (uno por worker)
+JOURNAL_DIR = os.getenv("etl_journal_dir", os.path.join(project_root, "etl_journal"))
+# Recetas fallidas (compartido por todas las particiones)
+DEAD_LETTERS_PATH = os.getenv("etl_dead_letters_path", os.path.join(JOURNAL_DIR, "dead_letters.sqlite"))
+# Índice MinHash LSH de recetas casi duplicadas (compartido por todas las particiones)
+DEDUP_PATH = os.getenv("etl_dedup_path", os.path.join(JOURNAL_DIR, "dedup.sqlite"))
+# Área de staging en Parquet entre la transformación y la carga
+STAGING_DIR = os.getenv("etl_staging_dir", os.path.join(project_root, "etl_staging"))
+# SQL con las restricciones únicas que necesitan los upserts de la carga en bloque
+BULK_CONSTRAINTS_SQL = os.path.join(project_root, "etl_pipeline", "sql", "bulk_load_constraints.sql")
+
+def deepl_error_status(error):
+    """
+    Estado HTTP de un error de deep_translator: TooManyRequests es un 429 y ServerException no
+    guarda el código, que se recupera de su mensaje (500 si no se reconoce).
+    """
+    if isinstance(error, TooManyRequests):
+        return 429
+    if isinstance(error, ServerException):
+        message = error.args[0] if error.args else None
+        return next((code for code, text in getattr(ServerException, "errors", {}).items() if text == message), 500)
+    return exception_status(error)
+
+# Limitadores por proveedor (peticiones/s). El 555 de Edamam es "receta no analizable", no un fallo del servicio.
+# Los errores de los clientes (postgrest.APIError, deep_translator) se traducen a su estado HTTP.
+EDAMAM_LIMITER = RateLimiter("edamam", rate=float(os.getenv("edamam_rate", "0.5")), ok_statuses=(555,))
+DEEPL_LIMITER = RateLimiter("deepl", rate=float(os.getenv("deepl_rate", "5")), burst=5,
+                            retry_statuses=(500, 502, 503, 504, 529), error_status=deepl_error_status)
+SUPABASE_LIMITER = RateLimiter("supabase", rate=float(os.getenv("supabase_rate", "20")), burst=10,
+                               retry_exceptions=(OSError, httpx.TransportError))
+
+
+class TranslationCache:
+    """
+    Caché de traducciones en dos niveles, indexada por (origen, destino, texto normalizado).
+    - Nivel 1: LRU en memoria del proceso.
+    - Nivel 2: SQLite local, compartido entre ejecuciones (y procesos) del ETL y la app
+      (WAL + espera por bloqueo, para los workers de las particiones).
+    """
+    def __init__(self, path: str, max_memory_entries: int = 20000):
+        self.max_memory_entries = max_memory_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS translations ("
+            "source TEXT, target TEXT, text TEXT, translation TEXT, PRIMARY KEY (source, target, text))"
+        )
+        self._db.commit()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def normalize(text) -> str:
+        return " ".join(str(text).split())
+
+    def _remember(self, key, translation):
+        self._memory[key] = translation
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, source: str, target: str, text: str):
+        """Devuelve la traducción guardada o None."""
+        key = (source, target, self.normalize(text))
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return self._memory[key]
+            row = self._db.execute(
+                "SELECT translation FROM translations WHERE source = ? AND target = ? AND text = ?", key
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._remember(key, row[0])
+            return row[0]
+
+    def put_many(self, source: str, target: str, pairs):
+        """Guarda varias traducciones [(texto, traducción), ...] en ambos niveles."""
+        rows = [(source, target, self.normalize(text), translation) for text, translation in pairs
+                if self.normalize(text) and translation]
+        with self._lock:
+            for row in rows:
+                self._remember(row[:3], row[3])
+            self._db.executemany("INSERT OR REPLACE INTO translations VALUES (?, ?, ?, ?)", rows)
+            self._db.commit()
+
+    def put(self, source: str, target: str, text: str, translation: str):
+        self.put_many(source, target, [(text, translation)])
+
+    def stats(self) -> dict:
+        total = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.disk_hits) / total if total else 0.0,
+        }
+
+
+_translation_cache = None
+_translators = {}
+_translation_lock = threading.Lock()
+
+def get_translation_cache() -> TranslationCache:
+    """Devuelve la caché de traducciones del proceso (se crea al primer uso)."""
+    global _translation_cache
+    with _translation_lock:
+        if _translation_cache is None:
+            _translation_cache = TranslationCache(TRANSLATION_CACHE_PATH, TRANSLATION_MEMORY_ENTRIES)
+    return _translation_cache
+
+def get_translator(source: str, target: str) -> DeeplTranslator:
+    """Cliente de DeepL reutilizado por par de idiomas."""
+    with _translation_lock:
+        if (source, target) not in _translators:
+            _translators[(source, target)] = DeeplTranslator(api_key=deepl_key, source=source, target=target,
+                                                               use_free_api=DEEPL_FREE_API)
+    return _translators[(source, target)]
+
+def translate(text, source: str, target: str):
+    """
+    Traduce con DeepL pasando antes por la caché de traducciones.
+    """
+    if not TranslationCache.normalize(text):
+        return text
+    cache = get_translation_cache()
+    cached = cache.get(source, target, text)
+    if cached is not None:
+        return cached
+    translation = DEEPL_LIMITER.call(get_translator(source, target).translate, text)
+    cache.put(source, target, text, translation)
+    return translation
+
+# Límites de DeepL por petición: 50 textos y 128 KiB de cuerpo (se deja margen)
+DEEPL_MAX_TEXTS = 50
+DEEPL_MAX_BYTES = 120 * 1024
+
+def _deepl_batches(texts: list):
+    """Agrupa los textos en lotes que respetan los límites de DeepL."""
+    batch, size = [], 0
+    for text in texts:
+        text_size = len(text.encode("utf-8")) + 6  # "text=" + "&"
+        if batch and (len(batch) == DEEPL_MAX_TEXTS or size + text_size > DEEPL_MAX_BYTES):
+            yield batch
+            batch, size = [], 0
+        batch.append(text)
+        size += text_size
+    if batch:
+        yield batch
+
+def _deepl_translate_batch(texts: list, source: str, target: str) -> list:
+    """Traduce una lista de textos con una sola petición a DeepL."""
+    response = DEEPL_LIMITER.call(
+        requests.post,
+        DEEPL_URL,
+        headers={"Authorization": f"DeepL-Auth-Key {deepl_key}"},
+        data={"text": texts, "source_lang": source.upper(), "target_lang": target.upper()}
+    )
+    response.raise_for_status()
+    return [t["text"] for t in response.json()["translations"]]
+
+def translate_many(texts, source: str, target: str) -> list:
+    """
+    Traduce varios textos con el mínimo de peticiones a DeepL.
+    - Elimina duplicados, consulta la caché y envía solo los que faltan, en lotes de
+      hasta 50 textos / 120 KiB por petición.
+    - El texto normalizado solo es la clave de la caché: a DeepL se envía el original (con sus
+      saltos de línea, p. ej. en los pasos).
+    - Devuelve las traducciones en el mismo orden que la entrada.
+
+    Ejemplo:
+        >>> translate_many(["sal", "aceite de oliva", "sal"], "es", "en")
+        ['salt', 'olive oil', 'salt']
+    """
+    texts = list(texts)
+    cache = get_translation_cache()
+    translations = {}
+    pending = {}  # clave normalizada -> primer texto original con esa clave
+    for text in texts:
+        key = TranslationCache.normalize(text)
+        if not key or key in translations or key in pending:
+            continue
+        cached = cache.get(source, target, key)
+        if cached is not None:
+            translations[key] = cached
+        else:
+            pending[key] = str(text)
+
+    for batch in _deepl_batches(list(pending.values())):
+        result = _deepl_translate_batch(batch, source, target)
+        cache.put_many(source, target, zip(batch, result))
+        translations.update((TranslationCache.normalize(text), r) for text, r in zip(batch, result))
+
+    return [translations.get(TranslationCache.normalize(t), t) for t in texts]
 
 def translate_es_en(text):
-    return DeeplTranslator(api_key= deepl_key, source='es', target='en', use_free_api=True).translate(text)
+    return translate(text, 'es', 'en')
 
 def translate_en_es(text):
-    return DeeplTranslator(api_key= deepl_key, source='en', target='es', use_free_api=True).translate(text)
+    return translate(text, 'en', 'es')
+
+def warm_translation_cache(supabase, page_size: int = 1000) -> int:
+    """
+    Precarga la caché de traducciones con los pares name_en/name_es ya guardados en las
+    tablas 'ingredients' y 'tags' (en ambos sentidos).
+
+    Returns:
+        int: número de pares importados.
+    """
+    cache = get_translation_cache()
+    n_pairs = 0
+    for table in ("ingredients", "tags"):
+        start = 0
+        while True:
+            rows = supabase.table(table).select("name_en, name_es").range(start, start + page_size - 1).execute().data
+            pairs = [(r["name_en"], r["name_es"]) for r in rows if r.get("name_en") and r.get("name_es")]
+            cache.put_many("en", "es", pairs)
+            cache.put_many("es", "en", [(es, en) for en, es in pairs])
+            n_pairs += len(pairs)
+            if len(rows) < page_size:
+                break
+            start += page_size
+    print(f"Caché de traducciones precargada con {n_pairs} pares")
+    return n_pairs
+
+EDAMAM_URL = "https://api.edamam.com/api/nutrition-details"
+
+# Nutrientes de Edamam que se guardan (código -> nombre en el ETL)
+EDAMAM_NUTRIENTS = {
+    "ENERC_KCAL": "calories",
+    "PROCNT": "protein",
+    "FAT": "fat",
+    "CHOCDF": "carbs",
+    "SUGAR": "sugar",
+    "FIBTG": "fiber"
+}
+
+def request_nutrition_details(ing_list) -> requests.Response:
+    """Una petición al endpoint nutrition-details de Edamam con la lista de líneas (a través del limitador)."""
+    return EDAMAM_LIMITER.call(
+        requests.post,
+        EDAMAM_URL,
+        headers={ "Content-Type": "application/json" },
+        params={"app_id": os.getenv('edamam_session_id'), "app_key": os.getenv('edamam_api_key')},
+        json={ "ingr": ing_list }
+    )
 
 def get_nutrients(ing_list, serving_size):
     """
@@ -32,16 +302,7 @@ def get_nutrients(ing_list, serving_size):
             - DataFrame: detalle de nutrientes por ingrediente.
             - dict: resumen de nutrientes totales y etiquetas de salud.
     """
-    url = "https://api.edamam.com/api/nutrition-details"
-    headers = { "Content-Type": "application/json" }
-    data = { "ingr": ing_list }
-
-    response = requests.post(
-        url,
-        headers=headers,
-        params={"app_id": os.getenv('edamam_session_id'), "app_key": os.getenv('edamam_api_key')},
-        json=data
-    )
+    response = request_nutrition_details(ing_list)
 
     if response.status_code == 200:
         nutrition_data = response.json()
@@ -80,19 +341,9 @@ def get_nutrients(ing_list, serving_size):
 
         nutrients_df = pd.DataFrame(nutrient_list)
 
-        # Nutrientes relevantes que se deben incluir en el resumen
-        relevant_nutrients = {
-            "ENERC_KCAL": "calories",
-            "PROCNT": "protein",
-            "FAT": "fat",
-            "CHOCDF": "carbs",
-            "SUGAR": "sugar",
-            "FIBTG": "fiber"
-        }
-
         # Crear el diccionario con los nutrientes totales
         recipe_summary = {}
-        for key, label in relevant_nutrients.items():
+        for key, label in EDAMAM_NUTRIENTS.items():
             nutrient_data = nutrition_data.get("totalNutrients", {}).get(key, {})
             recipe_summary[label] = nutrient_data.get("quantity", 0)
 
@@ -107,6 +358,202 @@ def get_nutrients(ing_list, serving_size):
         return response.status_code, response.status_code
 
 
+class NutritionCache:
+    """
+    Caché persistente (SQLite) del análisis de Edamam por línea de ingrediente
+    ("1 tbsp olive oil"): foodMatch, peso, nutrientes y etiquetas de salud de la línea.
+    - Edamam solo devuelve etiquetas de salud para la petición completa: una línea solo guarda
+      etiquetas si se analizó sola (son exactamente las suyas); si se analizó junto a otras se
+      guardan sus nutrientes con healthLabels=None (desconocidas), nunca las de otra receta.
+    - Las líneas que Edamam no supo interpretar (555 o sin "parsed") se guardan como None
+      (caché negativa): no se vuelven a enviar con cada receta que las contiene.
+    - La tabla es nutrition_lines_v2: la versión anterior guardaba en cada línea las etiquetas de
+      la receta en la que se analizó, que no sirven.
+    - Compartida por los workers de las particiones (WAL + espera por bloqueo).
+    """
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS nutrition_lines_v2 (line TEXT PRIMARY KEY, parsed TEXT)")
+        self._db.commit()
+        self.lines_hit = 0
+        self.lines_sent = 0
+        self.api_calls = 0
+        self.api_calls_saved = 0
+
+    @staticmethod
+    def normalize(line) -> str:
+        return " ".join(str(line).lower().split())
+
+    def get_many(self, lines) -> dict:
+        """Devuelve {línea normalizada: análisis o None si Edamam no la interpreta} de las líneas guardadas."""
+        keys = list(dict.fromkeys(self.normalize(l) for l in lines))
+        if not keys:
+            return {}
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT line, parsed FROM nutrition_lines_v2 WHERE line IN ({', '.join('?' * len(keys))})", keys
+            ).fetchall()
+        return {line: json.loads(parsed) for line, parsed in rows}
+
+    def put_many(self, entries: dict):
+        """Guarda {línea: análisis}; None marca una línea que Edamam no interpreta."""
+        rows = [(self.normalize(line), json.dumps(parsed)) for line, parsed in entries.items()]
+        if not rows:
+            return
+        with self._lock:
+            self._db.executemany("INSERT OR REPLACE INTO nutrition_lines_v2 VALUES (?, ?)", rows)
+            self._db.commit()
+
+    def record(self, hits: int, sent: int, calls: int):
+        """
+        Cuenta una receta: líneas encontradas en la caché, líneas enviadas y peticiones hechas.
+        Una receta sin peticiones ahorra la llamada que haría `get_nutrients`.
+        """
+        with self._lock:
+            self.lines_hit += hits
+            self.lines_sent += sent
+            self.api_calls += calls
+            if not calls:
+                self.api_calls_saved += 1
+
+    def stats(self) -> dict:
+        total = self.lines_hit + self.lines_sent
+        return {
+            "lines_hit": self.lines_hit,
+            "lines_sent": self.lines_sent,
+            "line_hit_rate": self.lines_hit / total if total else 0.0,
+            "api_calls": self.api_calls,
+            "api_calls_saved": self.api_calls_saved,
+        }
+
+
+_nutrition_cache = None
+_nutrition_lock = threading.Lock()
+
+def get_nutrition_cache() -> NutritionCache:
+    """Devuelve la caché de nutrientes del proceso (se crea al primer uso)."""
+    global _nutrition_cache
+    with _nutrition_lock:
+        if _nutrition_cache is None:
+            _nutrition_cache = NutritionCache(NUTRITION_CACHE_PATH)
+    return _nutrition_cache
+
+def parse_edamam_line(ingredient: dict):
+    """Análisis de una línea de la respuesta de Edamam, o None si no se pudo interpretar."""
+    parsed_data = ingredient.get("parsed", [])
+    if not parsed_data:
+        return None
+    ingredient_data = parsed_data[0]
+    nutrients = ingredient_data.get("nutrients", {})
+    parsed = {
+        "foodMatch": ingredient_data.get("foodMatch", "Unknown"),
+        "weight": ingredient_data.get("weight", 0),
+    }
+    for key, label in EDAMAM_NUTRIENTS.items():
+        parsed[label] = nutrients.get(key, {}).get("quantity", 0)
+    return parsed
+
+def parse_edamam_lines(lines, nutrition_data: dict) -> dict:
+    """
+    {línea: análisis o None} de una respuesta 200 de Edamam para las líneas enviadas (en el mismo
+    orden). Las etiquetas de salud de la respuesta solo son de la línea si se envió sola.
+    """
+    ingredients = nutrition_data.get("ingredients", [])
+    labels = nutrition_data.get("healthLabels", []) if len(lines) == 1 else None
+    parsed_lines = {}
+    for i, line in enumerate(lines):
+        parsed = parse_edamam_line(ingredients[i]) if i < len(ingredients) else None
+        if parsed is not None:
+            parsed["healthLabels"] = labels
+        parsed_lines[line] = parsed
+    return parsed_lines
+
+def get_nutrients_cached(ing_list, serving_size, cache: NutritionCache = None):
+    """
+    Igual que `get_nutrients`, pero con la caché por línea: como mucho una petición a Edamam
+    por receta (como `get_nutrients`) y ninguna si todas sus líneas están guardadas con etiquetas.
+    - La petición lleva las líneas que no están en la caché y las guardadas sin etiquetas
+      conocidas; las etiquetas de la respuesta son las de ese conjunto de líneas.
+    - Los totales de la receta se suman localmente a partir del análisis de cada línea.
+    - HealthLabels: intersección de las etiquetas de la petición y las de las demás líneas.
+    - Las líneas que Edamam no interpreta se ignoran en la receta (y no se envían si ya están en
+      la caché negativa). Un 555 no dice qué línea falla: solo entonces se reenvían las líneas de
+      una en una, lo que además guarda sus etiquetas exactas. Si no se interpreta ninguna, la
+      receta devuelve (555, 555) como `get_nutrients`.
+    - Lo ya analizado se guarda aunque Edamam falle a mitad.
+
+    Returns:
+        tuple: (pd.DataFrame, dict) como `get_nutrients`, o (status, status) si Edamam falla.
+    """
+    cache = cache or get_nutrition_cache()
+    keys = [NutritionCache.normalize(line) for line in ing_list]
+    known = cache.get_many(keys)
+    lines = [line for line in dict.fromkeys(keys) if line]
+    unlabeled = [line for line in lines if known.get(line) and known[line].get("healthLabels") is None]
+    pending = [line for line in lines if line not in known] + unlabeled
+    hits = len(lines) - len(pending)
+
+    fresh = {}
+    calls = 0
+    batch_labels = None
+    try:
+        if pending:
+            calls += 1
+            response = request_nutrition_details(pending)
+            if response.status_code == 200:
+                nutrition_data = response.json()
+                batch_labels = nutrition_data.get("healthLabels", [])
+                fresh.update(parse_edamam_lines(pending, nutrition_data))
+            elif response.status_code == 555 and len(pending) > 1:
+                for line in pending:
+                    calls += 1
+                    response = request_nutrition_details([line])
+                    if response.status_code == 555:
+                        fresh[line] = None
+                    elif response.status_code == 200:
+                        fresh.update(parse_edamam_lines([line], response.json()))
+                    else:
+                        break
+            elif response.status_code == 555:
+                fresh[pending[0]] = None
+            if response.status_code not in (200, 555):
+                print("Error:", response.status_code, response.json())
+                return response.status_code, response.status_code
+    finally:
+        cache.put_many(fresh)
+        cache.record(hits, len(pending), calls)
+
+    known.update(fresh)
+    if not any(known.get(key) for key in keys):
+        return 555, 555
+
+    # Montar detalle y resumen como los devuelve Edamam
+    nutrient_list = []
+    health_labels = None
+    for key in keys:
+        parsed = known.get(key)
+        if not parsed:
+            continue
+        nutrient_list.append({
+            "Ingredient": parsed["foodMatch"],
+            "Weight (g)": parsed["weight"],
+            **{label: parsed[label] for label in EDAMAM_NUTRIENTS.values()}
+        })
+        # Las líneas de una petición de varias líneas no tienen etiquetas propias: las de la petición
+        line_labels = parsed.get("healthLabels")
+        line_labels = (batch_labels or []) if line_labels is None else line_labels
+        health_labels = list(line_labels) if health_labels is None else [l for l in health_labels if l in line_labels]
+
+    nutrients_df = pd.DataFrame(nutrient_list, columns=["Ingredient", "Weight (g)", *EDAMAM_NUTRIENTS.values()])
+    recipe_summary = {label: float(nutrients_df[label].sum()) for label in EDAMAM_NUTRIENTS.values()}
+    recipe_summary["HealthLabels"] = health_labels or []
+    recipe_summary["weight"] = float(nutrients_df["Weight (g)"].sum())
+    recipe_summary["Serving Size"] = serving_size
+    return nutrients_df, recipe_summary
+
+
 # Supabase client global (o puedes instanciarlo donde más te convenga)
 def get_supabase_client() -> Client:
     """
@@ -126,10 +573,55 @@ def generate_ingredient_id(name: str) -> int:
     return int(hashlib.md5(name.encode()).hexdigest()[:8], 16)
 
 
-def get_or_create_ingredient(supabase: Client, ingredient_name: str, nutrients: dict, name_en: str, name_es: str) -> int:
+class NameIdMap:
+    """
+    Mapa name -> id de una tabla ('ingredients' o 'tags'), cargado una sola vez (paginando) al
+    empezar el ETL y actualizado en memoria con cada inserción, para resolver los ids sin
+    consultar a Supabase. Thread-safe.
+    """
+    def __init__(self, supabase: Client, table: str, page_size: int = 1000):
+        self.table = table
+        self._ids = {}
+        self._lock = threading.Lock()
+        start = 0
+        while True:
+            rows = SUPABASE_LIMITER.call(supabase.table(table).select("id, name").range(start, start + page_size - 1).execute).data
+            self._ids.update({row["name"]: row["id"] for row in rows if row["name"]})
+            if len(rows) < page_size:
+                break
+            start += page_size
+
+    def get(self, name: str):
+        return self._ids.get(name)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._ids
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def missing(self, names) -> list:
+        """Nombres (sin repetir, en orden) que aún no están en el mapa."""
+        return [name for name in dict.fromkeys(names) if name not in self._ids]
+
+    def update(self, ids: dict):
+        with self._lock:
+            self._ids.update(ids)
+
+
+def get_or_create_ingredient(supabase: Client, ingredient_name: str, nutrients: dict, name_en: str, name_es: str,
+                             ingredient_ids: NameIdMap = None) -> int:
     """
     Busca un ingrediente por nombre o lo inserta si no existe, retornando su ID.
+    - Con ingredient_ids (mapa precargado) la búsqueda es local y el mapa se actualiza al insertar.
     """
+    if ingredient_ids is not None:
+        if ingredient_name not in ingredient_ids:
+            insert_data = ingredient_row(ingredient_name, nutrients, name_en, name_es)
+            supabase.table("ingredients").upsert(insert_data, on_conflict="name", ignore_duplicates=True).execute()
+            ingredient_ids.update({ingredient_name: insert_data["id"]})
+        return ingredient_ids.get(ingredient_name)
+
     # 1. Verificar si ya existe en la tabla
     existing = supabase.table("ingredients").select("id").eq("name", ingredient_name).execute()
     p = inflect.engine()
@@ -138,22 +630,29 @@ def get_or_create_ingredient(supabase: Client, ingredient_name: str, nutrients:
         return existing.data[0]["id"]
     else:
         # 2. Insertar el nuevo ingrediente
-        ingredient_id = generate_ingredient_id(ingredient_name)
-        insert_data = {
-            "id": ingredient_id,
-            "name": ingredient_name,
-            "calories": float(nutrients.get("calories", 0.0)),
-            "proteins": float(nutrients.get("protein", 0.0)),
-            "carbs": float(nutrients.get("carbs", 0.0)),
-            "fats": float(nutrients.get("fat", 0.0)),
-            "sugars": float(nutrients.get("sugar", 0.0)),
-            "fiber": float(nutrients.get("fiber", 0.0)),
-            "name_en": name_en,
-            "name_es": name_es,
-            "name_norm" : p.singular_noun(ingredient_name) if p.singular_noun(ingredient_name) else ingredient_name
-        }
+        insert_data = ingredient_row(ingredient_name, nutrients, name_en, name_es, p)
         supabase.table("ingredients").insert(insert_data).execute()
-        return ingredient_id
+        return insert_data["id"]
+
+
+def ingredient_row(ingredient_name: str, nutrients: dict, name_en: str, name_es: str, p=None) -> dict:
+    """
+    Construye la fila de la tabla 'ingredients' (id generado a partir del nombre).
+    """
+    p = p or inflect.engine()
+    return {
+        "id": generate_ingredient_id(ingredient_name),
+        "name": ingredient_name,
+        "calories": float(nutrients.get("calories", 0.0)),
+        "proteins": float(nutrients.get("protein", 0.0)),
+        "carbs": float(nutrients.get("carbs", 0.0)),
+        "fats": float(nutrients.get("fat", 0.0)),
+        "sugars": float(nutrients.get("sugar", 0.0)),
+        "fiber": float(nutrients.get("fiber", 0.0)),
+        "name_en": name_en,
+        "name_es": name_es,
+        "name_norm" : p.singular_noun(ingredient_name) if p.singular_noun(ingredient_name) else ingredient_name
+    }
 
 
 def insert_recipe(
@@ -170,20 +669,7 @@ def insert_recipe(
     Inserta una nueva receta en la tabla 'recipes' y retorna su ID.
     """
     # Insert
-    insert_data = {
-        "name": recipe_name,
-        "name_en": name_en,
-        "name_es": name_es,
-        "url": recipe_url,
-        "weight": weight,
-        "calories": float(nutrients.get("calories", 0)) / serving_size,
-        "proteins": float(nutrients.get("protein", 0)) / serving_size,
-        "carbs": float(nutrients.get("carbs", 0)) / serving_size,
-        "fats": float(nutrients.get("fat", 0)) / serving_size,
-        "sugars": float(nutrients.get("sugar", 0)) / serving_size,
-        "fiber": float(nutrients.get("fiber", 0)) / serving_size,
-        "servings": serving_size
-    }
+    insert_data = recipe_row(recipe_name, name_en, name_es, recipe_url, weight, nutrients, serving_size)
     response = supabase.table("recipes").insert(insert_data).execute()
 
     # Supabase no siempre retorna el registro insertado (dependiendo de la configuración),
@@ -199,6 +685,27 @@ def insert_recipe(
         return None  # Manejo de error en caso de no encontrar
 
 
+def recipe_row(recipe_name: str, name_en: str, name_es: str, recipe_url: str, weight: float,
+               nutrients: dict, serving_size: int) -> dict:
+    """
+    Construye la fila de la tabla 'recipes' (nutrientes por ración).
+    """
+    return {
+        "name": recipe_name,
+        "name_en": name_en,
+        "name_es": name_es,
+        "url": recipe_url,
+        "weight": weight,
+        "calories": float(nutrients.get("calories", 0)) / serving_size,
+        "proteins": float(nutrients.get("protein", 0)) / serving_size,
+        "carbs": float(nutrients.get("carbs", 0)) / serving_size,
+        "fats": float(nutrients.get("fat", 0)) / serving_size,
+        "sugars": float(nutrients.get("sugar", 0)) / serving_size,
+        "fiber": float(nutrients.get("fiber", 0)) / serving_size,
+        "servings": serving_size
+    }
+
+
 def insert_ingredient_recipe(supabase: Client, recipe_id: int, ingredient_id: int, amount: float):
     """
     Inserta relación receta-ingrediente en la tabla 'recipe_ingredients'.
@@ -225,6 +732,13 @@ def insert_steps_from_jsonl(supabase: Client, jsonl: pd.DataFrame, index: int):
     steps_es = jsonl.loc[index, "instrucciones"]
     steps_en = translate_es_en(steps_es)  # se traduce a inglés
 
+    insert_steps(supabase, recipe_id, steps_es, steps_en)
+
+
+def insert_steps(supabase: Client, recipe_id: int, steps_es: str, steps_en: str):
+    """
+    Inserta los pasos de elaboración (ya traducidos) de una receta en la tabla 'steps'.
+    """
     supabase.table("steps").insert({
         "recipe_id": recipe_id,
         "description": steps_es,       # descripción original
@@ -233,18 +747,22 @@ def insert_steps_from_jsonl(supabase: Client, jsonl: pd.DataFrame, index: int):
     }).execute()
 
 
-def insert_tags(supabase: Client, recipe_id: int, health_labels: list):
+def insert_tags(supabase: Client, recipe_id: int, health_labels: list, tag_ids: NameIdMap = None):
     """
     Inserta etiquetas (tags) en la tabla 'tags' y su relación en 'recipe_tags'.
+    - Con tag_ids (mapa precargado) los tags existentes se resuelven en memoria y solo los
+      nuevos se insertan (y se añaden al mapa).
     """
     for label in health_labels:
         label_lower = label.lower().replace("_", " ")
 
-        # 1. Buscar tag
-        existing_tag = supabase.table("tags").select("id").eq("name", label_lower).execute()
-        if existing_tag.data and len(existing_tag.data) > 0:
-            tag_id = existing_tag.data[0]["id"]
+        # 1. Buscar tag (en el mapa precargado o en la tabla)
+        if tag_ids is not None:
+            tag_id = tag_ids.get(label_lower)
         else:
+            existing_tag = supabase.table("tags").select("id").eq("name", label_lower).execute()
+            tag_id = existing_tag.data[0]["id"] if existing_tag.data else None
+        if tag_id is None:
             # 2. Crear tag
             new_tag = supabase.table("tags").insert({
                 "name": label_lower,
@@ -258,6 +776,8 @@ def insert_tags(supabase: Client, recipe_id: int, health_labels: list):
                 # Si no viene el ID en la respuesta, recuperamos el ID seleccionando por nombre
                 tag_res = supabase.table("tags").select("id").eq("name", label_lower).execute()
                 tag_id = tag_res.data[0]["id"] if tag_res.data else None
+            if tag_ids is not None and tag_id:
+                tag_ids.update({label_lower: tag_id})
         
         # 3. Insertar relación recipe-tag
         if tag_id:
@@ -267,88 +787,769 @@ def insert_tags(supabase: Client, recipe_id: int, health_labels: list):
             }).execute()
 
 
-def process_recipes(file_path: str, leftoff_path: str):
+class EdamamError(Exception):
+    """Error de la API de Edamam (cualquier código distinto de 555) tras agotar los reintentos."""
+    def __init__(self, status_code):
+        super().__init__(f"Error en la API Edamam: {status_code}")
+        self.status_code = status_code
+
+
+def iter_jsonl(file_path: str, start_offset: int = 0):
+    """
+    Lee un JSONL de forma perezosa desde start_offset (en bytes), sin cargarlo entero.
+
+    Yields:
+        tuple: (offset, next_offset, line) de cada línea no vacía, con line en bytes.
+    """
+    with open(file_path, "rb") as file:
+        file.seek(start_offset)
+        offset = start_offset
+        for line in file:
+            next_offset = offset + len(line)
+            if line.strip():
+                yield offset, next_offset, line
+            offset = next_offset
+
+
+def line_hash(line: bytes) -> str:
+    return hashlib.sha1(line.rstrip(b"\r\n")).hexdigest()
+
+
+class Checkpoint:
+    """
+    Progreso del ETL sobre el JSONL, en bytes, independiente del orden en que terminan las recetas.
+    - "Offset": byte a partir del cual queda algo pendiente (todas las líneas anteriores están
+      terminadas); al reanudar se hace seek directamente ahí.
+    - "LineOffset" / "LineHash": inicio y hash de la última línea terminada antes de "Offset";
+      al reanudar se comprueban para detectar que el fichero ha cambiado.
+    - "Done": offsets terminados por encima de "Offset" (terminaron fuera de orden).
+    - "Position": número de líneas antes de "Offset" (informativo).
+    - Se escribe de forma atómica (temporal + rename) como mucho cada save_every recetas o
+      save_interval segundos, y siempre con `save()`. Tras una caída se reprocesan como mucho
+      esas recetas (la carga es un upsert, así que no se duplican).
+    - Acepta el formato antiguo por filas {"Position": n, "Done": [...]}: se recorre una vez el
+      fichero desde el principio saltando esas filas.
+    - Memoria acotada: como mucho max_pending recetas leídas y sin terminar desde "Offset"; al
+      llegar a ese límite `records` espera a que se marque la más antigua.
+    """
+    def __init__(self, path: str, save_every: int = 100, save_interval: float = 10.0, max_pending: int = 10000):
+        self.path = path
+        self.save_every = save_every
+        self.save_interval = save_interval
+        self.max_pending = max_pending
+        data = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as file:
+                data = json.load(file)
+        self.legacy = "Offset" not in data and "Position" in data
+        if self.legacy:
+            self.legacy_position = data["Position"]
+            self.legacy_done = set(data.get("Done", []))
+            data = {}
+        self.offset = data.get("Offset", 0)
+        self.position = data.get("Position", 0)
+        self.last_line = (data.get("LineOffset"), data.get("LineHash"))
+        self.done = set(data.get("Done", []))
+        self._in_flight = OrderedDict()  # offset -> (next_offset, hash), en orden del fichero
+        self._lock = threading.Lock()
+        self._marked = threading.Condition(self._lock)
+        self._unsaved = 0
+        self._last_save = time.time()
+
+    def _check_file(self, file_path: str):
+        line_offset, expected = self.last_line
+        if line_offset is None:
+            return
+        with open(file_path, "rb") as file:
+            file.seek(line_offset)
+            line = file.readline()
+        if line_offset + len(line) != self.offset or line_hash(line) != expected:
+            raise ValueError(f"{file_path} no coincide con el checkpoint {self.path}; bórralo para empezar de cero")
+
+    def records(self, file_path: str, skip=None, stop_event: threading.Event = None, on_invalid=None):
+        """
+        Recorre las recetas pendientes del JSONL (desde "Offset", saltando las de "Done").
+        - skip(record): si devuelve True, la receta se da por terminada sin procesarla.
+        - stop_event: deja de leer si se activa (también mientras espera por max_pending).
+        - on_invalid(offset, line, error): recibe las líneas que no son una receta (JSON mal
+          formado o sin "url"), que se dan por terminadas. Sin él, se lanza ValueError.
+
+        Yields:
+            dict: la receta con "offset" y "position" (número de línea) añadidos.
+        """
+        self._check_file(file_path)
+        position = self.position
+        for offset, next_offset, line in iter_jsonl(file_path, self.offset):
+            with self._lock:
+                while len(self._in_flight) >= self.max_pending:
+                    if stop_event is not None and stop_event.is_set():
+                        return
+                    self._marked.wait(1.0)
+                self._in_flight[offset] = (next_offset, line_hash(line))
+            done = offset in self.done or (
+                self.legacy and (position <= self.legacy_position or position in self.legacy_done)
+            )
+            record = None
+            if not done:
+                try:
+                    record = parse_record(line)
+                except ValueError as e:
+                    if on_invalid is None:
+                        raise
+                    on_invalid(offset, line, e)
+                    done = True
+                else:
+                    record.update(offset=offset, position=position)
+            if done or (skip is not None and skip(record)):
+                self.mark(offset)
+            else:
+                yield record
+            position += 1
+
+    def mark(self, offset: int):
+        """Marca como terminada la receta que empieza en offset."""
+        with self._lock:
+            self.done.add(offset)
+            while self._in_flight and next(iter(self._in_flight)) in self.done:
+                line_offset, (next_offset, h) = self._in_flight.popitem(last=False)
+                self.done.discard(line_offset)
+                self.offset, self.position, self.last_line = next_offset, self.position + 1, (line_offset, h)
+            self._marked.notify_all()
+            self._unsaved += 1
+            if self._unsaved >= self.save_every or time.time() - self._last_save >= self.save_interval:
+                self._save()
+
+    def save(self):
+        with self._lock:
+            self._save()
+
+    def _save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump({"Offset": self.offset, "Position": self.position, "LineOffset": self.last_line[0],
+                       "LineHash": self.last_line[1], "Done": sorted(self.done)}, file)
+        os.replace(tmp_path, self.path)
+        self._unsaved = 0
+        self._last_save = time.time()
+
+
+def parse_record(line: bytes) -> dict:
+    """Receta de una línea del JSONL; ValueError si no es un objeto JSON con "url"."""
+    record = json.loads(line)  # JSONDecodeError y UnicodeDecodeError son ValueError
+    if not isinstance(record, dict) or "url" not in record:
+        raise ValueError("la línea no es una receta con url")
+    return record
+
+
+def ingredient_lines(ingredients: dict) -> list:
+    """
+    Une nombre, cantidad y unidad de cada ingrediente en una línea de texto ("200 g harina").
+    """
+    return [
+        " ".join(filter(None, [str(c) if c is not None else None, u, n]))
+        for n, c, u in zip(ingredients['nombre'], ingredients['cantidad'], ingredients['unidad'])
+    ]
+
+
+def translate_recipe(recipe: dict) -> dict:
+    """
+    Etapa de traducción (DeepL): líneas de ingredientes, título y pasos al inglés.
+    """
+    lines = ingredient_lines(recipe["ingredientes"])
+    translated = translate_many(lines + [recipe["titulo"], recipe["instrucciones"]], 'es', 'en')
+    recipe["en_ingredients"] = translated[:len(lines)]
+    recipe["name_en"], recipe["steps_en"] = translated[len(lines):]
+    return recipe
+
+
+def health_tags(health_labels: list) -> list:
+    """Etiquetas de salud de Edamam como tags ("LOW_SUGAR" -> "low sugar") con su nombre en español."""
+    names = list(dict.fromkeys(label.lower().replace("_", " ") for label in health_labels))
+    return [{"name": name, "name_es": es.lower()} for name, es in zip(names, translate_many(names, 'en', 'es'))]
+
+
+def enrich_recipe(recipe: dict):
+    """
+    Etapa de enriquecimiento: información nutricional de Edamam (con la caché por línea),
+    normalizada a 100 g, y traducción al español del nombre de cada ingrediente detectado y
+    de las etiquetas de salud.
+    - Devuelve None si Edamam responde 555 (la receta se salta).
+    - Lanza EdamamError con cualquier otro error (ya reintentado por el limitador).
+    """
+    serving = int(recipe["raciones"])
+    nut_info, recipe_sum = get_nutrients_cached(recipe["en_ingredients"], serving)
+    if isinstance(nut_info, int) and nut_info == 555:
+        print(f"Edamam no pudo analizar la receta {recipe['url']} (555), se salta")
+        return None
+    elif isinstance(nut_info, int):
+        raise EdamamError(nut_info)
+
+    # Filtrar ingredientes con peso > 0
+    filtered_nut_info = nut_info[nut_info["Weight (g)"] > 0].copy()
+    columns_to_normalize = filtered_nut_info.columns[2:]  # desde 'calories' en adelante
+
+    # Normalizar a cada 100 g
+    filtered_nut_info[columns_to_normalize] = (
+        filtered_nut_info[columns_to_normalize]
+        .div(filtered_nut_info["Weight (g)"], axis=0)*100
+    )
+
+    recipe["summary"] = recipe_sum
+    recipe["serving"] = serving
+    recipe["tags"] = health_tags(recipe_sum.get("HealthLabels", []))
+    names_es = translate_many(filtered_nut_info["Ingredient"].tolist(), 'en', 'es')
+    recipe["ingredients"] = [
+        {
+            "name": row["Ingredient"].lower(),
+            "name_es": name_es.lower(),
+            "nutrients": row.to_dict(),
+            "weight": float(row["Weight (g)"])
+        }
+        for (_, row), name_es in zip(filtered_nut_info.iterrows(), names_es)
+    ]
+    return recipe
+
+
+def load_recipe(supabase: Client, recipe: dict, ingredient_ids: NameIdMap = None, tag_ids: NameIdMap = None) -> dict:
+    """
+    Etapa de carga: inserta receta, tags, pasos e ingredientes (con sus relaciones) en Supabase.
+    - ingredient_ids / tag_ids: mapas precargados para resolver los ids sin consultas.
+    """
+    recipe_sum = recipe["summary"]
+    recipe_id = insert_recipe(
+        supabase,
+        recipe["titulo"],
+        recipe["name_en"],
+        recipe["titulo"],
+        recipe["url"],
+        recipe_sum.get("weight"),
+        recipe_sum,
+        recipe["serving"]
+    )
+
+    # Insertar tags
+    insert_tags(supabase, recipe_id=recipe_id, health_labels=recipe_sum.get("HealthLabels", []), tag_ids=tag_ids)
+    # Insertar pasos de elaboración
+    insert_steps(supabase, recipe_id, recipe["instrucciones"], recipe["steps_en"])
+
+    # Insertar ingredientes (relación muchos a muchos)
+    for ingredient in recipe["ingredients"]:
+        ingredient_id = get_or_create_ingredient(
+            supabase,
+            ingredient["name"],
+            ingredient["nutrients"],
+            ingredient["name"],
+            ingredient["name_es"],
+            ingredient_ids
+        )
+        insert_ingredient_recipe(supabase, recipe_id, ingredient_id, ingredient["weight"])
+    return recipe
+
+
+def select_ids_by(supabase: Client, table: str, column: str, values: list, chunk_size: int = 200) -> dict:
+    """
+    Resuelve en bloque los ids de una tabla a partir de una columna única (p. ej. url o name).
+
+    Returns:
+        dict: valor -> id
+    """
+    ids = {}
+    values = list(values)
+    for i in range(0, len(values), chunk_size):
+        rows = SUPABASE_LIMITER.call(supabase.table(table).select(f"id, {column}").in_(column, values[i:i + chunk_size]).execute).data
+        ids.update({row[column]: row["id"] for row in rows})
+    return ids
+
+
+def staged_rows(recipes: list, p=None) -> dict:
+    """
+    Convierte un lote de recetas enriquecidas en filas con la forma de las tablas de Supabase,
+    enlazadas por URL de receta y nombre de ingrediente/tag (las tablas del staging):
+    recipes, ingredients, recipe_ingredients, tags y steps.
+    """
+    p = p or inflect.engine()
+    rows = {table: [] for table in ("recipes", "ingredients", "recipe_ingredients", "tags", "steps")}
+    ingredients = {}
+    for r in {r["url"]: r for r in recipes}.values():
+        rows["recipes"].append(
+            recipe_row(r["titulo"], r["name_en"], r["titulo"], r["url"], r["summary"].get("weight"), r["summary"], r["serving"])
+        )
+        rows["steps"].append({"url": r["url"], "description": r["instrucciones"],
+                              "description_es": r["instrucciones"], "description_en": r["steps_en"]})
+        tags = r["tags"] if "tags" in r else health_tags(r["summary"].get("HealthLabels", []))
+        rows["tags"].extend({"url": r["url"], "name": t["name"], "name_en": t["name"], "name_es": t["name_es"]} for t in tags)
+        amounts = {}
+        for ing in r["ingredients"]:
+            if ing["name"] not in ingredients:
+                ingredients[ing["name"]] = ingredient_row(ing["name"], ing["nutrients"], ing["name"], ing["name_es"], p)
+            # El mismo ingrediente en dos líneas de la receta: se suman las cantidades
+            amounts[ing["name"]] = amounts.get(ing["name"], 0.0) + ing["weight"]
+        rows["recipe_ingredients"].extend(
+            {"url": r["url"], "ingredient": name, "amount": amount} for name, amount in amounts.items()
+        )
+    rows["ingredients"] = list(ingredients.values())
+    return rows
+
+
+def check_bulk_constraints(supabase: Client):
+    """
+    Comprueba que la base tiene las restricciones únicas sobre las que hacen upsert `BulkLoader`
+    (con la función etl_missing_constraints que crea etl_pipeline/sql/bulk_load_constraints.sql).
+
+    Raises:
+        RuntimeError: si falta alguna restricción o la función (el SQL no se ha ejecutado).
+    """
+    try:
+        rows = SUPABASE_LIMITER.call(supabase.rpc("etl_missing_constraints").execute).data
+    except APIError as e:
+        raise RuntimeError(f"No se pudieron comprobar las restricciones de la base ({e.message}); "
+                           f"ejecuta {BULK_CONSTRAINTS_SQL} en Supabase") from e
+    missing = [row["missing"] for row in rows or []]
+    if missing:
+        raise RuntimeError(f"Faltan restricciones únicas para la carga en bloque: {', '.join(missing)}; "
+                           f"ejecuta {BULK_CONSTRAINTS_SQL} en Supabase")
+
+
+class BulkLoader:
+    """
+    Carga por lotes de recetas ya transformadas: acumula batch_size recetas y escribe cada
+    tabla con un único upsert multi-fila, resolviendo los ids generados en bloque.
+    - recipes: upsert on_conflict="url".
+    - tags e ingredients: los ids se resuelven con mapas name -> id precargados (`NameIdMap`);
+      solo los nombres nuevos se envían (upsert on_conflict="name" ignorando duplicados) y se
+      añaden al mapa. El id de un ingrediente es determinista (`generate_ingredient_id`).
+    - steps, recipe_tags y recipe_ingredients: upsert sobre (recipe_id[, tag_id/ingredient_id]),
+      así que reintentar un lote no duplica filas. Todas esas restricciones únicas las crea
+      etl_pipeline/sql/bulk_load_constraints.sql y se comprueban al crear el cargador.
+    - on_flush(batch) se llama con las recetas escritas, para marcar el progreso; si la escritura
+      falla se llama on_error(batch, exc) (o se lanza la excepción si no hay on_error).
+    - `add` escribe en el hilo que completa el lote: en el ETL lo llama su propia etapa de carga.
+    - Con staging, cada lote se guarda en Parquet (`staged_rows`) antes de cargarlo, y los ids
+      asignados a las recetas se guardan después en la tabla recipe_ids del staging.
+    - `load_rows` carga filas ya transformadas (p. ej. leídas del staging) sin llamar a ninguna API.
+    """
+    def __init__(self, supabase: Client, batch_size: int = 50, on_flush=None,
+                 ingredient_ids: NameIdMap = None, tag_ids: NameIdMap = None, staging: StagingWriter = None,
+                 on_error=None, check_constraints: bool = True):
+        if check_constraints:
+            check_bulk_constraints(supabase)
+        self.supabase = supabase
+        self.staging = staging
+        self.ingredient_ids = ingredient_ids if ingredient_ids is not None else NameIdMap(supabase, "ingredients")
+        self.tag_ids = tag_ids if tag_ids is not None else NameIdMap(supabase, "tags")
+        self.batch_size = batch_size
+        self.on_flush = on_flush
+        self.on_error = on_error
+        self._batch = []
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._inflect = inflect.engine()
+        self.rows = 0
+        self.requests = 0
+        self.recipes = 0
+        self.seconds = 0.0
+
+    def add(self, recipe: dict):
+        with self._lock:
+            self._batch.append(recipe)
+            if len(self._batch) < self.batch_size:
+                return
+            batch, self._batch = self._batch, []
+        self._write(batch)
+
+    def flush(self):
+        with self._lock:
+            batch, self._batch = self._batch, []
+        if batch:
+            self._write(batch)
+
+    def _upsert(self, table: str, rows: list, **kwargs):
+        if not rows:
+            return []
+        self._count(len(rows), 1)
+        return SUPABASE_LIMITER.call(self.supabase.table(table).upsert(rows, **kwargs).execute).data
+
+    def _count(self, rows: int, requests: int):
+        with self._stats_lock:
+            self.rows += rows
+            self.requests += requests
+
+    def _write(self, batch: list):
+        try:
+            rows = staged_rows(batch, self._inflect)
+            if self.staging is not None:
+                self.staging.write(rows)
+            self.load_rows(rows)
+        except Exception as e:
+            if self.on_error is None:
+                raise
+            self.on_error(batch, e)
+            return
+        if self.on_flush:
+            self.on_flush(batch)
+
+    def load_rows(self, rows: dict) -> dict:
+        """
+        Carga en Supabase las filas de `staged_rows` (o del staging).
+
+        Returns:
+            dict: url -> id de las recetas cargadas.
+        """
+        start = time.time()
+        sb = self.supabase
+
+        # 1. Recetas
+        recipe_ids = {row["url"]: row["id"] for row in self._upsert("recipes", rows["recipes"], on_conflict="url")}
+        missing = [row["url"] for row in rows["recipes"] if row["url"] not in recipe_ids]
+        if missing:
+            recipe_ids.update(select_ids_by(sb, "recipes", "url", missing))
+            self._count(0, 1)
+
+        # 2. Tags: solo los nuevos (ya traducidos en la transformación)
+        tags = {row["name"]: row for row in rows["tags"]}
+        new_tags = self.tag_ids.missing(tags)
+        if new_tags:
+            inserted = self._upsert("tags", [{k: tags[name][k] for k in ("name", "name_en", "name_es")} for name in new_tags],
+                                    on_conflict="name", ignore_duplicates=True)
+            self.tag_ids.update({row["name"]: row["id"] for row in inserted})
+            # Tags creados entre la precarga y ahora (otro proceso) no vienen en la respuesta
+            unresolved = self.tag_ids.missing(new_tags)
+            if unresolved:
+                self.tag_ids.update(select_ids_by(sb, "tags", "name", unresolved))
+                self._count(0, 1)
+
+        # 3. Ingredientes: solo los nuevos; el id es determinista y no hay que leerlo
+        new_ingredients = [row for row in rows["ingredients"] if row["name"] not in self.ingredient_ids]
+        self._upsert("ingredients", new_ingredients, on_conflict="name", ignore_duplicates=True)
+        self.ingredient_ids.update({row["name"]: row["id"] for row in new_ingredients})
+
+        # 4. Relaciones y pasos
+        steps = [
+            {"recipe_id": recipe_ids[row["url"]], **{k: row[k] for k in ("description", "description_es", "description_en")}}
+            for row in rows["steps"] if row["url"] in recipe_ids
+        ]
+        recipe_tags = {}
+        for row in rows["tags"]:
+            recipe_id, tag_id = recipe_ids.get(row["url"]), self.tag_ids.get(row["name"])
+            if recipe_id and tag_id:
+                recipe_tags[(recipe_id, tag_id)] = {"recipe_id": recipe_id, "tag_id": tag_id}
+        recipe_ingredients = {}
+        for row in rows["recipe_ingredients"]:
+            recipe_id, ingredient_id = recipe_ids.get(row["url"]), self.ingredient_ids.get(row["ingredient"])
+            if recipe_id and ingredient_id:
+                recipe_ingredients[(recipe_id, ingredient_id)] = {
+                    "recipe_id": recipe_id, "ingredient_id": ingredient_id, "amount": float(row["amount"])
+                }
+
+        self._upsert("steps", steps, on_conflict="recipe_id")
+        self._upsert("recipe_tags", list(recipe_tags.values()), on_conflict="recipe_id,tag_id")
+        self._upsert("recipe_ingredients", list(recipe_ingredients.values()), on_conflict="recipe_id,ingredient_id")
+
+        if self.staging is not None:
+            self.staging.write({"recipe_ids": [{"url": url, "recipe_id": recipe_id} for url, recipe_id in recipe_ids.items()]})
+        with self._stats_lock:
+            self.recipes += len(rows["recipes"])
+            self.seconds += time.time() - start
+        return recipe_ids
+
+    def stats(self) -> dict:
+        return {
+            "recipes": self.recipes,
+            "rows": self.rows,
+            "requests": self.requests,
+            "rows_per_sec": self.rows / self.seconds if self.seconds else 0.0,
+            "requests_per_recipe": self.requests / self.recipes if self.recipes else 0.0,
+        }
+
+
+def process_recipes(file_path: str, leftoff_path: str, translate_workers: int = 4, enrich_workers: int = 4,
+                    load_workers: int = 2, queue_size: int = 8, batch_size: int = 50,
+                    checkpoint_every: int = 100, checkpoint_interval: float = 10.0,
+                    shard: int = 0, n_shards: int = 1, journal_dir: str = JOURNAL_DIR,
+                    dead_letters_path: str = DEAD_LETTERS_PATH, staging_dir: str = STAGING_DIR,
+                    dedup: str = "skip", dedup_path: str = DEDUP_PATH):
     """
     Procesa recetas desde un archivo JSONL y almacena en Supabase.
     - file_path: ruta al archivo JSONL con las recetas.
-    - leftoff_path: ruta al archivo JSON con la posición de la última receta procesada.
+    - leftoff_path: ruta al archivo JSON con el progreso (ver `Checkpoint`); se guarda como
+      mucho cada checkpoint_every recetas o checkpoint_interval segundos.
+    - shard / n_shards: este worker solo procesa las recetas con shard_of(url) == shard, con su
+      propio checkpoint (`shard_path`) y su diario por URL (`ShardJournal` en journal_dir), de
+      modo que se pueden lanzar n_shards workers sobre el mismo fichero en varios procesos o
+      máquinas. Las URLs ya cargadas o saltadas según el diario no se reprocesan.
+    - dedup: antes de traducir y enriquecer, cada receta se compara con el índice MinHash LSH
+      persistente (`DedupIndex` en dedup_path) por título e ingredientes; las casi duplicadas de
+      una ya cargada se saltan ("skip", estado "duplicate" en el diario) o solo se avisan ("flag").
+      Las recetas entran en el índice cuando se escribe su lote, así que si una original falla o
+      se pierde al pararse, sus casi duplicadas se siguen procesando. Con "off" no se comprueba.
+    - Las recetas pasan por tres etapas concurrentes (traducción, enriquecimiento y carga), cada
+      una con su número de hilos, conectadas por colas de tamaño queue_size. La etapa de carga
+      las escribe en lotes de batch_size con `BulkLoader`, así que la latencia de Supabase no
+      frena el enriquecimiento.
+    - Cada lote transformado se guarda antes en Parquet en staging_dir (partición shard=<k>), de
+      modo que recargar la base (`load_staging`) o reconstruir el índice del recomendador no
+      vuelve a llamar a Edamam ni a DeepL.
+    - Una receta solo se marca como terminada cuando su lote está escrito. Al pararse, la etapa
+      de carga sigue con las recetas que ya le han llegado y siempre se escribe el último lote:
+      ya tienen gastadas las llamadas a las APIs.
+    - El ritmo de Edamam, DeepL y Supabase lo fijan sus limitadores (`RateLimiter`), no el número
+      de hilos.
+    - Una receta que falla tras los reintentos (o que Edamam no puede analizar, 555) se guarda en
+      el almacén de fallidas (`DeadLetterStore`) con su etapa, motivo y contenido, y el ETL sigue;
+      se reprocesan con `process_dead_letters`. Si el circuito de un proveedor se abre, las
+      recetas que lo encuentran abierto también van al almacén (motivo circuit_<proveedor>) y el
+      pipeline se detiene; las que aún no habían empezado se leen en la siguiente ejecución.
+      Así toda receta que empieza se termina o queda en el almacén, y la ventana del checkpoint
+      no crece.
     """
-    # 1. Carga de datos
-    dap = pd.read_json(file_path, lines=True)
-    with open(leftoff_path, 'r', encoding='utf-8') as file:
-        dap_leftoff = json.load(file)
+    # 1. Progreso (el JSONL se lee en streaming desde el último offset terminado)
+    checkpoint = Checkpoint(shard_path(leftoff_path, shard, n_shards), save_every=checkpoint_every,
+                            save_interval=checkpoint_interval)
+    journal = ShardJournal(journal_path(journal_dir, shard, n_shards))
+    dead_letters = DeadLetterStore(dead_letters_path)
+
+    dedup_index = DedupIndex(dedup_path) if dedup != "off" else None
+
+    def skip(recipe):
+        if shard_of(recipe["url"], n_shards) != shard or journal.is_final(recipe["url"]):
+            return True
+        if dedup_index is None:
+            return False
+        original, similarity = dedup_index.check(recipe, add=False)
+        if original is None:
+            return False
+        print(f"Receta {recipe['url']} casi duplicada de {original} (similitud {similarity:.2f})")
+        with counts_lock:
+            counts["duplicates"] += 1
+        if dedup == "skip":
+            journal.set_stage(recipe["url"], "duplicate")
+            return True
+        return False
+
+    def translate_stage(recipe):
+        recipe = translate_recipe(recipe)
+        journal.set_stage(recipe["url"], "translated")
+        return recipe
+
+    def enrich_stage(recipe):
+        result = enrich_recipe(recipe)
+        if result is None:
+            dead_letters.put(recipe, "enrich", "Edamam no pudo analizar la receta", journal.path, reason="edamam_555")
+        journal.set_stage(recipe["url"], "enriched" if result is not None else "skipped")
+        return result
 
     # 2. Instancia global de Supabase
     supabase = get_supabase_client()
 
-    # 3. Iterar recetas
-    for i in range(1 + dap_leftoff["Position"], len(dap)):
-        ingredients = dap["ingredientes"].loc[i]
-        # Unir nombre, cantidad, unidad
-        resultados = [
-            " ".join(filter(None, [str(c) if c is not None else None, u, n]))
-            for n, c, u in zip(ingredients['nombre'], ingredients['cantidad'], ingredients['unidad'])
-        ]
-        en_ingredients = [translate_es_en(e) for e in resultados]        
-        serving = dap["raciones"].loc[i]
-
-        # Obtener info nutricional de la API de Edamam
-        nut_info, recipe_sum = get_nutrients(en_ingredients, int(serving))
-        if isinstance(nut_info, int) and nut_info != 555:
-            print("Error en la API Edamam:", nut_info)
-            break  # Detenemos si hay error distinto a 555
-        elif isinstance(nut_info, int) and nut_info == 555:
-            # Guardar la posición actual y continuar
-            json.dump(dap_leftoff, open(leftoff_path, "w"))
-            continue
+    stop = threading.Event()
+    counts = {"loaded": 0, "skipped": 0, "failed": 0, "duplicates": 0}
+    counts_lock = threading.Lock()
+
+    def on_flush(batch):
+        with counts_lock:
+            counts["loaded"] += len(batch)
+        journal.set_many([recipe["url"] for recipe in batch], "loaded")
+        if dedup_index is not None:
+            dedup_index.add_many(batch)
+        for recipe in batch:
+            checkpoint.mark(recipe["offset"])
+
+    def on_load_error(batch, e):
+        print(f"Error al escribir un lote de {len(batch)} recetas en Supabase: {e}")
+        for recipe in batch:
+            on_error(recipe, "load", e)
 
-        # Actualizar posición en el archivo de progreso
-        dap_leftoff["Position"] = i
+    loader = BulkLoader(supabase, batch_size=batch_size, on_flush=on_flush, on_error=on_load_error,
+                        staging=StagingWriter(staging_dir, f"shard={shard}"))
+    print(f"Mapas precargados: {len(loader.ingredient_ids)} ingredientes, {len(loader.tag_ids)} tags")
 
-        # Filtrar ingredientes con peso > 0
-        filtered_nut_info = nut_info[nut_info["Weight (g)"] > 0].copy()
-        columns_to_normalize = filtered_nut_info.columns[2:]  # desde 'calories' en adelante
+    def load_stage(recipe):
+        loader.add(recipe)
+        return recipe
 
-        # Normalizar a cada 100 g
-        filtered_nut_info[columns_to_normalize] = (
-            filtered_nut_info[columns_to_normalize]
-            .div(filtered_nut_info["Weight (g)"], axis=0)*100
+    def on_done(recipe, result):
+        # Las recetas que pasan la etapa de carga se marcan al escribir su lote (on_flush)
+        if result is None:
+            with counts_lock:
+                counts["skipped"] += 1
+            checkpoint.mark(recipe["offset"])
+
+    def on_error(recipe, stage, e):
+        print(f"Error en la etapa '{stage}' con la receta {recipe['url']}: {e}")
+        if isinstance(e, CircuitOpenError):
+            stop.set()  # Un proveedor falla de forma sostenida: se para y se reanuda en otra ejecución
+        dead_letters.put(recipe, stage, e, journal.path)
+        journal.set_stage(recipe["url"], "failed")
+        with counts_lock:
+            counts["failed"] += 1
+        checkpoint.mark(recipe["offset"])
+
+    def on_invalid(offset, line, e):
+        print(f"Línea no válida en {file_path} (byte {offset}): {e}")
+        invalid = {"url": f"{file_path}@{offset}", "offset": offset, "raw_line": line.decode("utf-8", "replace")}
+        dead_letters.put(invalid, "read", e, journal.path, reason="invalid_json")
+        with counts_lock:
+            counts["failed"] += 1
+
+    # 3. Iterar recetas (lo ya transformado se escribe y el progreso se guarda aunque algo falle)
+    start = time.time()
+    try:
+        run_pipeline(
+            checkpoint.records(file_path, skip=skip, stop_event=stop, on_invalid=on_invalid),
+            [
+                Stage("translate", translate_stage, workers=translate_workers, queue_size=queue_size),
+                Stage("enrich", enrich_stage, workers=enrich_workers, queue_size=queue_size),
+                Stage("load", load_stage, workers=load_workers, queue_size=queue_size, drain_on_stop=True),
+            ],
+            on_done=on_done,
+            on_error=on_error,
+            stop_event=stop
         )
+    finally:
+        loader.flush()
+        checkpoint.save()
+        journal.close()
+    elapsed = time.time() - start
+    if n_shards > 1:
+        print(f"Partición {shard} de {n_shards}")
+    print(f"Recetas cargadas: {counts['loaded']} | saltadas: {counts['skipped']} | fallidas: {counts['failed']} | "
+          f"casi duplicadas: {counts['duplicates']} | {counts['loaded'] / elapsed * 60:.1f} recetas/min")
+    if dedup_index is not None:
+        print(f"Índice de duplicados: {dedup_index.stats()}")
+        dedup_index.close()
+    print_dead_letter_counts(dead_letters)
+    dead_letters.close()
+    print(f"Carga en bloque: {loader.stats()}")
+    print(f"Caché de traducciones: {get_translation_cache().stats()}")
+    print(f"Caché de Edamam: {get_nutrition_cache().stats()}")
+    for limiter in (EDAMAM_LIMITER, DEEPL_LIMITER, SUPABASE_LIMITER):
+        print(f"Limitador {limiter.name}: {limiter.stats()}")
 
-        # Guardar la posición actual en el JSON
-        json.dump(dap_leftoff, open(leftoff_path, "w"))
 
-        # Insertar receta
-        recipe_id = insert_recipe(
-            supabase,
-            dap["titulo"].loc[i],
-            translate_es_en(dap["titulo"].loc[i]),
-            dap["titulo"].loc[i],
-            dap["url"].loc[i],
-            recipe_sum.get("weight"),
-            recipe_sum,
-            int(serving)
+def print_dead_letter_counts(dead_letters: DeadLetterStore):
+    """Imprime los fallos acumulados por etapa y motivo."""
+    for stage, reason, n, attempts in dead_letters.counts():
+        print(f"Fallidas en '{stage}' por {reason}: {n} ({attempts} intentos)")
+
+
+def process_dead_letters(reason: str = None, max_attempts: int = None, translate_workers: int = 2,
+                         enrich_workers: int = 2, load_workers: int = 1, queue_size: int = 8, batch_size: int = 20,
+                         dead_letters_path: str = DEAD_LETTERS_PATH, staging_dir: str = STAGING_DIR,
+                         dedup_path: str = DEDUP_PATH):
+    """
+    Reprocesa las recetas del almacén de fallidas (traducción, enriquecimiento y carga) sin
+    volver a leer el JSONL, con sus propios hilos y tamaño de lote.
+    - reason: solo las fallidas por ese motivo (p. ej. "edamam_555", "parse").
+    - max_attempts: ignora las que ya han fallado ese número de veces.
+    - Las que se cargan salen del almacén, su URL pasa a "loaded" en el diario de su partición y
+      entran en el índice de duplicados (dedup_path, si existe); las que vuelven a fallar se
+      actualizan (etapa, error, un intento más).
+    """
+    dead_letters = DeadLetterStore(dead_letters_path)
+    dedup_index = DedupIndex(dedup_path) if os.path.exists(dedup_path) else None
+    entries = dead_letters.entries(reason=reason, max_attempts=max_attempts)
+    # Las líneas no válidas del JSONL (raw_line) no son recetas: hay que corregir el fichero
+    invalid = [recipe["url"] for recipe, _ in entries if "raw_line" in recipe]
+    if invalid:
+        print(f"{len(invalid)} líneas no válidas del JSONL no se reprocesan (motivo invalid_json)")
+    entries = [(recipe, path) for recipe, path in entries if "raw_line" not in recipe]
+    journals = {recipe["url"]: path for recipe, path in entries}
+    print(f"Reprocesando {len(entries)} recetas fallidas")
+
+    stop = threading.Event()
+    counts = {"loaded": 0, "failed": 0}
+    counts_lock = threading.Lock()
+
+    def on_flush(batch):
+        urls = [recipe["url"] for recipe in batch]
+        dead_letters.remove(urls)
+        by_journal = {}
+        for url in urls:
+            if journals.get(url):
+                by_journal.setdefault(journals[url], []).append(url)
+        for path, journal_urls in by_journal.items():
+            journal = ShardJournal(path)
+            journal.set_many(journal_urls, "loaded")
+            journal.close()
+        if dedup_index is not None:
+            dedup_index.add_many(batch)
+        with counts_lock:
+            counts["loaded"] += len(batch)
+
+    def on_load_error(batch, e):
+        print(f"Error al escribir un lote de {len(batch)} recetas en Supabase: {e}")
+        for recipe in batch:
+            on_error(recipe, "load", e)
+
+    loader = BulkLoader(get_supabase_client(), batch_size=batch_size, on_flush=on_flush, on_error=on_load_error,
+                        staging=StagingWriter(staging_dir, "shard=dlq"))
+
+    def enrich_stage(recipe):
+        result = enrich_recipe(recipe)
+        if result is None:
+            dead_letters.put(recipe, "enrich", "Edamam no pudo analizar la receta", reason="edamam_555")
+            with counts_lock:
+                counts["failed"] += 1
+        return result
+
+    def load_stage(recipe):
+        loader.add(recipe)
+        return recipe
+
+    def on_error(recipe, stage, e):
+        print(f"Error en la etapa '{stage}' con la receta {recipe['url']}: {e}")
+        if isinstance(e, CircuitOpenError):
+            stop.set()
+            return
+        dead_letters.put(recipe, stage, e)
+        with counts_lock:
+            counts["failed"] += 1
+
+    start = time.time()
+    try:
+        run_pipeline(
+            (recipe for recipe, _ in entries),
+            [
+                Stage("translate", translate_recipe, workers=translate_workers, queue_size=queue_size),
+                Stage("enrich", enrich_stage, workers=enrich_workers, queue_size=queue_size),
+                Stage("load", load_stage, workers=load_workers, queue_size=queue_size, drain_on_stop=True),
+            ],
+            on_error=on_error,
+            stop_event=stop
         )
-        
-        # Insertar tags
-        insert_tags(supabase, recipe_id=recipe_id, health_labels=recipe_sum.get("HealthLabels", []))
-        # Insertar pasos de elaboración
-        insert_steps_from_jsonl(supabase, dap, i)
-
-        # Insertar ingredientes (relación muchos a muchos)
-        for j in filtered_nut_info.index:
-            ingredient_id = get_or_create_ingredient(
-                supabase,
-                filtered_nut_info.loc[j].get("Ingredient").lower(),
-                filtered_nut_info.loc[j],
-                filtered_nut_info.loc[j].get("Ingredient").lower(),
-                translate_en_es(filtered_nut_info.loc[j].get("Ingredient")).lower()
-            )
-            insert_ingredient_recipe(
-                supabase,
-                recipe_id,
-                ingredient_id,
-                float(filtered_nut_info.loc[j].get("Weight (g)"))
-            )
+    finally:
+        loader.flush()
+    elapsed = time.time() - start
+    print(f"Recuperadas: {counts['loaded']} | siguen fallando: {counts['failed']} | "
+          f"{counts['loaded'] / elapsed * 60 if elapsed else 0:.1f} recetas/min")
+    print_dead_letter_counts(dead_letters)
+    dead_letters.close()
+    if dedup_index is not None:
+        dedup_index.close()
+
+
+def load_staging(staging_dir: str = STAGING_DIR, batch_size: int = 500):
+    """
+    Carga en Supabase todo lo que hay en el staging, en lotes de batch_size recetas, sin
+    llamar a ninguna API externa (p. ej. para reconstruir una base vacía).
+    - Los ids asignados se vuelven a guardar en recipe_ids (partición "reload").
+    """
+    rows = read_rows(staging_dir)
+    ingredients = {row["name"]: row for row in rows["ingredients"]}
+    by_url = {}
+    for table in ("recipe_ingredients", "tags", "steps"):
+        for row in rows[table]:
+            by_url.setdefault((table, row["url"]), []).append(row)
 
-        time.sleep(2)
+    loader = BulkLoader(get_supabase_client(), staging=StagingWriter(staging_dir, "reload"))
+    print(f"Recetas en staging: {len(rows['recipes'])}")
+    for i in range(0, len(rows["recipes"]), batch_size):
+        recipes = rows["recipes"][i:i + batch_size]
+        batch = {"recipes": recipes}
+        for table in ("recipe_ingredients", "tags", "steps"):
+            batch[table] = [row for r in recipes for row in by_url.get((table, r["url"]), [])]
+        names = dict.fromkeys(row["ingredient"] for row in batch["recipe_ingredients"])
+        batch["ingredients"] = [ingredients[name] for name in names if name in ingredients]
+        loader.load_rows(batch)
+        print(f"Cargadas {min(i + batch_size, len(rows['recipes']))} de {len(rows['recipes'])} recetas")
+    print(f"Carga desde staging: {loader.stats()}")
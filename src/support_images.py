@@ -0,0 +1,166 @@
+import time
+import codecs
+import itertools
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class _StopParsing(Exception):
+    pass
+
+
+class ImageTagParser(HTMLParser):
+    """
+    Parser incremental que se detiene en cuanto encuentra la imagen de la página:
+    `<meta property="og:image">` (va en el <head>) o, si no hay, el primer `<img src>`.
+    """
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.image = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "meta" and (attrs.get("property") or attrs.get("name")) in ("og:image", "og:image:url"):
+            self.image = attrs.get("content") or None
+        elif tag == "img" and attrs.get("src"):
+            self.image = attrs["src"]
+        if self.image:
+            raise _StopParsing
+
+    handle_startendtag = handle_starttag
+
+
+def make_session(pool_size: int = 16, retries: int = 2) -> requests.Session:
+    """Sesión HTTP con un pool de pool_size conexiones por host y reintentos de errores transitorios."""
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=pool_size, pool_maxsize=pool_size,
+        max_retries=Retry(total=retries, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504))
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers["User-Agent"] = "foodscope-image-backfill"
+    return session
+
+
+def find_image_url(session: requests.Session, url: str, chunk_size: int = 8192, max_bytes: int = 512 * 1024,
+                   timeout: float = 10.0):
+    """
+    Descarga la página en streaming solo hasta encontrar la imagen (o max_bytes).
+
+    Returns:
+        tuple: (URL absoluta de la imagen o None, bytes leídos)
+    """
+    parser = ImageTagParser()
+    n_bytes = 0
+    with session.get(url, stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        charset = response.encoding if "charset" in response.headers.get("Content-Type", "").lower() else "utf-8"
+        decoder = codecs.getincrementaldecoder(charset)(errors="replace")
+        try:
+            for chunk in response.iter_content(chunk_size):
+                n_bytes += len(chunk)
+                parser.feed(decoder.decode(chunk))
+                if n_bytes >= max_bytes:
+                    break
+        except _StopParsing:
+            pass
+    return (urljoin(url, parser.image) if parser.image else None), n_bytes
+
+
+def find_image_urls(urls, workers: int = 16, session: requests.Session = None, **kwargs):
+    """
+    Busca la imagen de varias páginas con como mucho workers descargas a la vez.
+
+    Yields:
+        tuple: (url, URL de la imagen o None, bytes leídos, error o None), en orden de llegada.
+    """
+    session = session or make_session(workers)
+    urls = iter(urls)
+
+    def fetch(url):
+        try:
+            return (url, *find_image_url(session, url, **kwargs), None)
+        except (requests.RequestException, ValueError) as e:
+            return url, None, 0, e
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # Ventana acotada: nunca hay más de 2 * workers páginas en vuelo
+        pending = {executor.submit(fetch, url) for url in itertools.islice(urls, 2 * workers)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+            pending |= {executor.submit(fetch, url) for url in itertools.islice(urls, len(done))}
+
+
+def update_image_urls(supabase, rows, chunk_size: int = 200):
+    """
+    Escribe recipes.img_url de un lote de filas {url, img_url} en bloque: lee las recetas
+    completas del lote y las reescribe con un único upsert por url. Un upsert solo con url e
+    img_url no sirve: insertaría filas sin las demás columnas NOT NULL de recipes y falla el lote.
+    - Necesita la restricción única de recipes(url) (etl_pipeline/sql/bulk_load_constraints.sql).
+    - Las URLs que ya no están en recipes se ignoran.
+    """
+    images = {row["url"]: row["img_url"] for row in rows}
+    urls = list(images)
+    recipes = []
+    for i in range(0, len(urls), chunk_size):
+        recipes.extend(supabase.table("recipes").select("*").in_("url", urls[i:i + chunk_size]).execute().data)
+    for recipe in recipes:
+        recipe["img_url"] = images[recipe["url"]]
+    if recipes:
+        supabase.table("recipes").upsert(recipes, on_conflict="url").execute()
+
+
+def backfill_images(supabase, workers: int = 16, batch_size: int = 100, page_size: int = 1000, write=None):
+    """
+    Rellena recipes.img_url de las recetas que no la tienen.
+    - Lee las URLs pendientes paginando y las procesa con `find_image_urls`.
+    - Escribe los resultados en lotes de batch_size filas {url, img_url}, cada uno con una
+      lectura y un upsert (`update_image_urls`) en vez de una petición por receta.
+    - write(rows): función de escritura de cada lote (por defecto, `update_image_urls`).
+
+    Returns:
+        dict: páginas procesadas, imágenes encontradas, errores, páginas/s y KiB leídos por página.
+    """
+    urls = []
+    start = 0
+    while True:
+        rows = supabase.table("recipes").select("url").is_("img_url", None).range(start, start + page_size - 1).execute().data
+        urls.extend(row["url"] for row in rows)
+        if len(rows) < page_size:
+            break
+        start += page_size
+    print(f"Recetas sin imagen: {len(urls)}")
+
+    write = write or (lambda rows: update_image_urls(supabase, rows))
+    batch = []
+    stats = {"pages": 0, "found": 0, "errors": 0, "bytes": 0}
+    begin = time.time()
+    for url, image, n_bytes, error in find_image_urls(urls, workers=workers):
+        stats["pages"] += 1
+        stats["bytes"] += n_bytes
+        if error is not None:
+            stats["errors"] += 1
+            print(f"Error al descargar {url}: {error}")
+        elif image:
+            stats["found"] += 1
+            batch.append({"url": url, "img_url": image})
+            if len(batch) >= batch_size:
+                write(batch)
+                batch = []
+    if batch:
+        write(batch)
+
+    elapsed = time.time() - begin
+    stats["pages_per_sec"] = stats["pages"] / elapsed if elapsed else 0.0
+    stats["kib_per_page"] = stats["bytes"] / 1024 / stats["pages"] if stats["pages"] else 0.0
+    print(f"Imágenes insertadas: {stats['found']} de {stats['pages']} páginas | errores: {stats['errors']} | "
+          f"{stats['pages_per_sec']:.1f} páginas/s | {stats['kib_per_page']:.1f} KiB/página")
+    return stats
@@ -0,0 +1,90 @@
+import os
+import time
+import hashlib
+import sqlite3
+import threading
+
+# Estados de una receta en el diario, en orden
+STAGES = ("translated", "enriched", "skipped", "duplicate", "failed", "loaded")
+# Estados finales: la receta no se vuelve a procesar (las fallidas se reprocesan desde su almacén)
+FINAL_STAGES = ("skipped", "duplicate", "failed", "loaded")
+
+
+def shard_of(url: str, n_shards: int) -> int:
+    """Partición de una receta: hash estable (MD5) de su URL módulo n_shards."""
+    return int(hashlib.md5(url.encode("utf-8")).hexdigest()[:8], 16) % n_shards
+
+
+def shard_path(path: str, shard: int, n_shards: int) -> str:
+    """Ruta propia de una partición ("dap_leftoff.json" -> "dap_leftoff.shard-1-of-4.json")."""
+    if n_shards == 1:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.shard-{shard}-of-{n_shards}{ext}"
+
+
+def journal_path(journal_dir: str, shard: int, n_shards: int) -> str:
+    return os.path.join(journal_dir, f"shard-{shard}-of-{n_shards}.sqlite")
+
+
+class ShardJournal:
+    """
+    Diario de una partición del ETL (SQLite): último estado de cada URL (translated, enriched,
+    skipped, duplicate, failed, loaded) y cuándo cambió.
+    - Una URL en un estado final no se vuelve a procesar, así que relanzar un worker (o
+      procesar un fichero que repite URLs) es idempotente.
+    - Cada worker escribe solo su diario; el coordinador los lee para el progreso.
+    """
+    def __init__(self, path: str, readonly: bool = False):
+        self.path = path
+        self._lock = threading.Lock()
+        if readonly:
+            self._db = sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=30, check_same_thread=False)
+            return
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS journal (url TEXT PRIMARY KEY, stage TEXT, updated REAL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS journal_updated ON journal (stage, updated)")
+        self._db.commit()
+
+    def stage(self, url: str):
+        """Último estado de la URL, o None si no se ha empezado."""
+        with self._lock:
+            row = self._db.execute("SELECT stage FROM journal WHERE url = ?", (url,)).fetchone()
+        return row[0] if row else None
+
+    def is_final(self, url: str) -> bool:
+        return self.stage(url) in FINAL_STAGES
+
+    def set_many(self, urls, stage: str):
+        now = time.time()
+        with self._lock:
+            self._db.executemany("INSERT OR REPLACE INTO journal VALUES (?, ?, ?)", [(url, stage, now) for url in urls])
+            self._db.commit()
+
+    def set_stage(self, url: str, stage: str):
+        self.set_many([url], stage)
+
+    def counts(self) -> dict:
+        """Número de URLs en cada estado."""
+        with self._lock:
+            rows = self._db.execute("SELECT stage, COUNT(*) FROM journal GROUP BY stage").fetchall()
+        return {stage: dict(rows).get(stage, 0) for stage in STAGES}
+
+    def throughput(self, window: float = 600.0) -> float:
+        """Recetas terminadas (en un estado final) por minuto en los últimos window segundos."""
+        with self._lock:
+            (n,) = self._db.execute(
+                f"SELECT COUNT(*) FROM journal WHERE stage IN ({', '.join('?' * len(FINAL_STAGES))}) AND updated >= ?",
+                (*FINAL_STAGES, time.time() - window)
+            ).fetchone()
+        return n / window * 60
+
+    def last_update(self):
+        with self._lock:
+            (updated,) = self._db.execute("SELECT MAX(updated) FROM journal").fetchone()
+        return updated
+
+    def close(self):
+        self._db.close()
@@ -0,0 +1,192 @@
+import time
+import queue
+import threading
+from collections import deque
+
+import cv2
+import numpy as np
+
+
+def put_latest(q, item):
+    """
+    Mete item en una cola acotada descartando el elemento más antiguo si está llena,
+    para que los consumidores siempre trabajen con el frame más reciente.
+    """
+    while True:
+        try:
+            q.put_nowait(item)
+            return
+        except queue.Full:
+            try:
+                q.get_nowait()
+            except queue.Empty:
+                pass
+
+
+def box_iou(a, b):
+    """IoU entre dos cajas xyxy."""
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, x2 - x1) * max(0.0, y2 - y1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def to_xyxy(boxes, width, height):
+    """Convierte cajas cxcywh normalizadas (salida de GroundingDINO) a xyxy en píxeles."""
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4) * np.array([width, height, width, height], dtype=np.float32)
+    xyxy = np.empty_like(boxes)
+    xyxy[:, :2] = boxes[:, :2] - boxes[:, 2:] / 2
+    xyxy[:, 2:] = boxes[:, :2] + boxes[:, 2:] / 2
+    return xyxy
+
+
+class IoUTracker:
+    """
+    Tracker ligero por IoU para mantener las detecciones entre inferencias.
+    - Asocia cada detección nueva con el track de la misma frase con mayor IoU (greedy).
+    - Suaviza la caja con una media exponencial para que el overlay no salte.
+    - Elimina los tracks que no se ven en max_missed inferencias seguidas.
+    """
+    def __init__(self, iou_threshold=0.3, max_missed=2, smoothing=0.5):
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.smoothing = smoothing
+        self.tracks = []
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def update(self, boxes, scores, phrases):
+        """Actualiza los tracks con las detecciones (xyxy en píxeles) de una inferencia."""
+        with self._lock:
+            unmatched = set(range(len(self.tracks)))
+            for box, score, phrase in sorted(zip(boxes, scores, phrases), key=lambda d: -d[1]):
+                best, best_iou = None, self.iou_threshold
+                for i in unmatched:
+                    track = self.tracks[i]
+                    if track["phrase"] != phrase:
+                        continue
+                    iou = box_iou(track["box"], box)
+                    if iou >= best_iou:
+                        best, best_iou = i, iou
+                if best is None:
+                    self.tracks.append({"id": self._next_id, "box": np.array(box, dtype=np.float32),
+                                        "score": float(score), "phrase": phrase, "missed": 0})
+                    self._next_id += 1
+                else:
+                    track = self.tracks[best]
+                    track["box"] = self.smoothing * track["box"] + (1 - self.smoothing) * np.asarray(box, dtype=np.float32)
+                    track["score"] = float(score)
+                    track["missed"] = 0
+                    unmatched.discard(best)
+
+            for i in unmatched:
+                self.tracks[i]["missed"] += 1
+            self.tracks = [t for t in self.tracks if t["missed"] <= self.max_missed]
+
+    def snapshot(self):
+        with self._lock:
+            return [dict(t) for t in self.tracks]
+
+
+def draw_tracks(frame, tracks):
+    """Dibuja los tracks sobre el frame (in situ) con primitivas de cv2."""
+    for track in tracks:
+        x1, y1, x2, y2 = track["box"].astype(int)
+        cv2.rectangle(frame, (x1, y1), (x2, y2), (34, 103, 242), 2)
+        cv2.putText(frame, f"{track['phrase']} {track['score']:.2f}", (x1, max(y1 - 6, 12)),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (34, 103, 242), 1, cv2.LINE_AA)
+    return frame
+
+
+class RateMeter:
+    """Mide la frecuencia (eventos/s) sobre una ventana deslizante."""
+    def __init__(self, window=30):
+        self._times = deque(maxlen=window)
+
+    def tick(self):
+        self._times.append(time.perf_counter())
+
+    def rate(self):
+        if len(self._times) < 2:
+            return 0.0
+        return (len(self._times) - 1) / (self._times[-1] - self._times[0])
+
+
+def live_feed(detector, preprocess, source=0, box_threshold=0.30, text_threshold=0.25, window_name="Live Feed"):
+    """
+    Detección continua sobre la cámara con captura, inferencia y visualización desacopladas.
+    - Hilo de captura: lee frames y los publica en colas de tamaño 1 (se descartan los viejos).
+    - Hilo de inferencia: toma siempre el frame más reciente, ejecuta el detector y
+      actualiza el tracker, al ritmo que permita la CPU.
+    - Hilo principal: muestra cada frame con los tracks actuales, los FPS de visualización,
+      los FPS de inferencia y la latencia de la última inferencia.
+
+    Args:
+        detector: objeto con `predict(image, box_threshold, text_threshold)`.
+        preprocess (callable): frame BGR -> tensor de entrada del modelo.
+        source: índice de cámara o URL de vídeo para cv2.VideoCapture.
+    """
+    cap = cv2.VideoCapture(source)
+    cv2.namedWindow(window_name, cv2.WINDOW_NORMAL)
+
+    display_queue = queue.Queue(maxsize=1)
+    inference_queue = queue.Queue(maxsize=1)
+    stop = threading.Event()
+    tracker = IoUTracker()
+    display_rate, inference_rate = RateMeter(), RateMeter()
+    stats = {"latency_ms": 0.0}
+
+    def capture_loop():
+        while not stop.is_set() and cap.isOpened():
+            ret, frame = cap.read()
+            if not ret:
+                print("No se pudo leer el frame de la cámara.")
+                break
+            put_latest(display_queue, frame)
+            put_latest(inference_queue, frame)
+        stop.set()
+
+    def inference_loop():
+        while not stop.is_set():
+            try:
+                frame = inference_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            start = time.perf_counter()
+            boxes, logits, phrases = detector.predict(
+                preprocess(frame), box_threshold=box_threshold, text_threshold=text_threshold
+            )
+            h, w = frame.shape[:2]
+            tracker.update(to_xyxy(boxes, w, h), [float(l) for l in logits], phrases)
+            stats["latency_ms"] = (time.perf_counter() - start) * 1000
+            inference_rate.tick()
+
+    threads = [threading.Thread(target=capture_loop, daemon=True),
+               threading.Thread(target=inference_loop, daemon=True)]
+    for t in threads:
+        t.start()
+
+    print("Detección continua activa. Presiona 'ESC' para salir.")
+    while not stop.is_set():
+        try:
+            frame = display_queue.get(timeout=0.1)
+        except queue.Empty:
+            continue
+        # Se dibuja sobre una copia: el mismo frame puede estar en uso por el hilo de inferencia
+        frame = draw_tracks(frame.copy(), tracker.snapshot())
+        display_rate.tick()
+        cv2.putText(frame, f"FPS {display_rate.rate():.1f} | inferencia {inference_rate.rate():.2f}/s "
+                           f"| latencia {stats['latency_ms']:.0f} ms",
+                    (10, 24), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2, cv2.LINE_AA)
+        cv2.imshow(window_name, frame)
+        if cv2.waitKey(1) & 0xFF == 27:  # Tecla ESC para salir
+            break
+
+    stop.set()
+    for t in threads:
+        t.join(timeout=5)
+    cap.release()
+    cv2.destroyAllWindows()
+    print(f"FPS de visualización: {display_rate.rate():.1f} | inferencias/s: {inference_rate.rate():.2f} "
+          f"| última latencia: {stats['latency_ms']:.0f} ms")
@@ -0,0 +1,215 @@
+import os
+import sys
+import json
+import torch
+import torch.nn.functional as F
+
+sys.path.append(r'GroundingDINO')
+
+# GroundingDINO imports
+from groundingdino.util.inference import preprocess_caption
+from groundingdino.util.misc import NestedTensor, inverse_sigmoid
+from groundingdino.util.utils import get_phrases_from_posmap
+from groundingdino.util import get_tokenlizer
+from groundingdino.models.GroundingDINO.bertwarper import generate_masks_with_special_tokens_and_transfer_map
+
+
+def encode_caption(model, caption):
+    """
+    Calcula una sola vez las características de texto del caption con el BERT de GroundingDINO.
+    - Reproduce la rama de texto de `GroundingDINO.forward` (tokenización, máscaras y feat_map).
+
+    Args:
+        model (nn.Module): modelo de GroundingDINO ya cargado.
+        caption (str): caption ya preprocesado (en minúsculas y terminado en ".").
+
+    Returns:
+        dict: encoded_text, text_token_mask, position_ids y text_self_attention_masks.
+    """
+    device = next(model.parameters()).device
+    tokenized = model.tokenizer([caption], padding="longest", return_tensors="pt").to(device)
+    text_self_attention_masks, position_ids, _ = generate_masks_with_special_tokens_and_transfer_map(
+        tokenized, model.specical_tokens, model.tokenizer
+    )
+
+    # Recortar al máximo de tokens que admite el modelo
+    max_len = model.max_text_len
+    if text_self_attention_masks.shape[1] > max_len:
+        text_self_attention_masks = text_self_attention_masks[:, :max_len, :max_len]
+        position_ids = position_ids[:, :max_len]
+        tokenized["input_ids"] = tokenized["input_ids"][:, :max_len]
+        tokenized["attention_mask"] = tokenized["attention_mask"][:, :max_len]
+        tokenized["token_type_ids"] = tokenized["token_type_ids"][:, :max_len]
+
+    if model.sub_sentence_present:
+        tokenized_for_encoder = {k: v for k, v in tokenized.items() if k != "attention_mask"}
+        tokenized_for_encoder["attention_mask"] = text_self_attention_masks
+        tokenized_for_encoder["position_ids"] = position_ids
+    else:
+        tokenized_for_encoder = tokenized
+
+    with torch.no_grad():
+        bert_output = model.bert(**tokenized_for_encoder)
+        encoded_text = model.feat_map(bert_output["last_hidden_state"])
+
+    return {
+        "encoded_text": encoded_text,
+        "text_token_mask": tokenized.attention_mask.bool(),
+        "position_ids": position_ids,
+        "text_self_attention_masks": text_self_attention_masks,
+    }
+
+
+class CaptionBakedGroundingDINO(torch.nn.Module):
+    """
+    GroundingDINO con el caption de ingredientes fijo.
+    - Las características de texto se calculan una vez y se guardan como buffers, de modo
+      que el grafo exportado solo contiene la rama visual, el transformer y las cabezas.
+    - Entrada: imagen normalizada (1, 3, H, W). Salida: pred_logits (sin sigmoid) y pred_boxes.
+    """
+    def __init__(self, model, caption):
+        super().__init__()
+        self.model = model
+        for name, value in encode_caption(model, caption).items():
+            self.register_buffer(name, value)
+
+    def forward(self, image):
+        m = self.model
+        text_dict = {
+            "encoded_text": self.encoded_text,
+            "text_token_mask": self.text_token_mask,
+            "position_ids": self.position_ids,
+            "text_self_attention_masks": self.text_self_attention_masks,
+        }
+
+        # Imagen única sin padding: la máscara es todo False
+        mask = torch.zeros((image.shape[0], image.shape[2], image.shape[3]), dtype=torch.bool, device=image.device)
+        samples = NestedTensor(image, mask)
+
+        features, poss = m.backbone(samples)
+        srcs, masks = [], []
+        for l, feat in enumerate(features):
+            src, feat_mask = feat.decompose()
+            srcs.append(m.input_proj[l](src))
+            masks.append(feat_mask)
+        if m.num_feature_levels > len(srcs):
+            _len_srcs = len(srcs)
+            for l in range(_len_srcs, m.num_feature_levels):
+                if l == _len_srcs:
+                    src = m.input_proj[l](features[-1].tensors)
+                else:
+                    src = m.input_proj[l](srcs[-1])
+                feat_mask = F.interpolate(mask[None].float(), size=src.shape[-2:]).to(torch.bool)[0]
+                pos_l = m.backbone[1](NestedTensor(src, feat_mask)).to(src.dtype)
+                srcs.append(src)
+                masks.append(feat_mask)
+                poss.append(pos_l)
+
+        hs, reference, _, _, _ = m.transformer(srcs, masks, None, poss, None, None, text_dict)
+
+        # Solo se necesita la salida de la última capa del decoder
+        layer_delta_unsig = m.bbox_embed[-1](hs[-1])
+        pred_boxes = (layer_delta_unsig + inverse_sigmoid(reference[-2])).sigmoid()
+        pred_logits = m.class_embed[-1](hs[-1], text_dict)
+        return pred_logits, pred_boxes
+
+
+def export_onnx(model, caption, onnx_path, opset_version=17):
+    """
+    Exporta GroundingDINO con el caption fijo a ONNX.
+    - Guarda junto al .onnx un .json con el caption, para detectar vocabularios desactualizados.
+
+    Args:
+        model (nn.Module): modelo de GroundingDINO cargado (en CPU).
+        caption (str): vocabulario de ingredientes.
+        onnx_path (str): ruta de salida del modelo ONNX.
+        opset_version (int): versión de opset (>= 16 para grid_sample).
+    """
+    caption = preprocess_caption(caption)
+    wrapper = CaptionBakedGroundingDINO(model, caption).eval()
+    dummy = torch.randn(1, 3, 800, 1200)
+
+    with torch.no_grad():
+        torch.onnx.export(
+            wrapper,
+            dummy,
+            onnx_path,
+            input_names=["image"],
+            output_names=["pred_logits", "pred_boxes"],
+            dynamic_axes={"image": {2: "height", 3: "width"}},
+            opset_version=opset_version,
+        )
+
+    with open(onnx_path + ".json", "w", encoding="utf-8") as f:
+        json.dump({"caption": caption}, f)
+    print(f"Modelo ONNX exportado en {onnx_path}")
+
+
+def postprocess_outputs(pred_logits, pred_boxes, tokenized, tokenizer, box_threshold, text_threshold):
+    """
+    Convierte las salidas crudas del modelo en (boxes, logits, phrases), igual que `predict`.
+
+    Args:
+        pred_logits (torch.Tensor): logits sin sigmoid (nq, 256).
+        pred_boxes (torch.Tensor): cajas normalizadas cxcywh (nq, 4).
+        tokenized: caption tokenizado con el tokenizer del modelo.
+        tokenizer: tokenizer de BERT de GroundingDINO.
+        box_threshold (float): umbral de confianza de caja.
+        text_threshold (float): umbral de confianza por token.
+
+    Returns:
+        tuple: (boxes, logits, phrases)
+    """
+    prediction_logits = pred_logits.sigmoid()
+    mask = prediction_logits.max(dim=1)[0] > box_threshold
+    logits = prediction_logits[mask]
+    boxes = pred_boxes[mask]
+
+    phrases = [
+        get_phrases_from_posmap(logit > text_threshold, tokenized, tokenizer).replace('.', '')
+        for logit in logits
+    ]
+    return boxes, logits.max(dim=1)[0], phrases
+
+
+class OnnxDetector:
+    """
+    Backend de detección con ONNX Runtime (CPUExecutionProvider).
+    - Usa el modelo exportado con `export_onnx`, con el caption ya incluido.
+    - Aplica todas las optimizaciones de grafo y permite fijar los hilos intra-op.
+    """
+    def __init__(self, onnx_path, caption, intra_op_threads=0, text_encoder_type="bert-base-uncased"):
+        import onnxruntime as ort
+
+        if not os.path.exists(onnx_path):
+            raise FileNotFoundError(
+                f"No existe {onnx_path}. Expórtalo antes con computervision/onnx_benchmark.py --export"
+            )
+
+        self.caption = preprocess_caption(caption)
+        meta_path = onnx_path + ".json"
+        if os.path.exists(meta_path):
+            with open(meta_path, "r", encoding="utf-8") as f:
+                if json.load(f)["caption"] != self.caption:
+                    raise ValueError(f"El modelo {onnx_path} se exportó con otro vocabulario. Vuelve a exportarlo.")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+
+        self.session = ort.InferenceSession(onnx_path, sess_options=options, providers=["CPUExecutionProvider"])
+        self.tokenizer = get_tokenlizer.get_tokenlizer(text_encoder_type)
+        self.tokenized = self.tokenizer(self.caption)
+
+    def predict(self, image, box_threshold=0.30, text_threshold=0.25):
+        pred_logits, pred_boxes = self.session.run(None, {"image": image[None].numpy()})
+        return postprocess_outputs(
+            torch.from_numpy(pred_logits[0]),
+            torch.from_numpy(pred_boxes[0]),
+            self.tokenized,
+            self.tokenizer,
+            box_threshold,
+            text_threshold
+        )
@@ -0,0 +1,93 @@
+import queue
+import threading
+
+
+class Stage:
+    """
+    Etapa del pipeline: una función aplicada por `workers` hilos sobre los elementos de una
+    cola acotada de tamaño `queue_size`.
+    - Si la función devuelve None, el elemento se descarta (no pasa a la siguiente etapa).
+    - Con drain_on_stop la etapa sigue procesando lo que le llega aunque se pare el pipeline
+      (p. ej. la carga, para no perder el trabajo ya hecho por las etapas anteriores).
+    """
+    def __init__(self, name, func, workers=1, queue_size=8, drain_on_stop=False):
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.queue_size = queue_size
+        self.drain_on_stop = drain_on_stop
+
+
+_SENTINEL = object()
+
+
+def run_pipeline(items, stages, on_done=None, on_error=None, stop_event=None):
+    """
+    Ejecuta los elementos a través de las etapas, cada una con su propio límite de
+    concurrencia, conectadas por colas acotadas (la etapa lenta frena a las anteriores).
+
+    Args:
+        items (iterable): elementos de entrada (se consumen de forma perezosa).
+        stages (list[Stage]): etapas en orden.
+        on_done (callable, optional): on_done(item, result) cuando un elemento termina la última
+            etapa (result) o se descarta en alguna etapa (result=None).
+        on_error (callable, optional): on_error(item, stage_name, exc) si una etapa lanza una
+            excepción; el elemento se descarta. Puede activar stop_event para parar el pipeline.
+        stop_event (threading.Event, optional): al activarse deja de leer entradas y las etapas
+            vacían sus colas sin procesar (salvo las que tienen drain_on_stop).
+
+    Raises:
+        La excepción de items, después de que las etapas terminen lo ya leído.
+    """
+    stop_event = stop_event or threading.Event()
+    queues = [queue.Queue(maxsize=stage.queue_size) for stage in stages]
+    remaining = [stage.workers for stage in stages]
+    lock = threading.Lock()
+
+    def worker(k):
+        stage = stages[k]
+        while True:
+            item = queues[k].get()
+            if item is _SENTINEL:
+                break
+            if stop_event.is_set() and not stage.drain_on_stop:
+                continue
+            try:
+                result = stage.func(item)
+            except Exception as e:
+                if on_error:
+                    on_error(item, stage.name, e)
+                continue
+            if result is None or k == len(stages) - 1:
+                if on_done:
+                    on_done(item, result)
+            else:
+                queues[k + 1].put(result)
+
+        # El último hilo de la etapa en salir avisa a la siguiente
+        with lock:
+            remaining[k] -= 1
+            last = remaining[k] == 0
+        if last and k + 1 < len(stages):
+            for _ in range(stages[k + 1].workers):
+                queues[k + 1].put(_SENTINEL)
+
+    threads = [
+        threading.Thread(target=worker, args=(k,), name=f"{stage.name}-{i}", daemon=True)
+        for k, stage in enumerate(stages)
+        for i in range(stage.workers)
+    ]
+    for t in threads:
+        t.start()
+
+    # Aunque la lectura de las entradas falle, las etapas terminan lo que ya tienen y se cierran
+    try:
+        for item in items:
+            if stop_event.is_set():
+                break
+            queues[0].put(item)
+    finally:
+        for _ in range(stages[0].workers):
+            queues[0].put(_SENTINEL)
+        for t in threads:
+            t.join()
@@ -0,0 +1,189 @@
+import time
+import queue
+import itertools
+import threading
+import multiprocessing as mp
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+import torch
+
+
+def _worker_loop(detect_fn, task_queue, result_queue, slot_names, n_threads):
+    """
+    Bucle de cada proceso del pool.
+    - Fija los hilos intra-op de torch.
+    - Lee la imagen directamente del buffer de memoria compartida indicado en la tarea.
+    """
+    torch.set_num_threads(n_threads)
+    slots = [shared_memory.SharedMemory(name=name) for name in slot_names]
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+        task_id, slot, shape = task
+        try:
+            img = np.ndarray(shape, dtype=np.uint8, buffer=slots[slot].buf)
+            with torch.no_grad():
+                boxes, logits, phrases = detect_fn(img)
+            result_queue.put((task_id, (np.asarray(boxes, dtype=np.float32), np.asarray(logits, dtype=np.float32),
+                                        list(phrases)), None))
+        except Exception as e:
+            result_queue.put((task_id, None, repr(e)))
+    for shm in slots:
+        shm.close()
+
+
+def _file_backed(tensor):
+    """True si el almacenamiento del tensor está mapeado desde un fichero (pesos cargados con mmap)."""
+    return getattr(tensor.untyped_storage(), "filename", None) is not None
+
+
+class DetectorPool:
+    """
+    Pool de N procesos de detección que comparten los pesos del modelo.
+    - Los procesos se crean con fork después de cargar el modelo, así que los tensores se
+      comparten copy-on-write. Los que no están mapeados desde fichero se marcan además con
+      `share_memory_()`; los mapeados (`CV_MMAP_WEIGHTS`) ya se comparten por la page cache y
+      `share_memory_()` los copiaría a /dev/shm.
+    - Cada worker usa un número fijo de hilos intra-op de torch y tiene su propia cola de tareas;
+      cada imagen va al worker vivo con menos tareas pendientes.
+    - Las imágenes viajan por buffers de memoria compartida (un slot por tarea en curso);
+      por las colas solo pasan índices y formas, nunca arrays serializados.
+    - Si un worker muere, sus tareas pendientes fallan con RuntimeError y sus slots se liberan.
+    - `detect` es thread-safe y devuelve (boxes, logits, phrases) como `predict`.
+    """
+    def __init__(self, detect_fn, model=None, n_workers=2, threads_per_worker=1, slots_per_worker=2,
+                 max_side=2048, poll_interval=1.0):
+        if model is not None:
+            for tensor in itertools.chain(model.parameters(), model.buffers()):
+                if not _file_backed(tensor):
+                    tensor.share_memory_()
+
+        self.max_side = max_side
+        slot_bytes = max_side * max_side * 3
+        n_slots = n_workers * slots_per_worker
+        self._slots = [shared_memory.SharedMemory(create=True, size=slot_bytes) for _ in range(n_slots)]
+        self._free_slots = queue.Queue()
+        for i in range(n_slots):
+            self._free_slots.put(i)
+
+        ctx = mp.get_context("fork")
+        self._tasks = [ctx.Queue() for _ in range(n_workers)]
+        self._results = ctx.Queue()
+        self._workers = [
+            ctx.Process(
+                target=_worker_loop,
+                args=(detect_fn, tasks, self._results, [s.name for s in self._slots], threads_per_worker),
+                daemon=True
+            )
+            for tasks in self._tasks
+        ]
+        for worker in self._workers:
+            worker.start()
+
+        self.poll_interval = poll_interval
+        self._pending = {}                  # task_id -> (futuro, slot, worker)
+        self._load = [0] * n_workers        # tareas pendientes por worker
+        self._dead = set()
+        self._closing = False
+        self._task_ids = itertools.count()
+        self._lock = threading.Lock()
+        self._dispatcher = threading.Thread(target=self._dispatch_results, daemon=True)
+        self._dispatcher.start()
+
+    def _dispatch_results(self):
+        last_check = time.monotonic()
+        while True:
+            if time.monotonic() - last_check >= self.poll_interval:
+                self._check_workers()
+                last_check = time.monotonic()
+            try:
+                item = self._results.get(timeout=self.poll_interval)
+            except queue.Empty:
+                continue
+            if item is None:
+                break
+            task_id, result, error = item
+            with self._lock:
+                entry = self._pending.pop(task_id, None)
+                if entry is None:
+                    continue  # ya se dio por fallida al morir su worker
+                future, slot, worker = entry
+                self._load[worker] -= 1
+            self._free_slots.put(slot)
+            if error is not None:
+                future.set_exception(RuntimeError(f"Error en el worker de detección: {error}"))
+            else:
+                boxes, logits, phrases = result
+                future.set_result((torch.from_numpy(boxes), torch.from_numpy(logits), phrases))
+
+    def _check_workers(self):
+        """Falla los futuros pendientes de los workers que han muerto y libera sus slots."""
+        if self._closing:
+            return
+        for k, worker in enumerate(self._workers):
+            if k in self._dead or worker.is_alive():
+                continue
+            with self._lock:
+                self._dead.add(k)
+                lost = [(task_id, future, slot) for task_id, (future, slot, w) in self._pending.items() if w == k]
+                for task_id, _, _ in lost:
+                    del self._pending[task_id]
+                self._load[k] = 0
+            print(f"El worker de detección {k} ha terminado (código {worker.exitcode}); "
+                  f"{len(lost)} tareas pendientes fallan")
+            for _, future, slot in lost:
+                self._free_slots.put(slot)
+                future.set_exception(RuntimeError(f"El worker de detección {k} ha terminado (código {worker.exitcode})"))
+
+    def submit(self, img):
+        """
+        Envía una imagen BGR al pool.
+        - Si supera max_side, se reduce antes de copiarla al buffer compartido.
+
+        Returns:
+            concurrent.futures.Future: futuro con (boxes, logits, phrases).
+
+        Raises:
+            RuntimeError: si no queda ningún worker vivo.
+        """
+        h, w = img.shape[:2]
+        if max(h, w) > self.max_side:
+            scale = self.max_side / max(h, w)
+            img = cv2.resize(img, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+
+        slot = self._free_slots.get()
+        view = np.ndarray(img.shape, dtype=np.uint8, buffer=self._slots[slot].buf)
+        view[...] = img
+
+        future = Future()
+        task_id = next(self._task_ids)
+        with self._lock:
+            alive = [k for k in range(len(self._workers)) if k not in self._dead]
+            if alive:
+                worker = min(alive, key=self._load.__getitem__)
+                self._pending[task_id] = (future, slot, worker)
+                self._load[worker] += 1
+        if not alive:
+            self._free_slots.put(slot)
+            raise RuntimeError("No queda ningún worker de detección vivo")
+        self._tasks[worker].put((task_id, slot, img.shape))
+        return future
+
+    def detect(self, img, timeout=None):
+        return self.submit(img).result(timeout=timeout)
+
+    def close(self):
+        self._closing = True
+        for tasks in self._tasks:
+            tasks.put(None)
+        for worker in self._workers:
+            worker.join(timeout=5)
+        self._results.put(None)
+        for shm in self._slots:
+            shm.close()
+            shm.unlink()
+
@@ -0,0 +1,239 @@
+import time
+import random
+import threading
+from email.utils import parsedate_to_datetime
+
+
+class CircuitOpenError(Exception):
+    """El proveedor ha fallado de forma sostenida y el circuito está abierto."""
+    def __init__(self, provider, retry_in):
+        super().__init__(f"Circuito abierto para {provider}: se reintentará en {retry_in:.0f} s")
+        self.provider = provider
+        self.retry_in = retry_in
+
+
+# Por encima de este valor (~2001) un Retry-After / X-RateLimit-Reset numérico es un instante epoch
+EPOCH_THRESHOLD = 1e9
+
+
+def retry_after_seconds(headers):
+    """
+    Segundos de espera indicados por la respuesta (Retry-After en segundos o como fecha HTTP,
+    o X-RateLimit-Reset en segundos o como instante epoch), o None si no hay ninguna cabecera.
+    """
+    if not headers:
+        return None
+    value = headers.get("Retry-After") or headers.get("X-RateLimit-Reset")
+    if value is None:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        pass
+    else:
+        if seconds > EPOCH_THRESHOLD:
+            seconds -= time.time()  # muchos proveedores mandan el instante del reinicio, no la espera
+        return max(0.0, seconds)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def exception_status(error):
+    """
+    Estado HTTP que lleva una excepción del cliente de un proveedor, o None:
+    `status_code`, `response.status_code` (requests / httpx) o un `code` numérico
+    (postgrest.APIError cuando la respuesta no es JSON, p. ej. un 429 o 503 del gateway).
+    """
+    for status in (getattr(error, "status_code", None),
+                   getattr(getattr(error, "response", None), "status_code", None),
+                   getattr(error, "code", None)):
+        try:
+            status = int(status)
+        except (TypeError, ValueError):
+            continue
+        if 100 <= status < 600:
+            return status
+    return None
+
+
+class RateLimiter:
+    """
+    Limitador adaptativo para un proveedor externo (Edamam, DeepL, Supabase).
+    - Token bucket: hasta `rate` peticiones/s con ráfagas de `burst`; compartido por todos los hilos.
+    - Adaptativo (AIMD): cada respuesta en `throttle_statuses` (429...) divide el ritmo por dos
+      (hasta min_rate) y cada éxito lo sube poco a poco de nuevo hasta max_rate.
+    - Reintentos de los estados de `throttle_statuses` / `retry_statuses` y de `retry_exceptions`,
+      con backoff exponencial con jitter, o lo que indique Retry-After si viene (como mucho
+      max_backoff segundos en ambos casos).
+    - Las excepciones de los clientes que llevan un estado HTTP (`error_status`, por defecto
+      `exception_status`) se tratan igual que una respuesta con ese estado: un APIError 429 de
+      Supabase frena el ritmo y se reintenta.
+    - Circuit breaker: tras `failure_threshold` fallos seguidos el circuito se abre `cooldown`
+      segundos y las llamadas lanzan CircuitOpenError sin tocar la red; pasado ese tiempo se
+      deja pasar una petición de prueba y un éxito lo vuelve a cerrar.
+    - Los estados de `ok_statuses` (p. ej. el 555 de Edamam, "receta no analizable") se devuelven
+      sin reintentar y no cuentan como fallo del proveedor.
+    """
+    def __init__(self, name, rate, burst=1, min_rate=None, throttle_statuses=(429,),
+                 retry_statuses=(500, 502, 503, 504), ok_statuses=(), retry_exceptions=(OSError,),
+                 error_status=exception_status, max_retries=5, base_backoff=1.0, max_backoff=60.0,
+                 failure_threshold=5, cooldown=60.0):
+        self.name = name
+        self.max_rate = rate
+        self.min_rate = min_rate or rate / 16
+        self.rate = rate
+        self.burst = burst
+        self.throttle_statuses = set(throttle_statuses)
+        self.retry_statuses = set(retry_statuses)
+        self.ok_statuses = set(ok_statuses)
+        self.retry_exceptions = tuple(retry_exceptions)
+        self.error_status = error_status
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self.calls = 0
+        self.retries = 0
+        self.throttled = 0
+        self.waited = 0.0
+
+    # --- Token bucket ---
+    def acquire(self):
+        """Espera hasta que haya un token disponible (y a que termine cualquier pausa por Retry-After)."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if now >= self._paused_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = max(self._paused_until - now, (1 - self._tokens) / self.rate)
+                self.waited += wait
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """Detiene todas las peticiones al proveedor durante seconds (p. ej. por Retry-After)."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    # --- Circuit breaker ---
+    def _before_call(self) -> bool:
+        """Lanza CircuitOpenError si el circuito está abierto; True si esta llamada es la de prueba."""
+        with self._lock:
+            if self._opened_at is None:
+                return False
+            remaining = self._opened_at + self.cooldown - time.monotonic()
+            if remaining > 0 or self._probing:
+                raise CircuitOpenError(self.name, max(remaining, 0))
+            self._probing = True  # semiabierto: pasa solo una petición de prueba
+            return True
+
+    def _on_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+    def _on_failure(self, throttled=False):
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if throttled:
+                self.throttled += 1
+                self.rate = max(self.min_rate, self.rate / 2)
+            if self._failures >= self.failure_threshold or self._opened_at is not None:
+                self._opened_at = time.monotonic()
+
+    def _end_probe(self):
+        with self._lock:
+            self._probing = False
+
+    def backoff(self, attempt):
+        """Backoff exponencial con jitter completo."""
+        return random.uniform(0, min(self.max_backoff, self.base_backoff * 2 ** attempt))
+
+    def _retry_wait(self, headers, attempt):
+        """Espera antes del siguiente intento: la de Retry-After si viene, o el backoff; nunca más de max_backoff."""
+        hinted = retry_after_seconds(headers)
+        return min(self.max_backoff, hinted if hinted is not None else self.backoff(attempt))
+
+    def call(self, func, *args, **kwargs):
+        """
+        Ejecuta func(*args, **kwargs) respetando el ritmo del proveedor y reintentando.
+        - Si func devuelve algo con `status_code` (requests.Response), se usa el estado HTTP.
+        - Cualquier otro valor devuelto sin excepción es un éxito.
+        - Cualquier excepción de func cuenta como fallo del proveedor (y cierra la petición de
+          prueba del circuito); se reintenta si es de `retry_exceptions` o si su estado HTTP
+          (`error_status`) es de throttle_statuses / retry_statuses.
+
+        Returns:
+            El resultado de func; tras agotar los reintentos, la última respuesta de error.
+
+        Raises:
+            CircuitOpenError: si el circuito está abierto.
+            La última excepción de func si no se reintenta o se agotan los reintentos.
+        """
+        attempt = 0
+        while True:
+            probe = self._before_call()
+            try:
+                self.acquire()
+                with self._lock:
+                    self.calls += 1
+                result = func(*args, **kwargs)
+            except Exception as e:
+                status = self.error_status(e) if self.error_status else None
+                if status in self.ok_statuses:
+                    self._on_success()
+                    raise
+                throttled = status in self.throttle_statuses
+                self._on_failure(throttled=throttled)
+                retryable = isinstance(e, self.retry_exceptions) or throttled or status in self.retry_statuses
+                if not retryable or attempt >= self.max_retries:
+                    raise
+                wait = self._retry_wait(getattr(getattr(e, "response", None), "headers", None), attempt)
+                if throttled:
+                    self.pause(wait)
+            else:
+                status = getattr(result, "status_code", None)
+                if status is None or status < 400 or status in self.ok_statuses:
+                    self._on_success()
+                    return result
+                throttled = status in self.throttle_statuses
+                self._on_failure(throttled=throttled)
+                if not (throttled or status in self.retry_statuses) or attempt >= self.max_retries:
+                    return result
+                wait = self._retry_wait(getattr(result, "headers", None), attempt)
+                if throttled:
+                    self.pause(wait)
+            finally:
+                if probe:
+                    self._end_probe()  # la prueba terminó de cualquier forma (incluso KeyboardInterrupt)
+            attempt += 1
+            with self._lock:
+                self.retries += 1
+            time.sleep(wait)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "retries": self.retries,
+                "throttled": self.throttled,
+                "rate": round(self.rate, 3),
+                "waited_s": round(self.waited, 1),
+                "circuit": "open" if self._opened_at is not None else "closed",
+            }
@@ -1,3 +1,5 @@
+import os
+import threading
 import inflect
 from supabase import create_client
 import pandas as pd
@@ -6,6 +8,11 @@ from sklearn.metrics.pairwise import cosine_similarity
 
 import numpy as np
 
+from src.support_staging import read_table, staging_version
+
+# Si se define, el índice del recomendador se construye desde el staging en Parquet del ETL
+RECSYS_STAGING_DIR = os.getenv("recsys_staging_dir")
+
 
 def connect_supabase(url, key):
     return create_client(url, key)
@@ -26,6 +33,45 @@ def fetch_recipe_ingredients(supabase):
 
     return df
 
+def fetch_recipe_ingredients_staging(staging_dir):
+    """
+    Igual que `fetch_recipe_ingredients`, pero leyendo el staging en Parquet del ETL en lugar de
+    Supabase: recipe_ingredients + ingredients (name_norm) + recipe_ids (url -> id).
+    - Solo aparecen las recetas ya cargadas en la base (las que tienen id).
+    """
+    links = read_table(staging_dir, "recipe_ingredients", columns=["url", "ingredient"])
+    ingredients = read_table(staging_dir, "ingredients", columns=["name", "name_norm"])
+    recipe_ids = read_table(staging_dir, "recipe_ids", columns=["url", "recipe_id"])
+
+    df = (links.merge(recipe_ids, on="url")
+               .merge(ingredients, left_on="ingredient", right_on="name"))
+    if df.empty:
+        raise ValueError(f"No se encontraron recetas cargadas en el staging {staging_dir}")
+    df = df.rename(columns={"name_norm": "ingredient_name"})[["recipe_id", "ingredient_name"]]
+    df["recipe_id"] = df["recipe_id"].astype(int)
+    return df
+
+_staging_index = {}  # staging_dir -> (versión del staging, ingredientes por receta, vectorizador, X)
+_staging_index_lock = threading.Lock()
+
+def get_staging_index(staging_dir):
+    """
+    Índice del recomendador (ingredientes por receta y su TF-IDF) construido desde el staging.
+    - Se guarda en memoria del proceso y solo se reconstruye cuando cambian los ficheros de las
+      tablas que usa (`staging_version`), así que una recomendación no vuelve a leer los Parquet.
+
+    Returns:
+        tuple: (recipe_ingredients, vectorizer, X)
+    """
+    version = staging_version(staging_dir, ("recipes", "recipe_ingredients", "ingredients", "recipe_ids"))
+    with _staging_index_lock:
+        cached = _staging_index.get(staging_dir)
+        if cached is None or cached[0] != version:
+            recipe_ingredients = preprocess_ingredients(fetch_recipe_ingredients_staging(staging_dir))
+            vectorizer, X = vectorize_ingredients(recipe_ingredients)
+            cached = _staging_index[staging_dir] = (version, recipe_ingredients, vectorizer, X)
+    return cached[1:]
+
 def preprocess_ingredients(df):
     """
     Agrupa los ingredientes por receta y los convierte en un conjunto único para evitar duplicados.
@@ -79,17 +125,20 @@ def rank_recipes(recipe_ingredients, user_ingredients, similarities):
     return recipe_ingredients
 
 def get_recommendations(supabase, raw_user_ingredients):
-    # Obtener datos de ingredientes
-    df = fetch_recipe_ingredients(supabase)
-    recipe_ingredients = preprocess_ingredients(df)
+    # Obtener datos de ingredientes y vectorizar (del staging del ETL, con el índice en caché, si está configurado)
+    if RECSYS_STAGING_DIR:
+        recipe_ingredients, vectorizer, X = get_staging_index(RECSYS_STAGING_DIR)
+        recipe_ingredients = recipe_ingredients.copy()  # rank_recipes añade columnas
+    else:
+        recipe_ingredients = preprocess_ingredients(fetch_recipe_ingredients(supabase))
+        vectorizer, X = vectorize_ingredients(recipe_ingredients)
 
     # Convertir los ingredientes del usuario a singular
     p = inflect.engine()
     user_ingredients = [p.singular_noun(ing) if p.singular_noun(ing) else ing for ing in raw_user_ingredients.split()]
     user_ingredients = " ".join(user_ingredients)
 
-    # Vectorizar y calcular similitud
-    vectorizer, X = vectorize_ingredients(recipe_ingredients)
+    # Calcular similitud
     similarities = compute_similarity(vectorizer, X, user_ingredients)
 
     # Ordenar y filtrar recetas
@@ -177,3 +226,73 @@ def get_filtered_recommendations(ingredients, url, key, health_labels, min_calor
     filtered_df = filter_label_df[filter_label_df["recipe_id"].isin(calories_filter)]
     # print(filtered_df.values)
     return filtered_df
+
+
+def fetch_ingredient_index(supabase, page_size=1000):
+    """
+    Descarga la tabla de ingredientes completa (paginando) y la indexa por nombre en inglés.
+
+    Returns:
+        dict: name -> {"id", "name_es"}
+    """
+    index = {}
+    start = 0
+    while True:
+        rows = supabase.table('ingredients').select('id, name, name_es').range(start, start + page_size - 1).execute().data
+        for row in rows:
+            if row["name"]:
+                index[row["name"].strip().lower()] = {"id": row["id"], "name_es": row["name_es"]}
+        if len(rows) < page_size:
+            return index
+        start += page_size
+
+
+def resolve_phrase(index, phrase):
+    """
+    Resuelve una frase del detector a ingredientes de la base de datos, con la misma regla que
+    antes se hacía con dos consultas `in_`: la frase completa y cada una de sus palabras.
+
+    Returns:
+        list: diccionarios con id, name y name_es de los ingredientes encontrados.
+    """
+    phrase = phrase.strip().lower()
+    names = [phrase] if phrase in index else []
+    names += [word for word in phrase.split() if word in index and word not in names]
+    return [{"id": index[n]["id"], "name": n, "name_es": index[n]["name_es"]} for n in names]
+
+
+def build_label_resolver(supabase, vocabulary):
+    """
+    Construye una sola vez el mapa etiqueta del detector -> ingredientes (ids y nombre en español).
+    - Las frases del vocabulario quedan precalculadas; cualquier otra frase se resuelve en
+      memoria con el índice de nombres, sin llamadas de red.
+
+    Args:
+        supabase: Cliente de Supabase.
+        vocabulary (list): etiquetas del detector (p. ej. `INGREDIENT_VOCAB`).
+
+    Returns:
+        dict: {"index": índice de ingredientes, "labels": frase -> ingredientes}
+    """
+    index = fetch_ingredient_index(supabase)
+    labels = {phrase.strip().lower(): resolve_phrase(index, phrase) for phrase in vocabulary}
+    return {"index": index, "labels": labels}
+
+
+def resolve_detections(resolver, phrases):
+    """
+    Convierte las frases detectadas en ingredientes únicos (por id), conservando el orden.
+
+    Ejemplo:
+        >>> resolver = build_label_resolver(supabase, INGREDIENT_VOCAB)
+        >>> [i["name_es"] for i in resolve_detections(resolver, ["tomato", "green bean"])]
+    """
+    found = {}
+    for phrase in phrases:
+        key = phrase.strip().lower()
+        matches = resolver["labels"].get(key)
+        if matches is None:
+            matches = resolve_phrase(resolver["index"], key)
+        for ingredient in matches:
+            found.setdefault(ingredient["id"], ingredient)
+    return list(found.values())
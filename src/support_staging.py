@@ -0,0 +1,198 @@
+import os
+import glob
+import json
+import time
+import uuid
+
+import pandas as pd
+
+# Tablas del área de staging. Todas se enlazan por URL de la receta o nombre del ingrediente,
+# porque los ids de Supabase no se conocen hasta la carga (salvo recipe_ids, que se escribe después).
+STAGING_TABLES = ("recipes", "ingredients", "recipe_ingredients", "tags", "steps", "recipe_ids")
+# Tablas con una fila por clave: se queda la última versión
+KEYED_TABLES = {"recipes": "url", "ingredients": "name", "recipe_ids": "url"}
+# Tablas con varias filas por receta: se quedan las filas de la última vez que se transformó.
+# La versión de cada receta es el staged_at de su última fila en recipes (cada lote escribe
+# una fila de recipes por receta), así que una receta retransformada sin filas en una tabla hija
+# deja vacías sus filas en esa tabla aunque las antiguas sigan en otros ficheros.
+CHILD_TABLES = ("recipe_ingredients", "tags", "steps")
+
+
+def _write_parquet(df: pd.DataFrame, directory: str, suffix: str = "") -> str:
+    """Escribe df en un part-*.parquet nuevo de directory (temporal + rename) y devuelve su ruta."""
+    path = os.path.join(directory, f"part-{time.time_ns()}-{uuid.uuid4().hex[:8]}{suffix}.parquet")
+    df.to_parquet(path + ".tmp", index=False)
+    os.replace(path + ".tmp", path)
+    return path
+
+
+def recipe_versions(staging_dir: str) -> pd.Series:
+    """url -> staged_at de la última versión de cada receta (tabla recipes, todas las particiones)."""
+    versions = _read_files(table_files(staging_dir, "recipes"), ["url", "staged_at"],
+                           lambda: table_files(staging_dir, "recipes"))
+    if versions is None:
+        return pd.Series(dtype="float64")
+    return versions.groupby("url")["staged_at"].max()
+
+
+def _latest(df: pd.DataFrame, table: str, versions: pd.Series = None) -> pd.DataFrame:
+    """
+    Última versión de cada receta / ingrediente de un DataFrame con la columna staged_at.
+    En las tablas hijas, versions (`recipe_versions`) descarta también las filas de las recetas
+    que se han vuelto a transformar después sin filas en esa tabla.
+    """
+    df = df.sort_values("staged_at", kind="stable")
+    if table in KEYED_TABLES:
+        df = df.drop_duplicates(KEYED_TABLES[table], keep="last")
+    elif table in CHILD_TABLES:
+        latest = df.groupby("url")["staged_at"].transform("max")
+        if versions is not None and len(versions):
+            # La más reciente entre la versión de la receta y sus propias filas (por si se leen
+            # justo entre la escritura de recipes y la de la tabla hija de un mismo lote)
+            latest = pd.concat([latest, df["url"].map(versions)], axis=1).max(axis=1)
+        df = df[df["staged_at"] == latest]
+        # Durante una compactación un lector puede ver a la vez los ficheros viejos y el compactado
+        df = df.drop_duplicates()
+    return df.reset_index(drop=True)
+
+
+def compact_partition(directory: str, table: str) -> int:
+    """
+    Junta todos los ficheros de una partición de una tabla en uno solo con la última versión de
+    cada receta / ingrediente (conserva staged_at, así que el resultado de `read_table` no cambia).
+    - Primero escribe el fichero compactado y después borra los viejos: un lector que llegue
+      en medio ve filas repetidas que `read_table` descarta.
+    - Solo debe compactar una partición su propio escritor (o nadie escribiendo en ella).
+
+    Returns:
+        int: número de ficheros eliminados.
+    """
+    paths = sorted(glob.glob(os.path.join(directory, "*.parquet")))
+    if len(paths) < 2:
+        return 0
+    # <staging_dir>/<tabla>/<partition>: las versiones de las recetas son las de todo el staging
+    versions = recipe_versions(os.path.dirname(os.path.dirname(directory))) if table in CHILD_TABLES else None
+    df = _latest(pd.concat([pd.read_parquet(path) for path in paths], ignore_index=True), table, versions)
+    _write_parquet(df, directory, "-compact")
+    for path in paths:
+        os.remove(path)
+    return len(paths)
+
+
+def compact_staging(staging_dir: str) -> dict:
+    """
+    Compacta todas las particiones de todas las tablas del staging (sin escritores activos).
+
+    Returns:
+        dict: tabla -> ficheros eliminados.
+    """
+    removed = {}
+    for table in STAGING_TABLES:
+        for directory in sorted(glob.glob(os.path.join(staging_dir, table, "*"))):
+            if os.path.isdir(directory):
+                removed[table] = removed.get(table, 0) + compact_partition(directory, table)
+    return removed
+
+
+class StagingWriter:
+    """
+    Escribe lotes transformados en Parquet, un fichero por tabla y lote:
+    <staging_dir>/<tabla>/<partition>/part-<timestamp>-<uuid>.parquet
+    - partition separa a los escritores (p. ej. "shard=2") para que nunca toquen el mismo fichero.
+    - Cada fichero se escribe en un temporal y se renombra, así que un lector nunca ve uno a medias.
+    - Cada compact_every ficheros de una tabla compacta su partición (`compact_partition`), para
+      que el número de ficheros, y el coste de leer el staging, no crezca con cada lote.
+    """
+    def __init__(self, staging_dir: str, partition: str = "shard=0", compact_every: int = 100):
+        self.staging_dir = staging_dir
+        self.partition = partition
+        self.compact_every = compact_every
+        self.files = 0
+        self._since_compact = {}
+
+    def write(self, rows: dict) -> list:
+        """
+        Args:
+            rows (dict): tabla -> lista de filas (dicts).
+
+        Returns:
+            list: rutas escritas.
+        """
+        paths = []
+        staged_at = time.time()
+        for table, table_rows in rows.items():
+            if not table_rows:
+                continue
+            directory = os.path.join(self.staging_dir, table, self.partition)
+            os.makedirs(directory, exist_ok=True)
+            df = pd.DataFrame(table_rows)
+            df["staged_at"] = staged_at
+            paths.append(_write_parquet(df, directory))
+            self._since_compact[table] = self._since_compact.get(table, 0) + 1
+            if self.compact_every and self._since_compact[table] >= self.compact_every:
+                compact_partition(directory, table)
+                self._since_compact[table] = 0
+        self.files += len(paths)
+        return paths
+
+
+def read_table(staging_dir: str, table: str, columns: list = None) -> pd.DataFrame:
+    """
+    Lee todas las particiones de una tabla del staging y se queda con la última versión de
+    cada receta / ingrediente (una receta reprocesada aparece en varios ficheros).
+
+    Returns:
+        pd.DataFrame: vacío si la tabla no tiene ficheros.
+    """
+    read_columns = None if columns is None else list(dict.fromkeys(columns + ["staged_at", KEYED_TABLES.get(table, "url")]))
+    df = _read_files(table_files(staging_dir, table), read_columns, lambda: table_files(staging_dir, table))
+    if df is None:
+        return pd.DataFrame(columns=columns)
+    df = _latest(df, table, recipe_versions(staging_dir) if table in CHILD_TABLES else None)
+    return df[columns] if columns is not None else df.drop(columns="staged_at")
+
+
+def _read_files(paths: list, columns: list = None, relist=None):
+    """
+    Concatena los Parquet de paths (None si no hay ninguno). Si una compactación borra un
+    fichero entre el glob y la lectura, se vuelve a listar con relist() y se repite.
+    """
+    for attempt in range(3):
+        if not paths:
+            return None
+        try:
+            return pd.concat([pd.read_parquet(path, columns=columns) for path in paths], ignore_index=True)
+        except FileNotFoundError:
+            if attempt == 2 or relist is None:
+                raise
+            paths = relist()
+
+
+def table_files(staging_dir: str, table: str) -> list:
+    return sorted(glob.glob(os.path.join(staging_dir, table, "**", "*.parquet"), recursive=True))
+
+
+def staging_version(staging_dir: str, tables=STAGING_TABLES) -> tuple:
+    """
+    Huella barata del contenido del staging (número de ficheros y último mtime de las tablas),
+    para saber si un índice construido a partir de él sigue al día sin leer ningún Parquet.
+    """
+    paths = [path for table in tables for path in table_files(staging_dir, table)]
+    mtimes = []
+    for path in paths:
+        try:
+            mtimes.append(os.stat(path).st_mtime_ns)
+        except FileNotFoundError:
+            pass
+    return len(mtimes), max(mtimes, default=0)
+
+
+def read_rows(staging_dir: str) -> dict:
+    """
+    Todas las tablas del staging (menos recipe_ids) como tabla -> lista de filas, con tipos de
+    Python (sin tipos de numpy ni NaN) para poder enviarlas tal cual a Supabase.
+    """
+    return {
+        table: json.loads(read_table(staging_dir, table).to_json(orient="records"))
+        for table in STAGING_TABLES if table != "recipe_ids"
+    }
@@ -0,0 +1,160 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import torch
+
+
+def make_tiles(height, width, tile_size=800, overlap=0.2):
+    """
+    Divide la imagen en tiles cuadrados solapados que cubren toda la superficie.
+
+    Args:
+        height, width (int): tamaño de la imagen.
+        tile_size (int): lado del tile en píxeles.
+        overlap (float): fracción de solape entre tiles vecinos (0-1).
+
+    Returns:
+        list: tuplas (x0, y0, x1, y1) de cada tile.
+    """
+    stride = max(1, int(tile_size * (1 - overlap)))
+
+    def starts(length):
+        if length <= tile_size:
+            return [0]
+        positions = list(range(0, length - tile_size, stride))
+        positions.append(length - tile_size)  # el último tile queda pegado al borde
+        return positions
+
+    return [
+        (x0, y0, min(x0 + tile_size, width), min(y0 + tile_size, height))
+        for y0 in starts(height)
+        for x0 in starts(width)
+    ]
+
+
+def cxcywh_to_xyxy(boxes):
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    return np.concatenate([boxes[:, :2] - boxes[:, 2:] / 2, boxes[:, :2] + boxes[:, 2:] / 2], axis=1)
+
+
+def xyxy_to_cxcywh(boxes):
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    return np.concatenate([(boxes[:, :2] + boxes[:, 2:]) / 2, boxes[:, 2:] - boxes[:, :2]], axis=1)
+
+
+def iou_matrix(a, b):
+    """IoU entre todas las cajas xyxy de a (N, 4) y b (M, 4)."""
+    tl = np.maximum(a[:, None, :2], b[None, :, :2])
+    br = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.clip(br - tl, 0, None).prod(axis=2)
+    area_a = (a[:, 2:] - a[:, :2]).prod(axis=1)
+    area_b = (b[:, 2:] - b[:, :2]).prod(axis=1)
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
+
+def class_aware_nms(boxes, scores, phrases, iou_threshold=0.5):
+    """
+    NMS por clase: solo se suprimen cajas solapadas con la misma frase.
+
+    Returns:
+        list: índices de las cajas que se conservan, de mayor a menor score.
+    """
+    keep = []
+    phrases = np.asarray(phrases, dtype=object)
+    for phrase in set(phrases.tolist()):
+        idx = np.where(phrases == phrase)[0]
+        idx = idx[np.argsort(-scores[idx])]
+        while len(idx):
+            best = idx[0]
+            keep.append(best)
+            if len(idx) == 1:
+                break
+            ious = iou_matrix(boxes[best:best + 1], boxes[idx[1:]])[0]
+            idx = idx[1:][ious < iou_threshold]
+    return sorted(keep, key=lambda i: -scores[i])
+
+
+def weighted_box_fusion(boxes, scores, phrases, iou_threshold=0.55):
+    """
+    Weighted box fusion por clase: las cajas solapadas de la misma frase se combinan en una
+    sola, con coordenadas promediadas por score y el score medio del grupo.
+
+    Returns:
+        tuple: (boxes, scores, phrases) fusionados.
+    """
+    out_boxes, out_scores, out_phrases = [], [], []
+    phrases = np.asarray(phrases, dtype=object)
+    for phrase in set(phrases.tolist()):
+        idx = np.where(phrases == phrase)[0]
+        idx = idx[np.argsort(-scores[idx])]
+        clusters = []  # [caja fusionada, lista de índices]
+        for i in idx:
+            for cluster in clusters:
+                if iou_matrix(cluster[0][None], boxes[i:i + 1])[0, 0] >= iou_threshold:
+                    cluster[1].append(i)
+                    w = scores[cluster[1]]
+                    cluster[0] = (boxes[cluster[1]] * w[:, None]).sum(axis=0) / w.sum()
+                    break
+            else:
+                clusters.append([boxes[i].copy(), [i]])
+        for fused, members in clusters:
+            out_boxes.append(fused)
+            out_scores.append(scores[members].mean())
+            out_phrases.append(phrase)
+    order = np.argsort(-np.asarray(out_scores)) if out_scores else []
+    return (np.asarray(out_boxes, dtype=np.float32).reshape(-1, 4)[order],
+            np.asarray(out_scores, dtype=np.float32)[order],
+            [out_phrases[i] for i in order])
+
+
+def tiled_predict(img, detector, preprocess, box_threshold=0.30, text_threshold=0.25, tile_size=800,
+                  overlap=0.2, workers=2, merge="nms", iou_threshold=0.5, include_full=True):
+    """
+    Detección por tiles para fotos de alta resolución.
+    - Corta la imagen en tiles solapados y los procesa en paralelo (pool de hilos; torch
+      libera el GIL durante la inferencia), cada uno a su resolución nativa.
+    - Pasa las cajas de cada tile a coordenadas globales y las fusiona con NMS por clase
+      o weighted box fusion.
+    - include_full añade una pasada sobre la imagen completa para los objetos grandes.
+
+    Args:
+        img (np.ndarray): imagen en BGR (OpenCV).
+        detector: objeto con `predict(image, box_threshold, text_threshold)`.
+        preprocess (callable): (frame, resolution) -> tensor de entrada del modelo.
+
+    Returns:
+        tuple: (boxes cxcywh normalizadas a la imagen completa, logits, phrases), como `predict`.
+    """
+    height, width = img.shape[:2]
+    tiles = make_tiles(height, width, tile_size, overlap)
+    regions = tiles + ([(0, 0, width, height)] if include_full and len(tiles) > 1 else [])
+
+    def run(region):
+        x0, y0, x1, y1 = region
+        crop = img[y0:y1, x0:x1]
+        resolution = None if region == (0, 0, width, height) else min(crop.shape[:2])
+        with torch.no_grad():
+            boxes, logits, phrases = detector.predict(
+                preprocess(crop, resolution=resolution), box_threshold=box_threshold, text_threshold=text_threshold
+            )
+        # De cxcywh normalizado al tile a xyxy en píxeles de la imagen completa
+        xyxy = cxcywh_to_xyxy(boxes) * np.array([x1 - x0, y1 - y0, x1 - x0, y1 - y0], dtype=np.float32)
+        xyxy += np.array([x0, y0, x0, y0], dtype=np.float32)
+        return xyxy, np.asarray(logits, dtype=np.float32).reshape(-1), list(phrases)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(run, regions))
+
+    boxes = np.concatenate([r[0] for r in results]) if results else np.zeros((0, 4), np.float32)
+    scores = np.concatenate([r[1] for r in results]) if results else np.zeros(0, np.float32)
+    phrases = [p for r in results for p in r[2]]
+
+    if len(phrases):
+        if merge == "wbf":
+            boxes, scores, phrases = weighted_box_fusion(boxes, scores, phrases, iou_threshold)
+        else:
+            keep = class_aware_nms(boxes, scores, phrases, iou_threshold)
+            boxes, scores, phrases = boxes[keep], scores[keep], [phrases[i] for i in keep]
+
+    scale = np.array([width, height, width, height], dtype=np.float32)
+    return torch.from_numpy(xyxy_to_cxcywh(boxes) / scale), torch.from_numpy(np.asarray(scores, dtype=np.float32)), phrases
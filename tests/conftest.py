@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Los módulos se importan como en los scripts: from src.support_... import ...
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
@@ -0,0 +1,102 @@
+import sqlite3
+import threading
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from src.support_dedup import DedupIndex, MinHasher, normalize_text, recipe_shingles
+
+TORTILLA = {
+    "url": "https://a/tortilla",
+    "titulo": "Tortilla de patatas con cebolla",
+    "ingredientes": {"nombre": ["Patatas", "Huevos", "Cebolla", "Aceite de oliva", "Sal"]},
+}
+TORTILLA_COPY = {**TORTILLA, "url": "https://b/tortilla", "titulo": "Tortilla de patatas con cebolla!"}
+GAZPACHO = {
+    "url": "https://a/gazpacho",
+    "titulo": "Gazpacho andaluz",
+    "ingredientes": {"nombre": ["Tomate", "Pepino", "Pimiento", "Ajo", "Pan"]},
+}
+
+
+def test_normalize_and_shingles():
+    assert normalize_text("  Crème  Brûlée, ¡fácil! ") == "creme brulee facil"
+    assert recipe_shingles({"titulo": "Paella", "ingredientes": {"nombre": ["Arroz", ""]}}) == {"t:paella", "i:arroz"}
+    assert recipe_shingles({"titulo": "Paella valenciana"}) == {"t:paella valenciana"}
+
+
+def test_minhash_estimates_jaccard():
+    hasher = MinHasher(num_perm=256)
+    a = {f"s{i}" for i in range(100)}
+    b = {f"s{i}" for i in range(20, 120)}   # Jaccard 80 / 120
+    similarity = (hasher.signature(a) == hasher.signature(b)).mean()
+    assert abs(similarity - 80 / 120) < 0.1
+    assert hasher.signature(set()) is None
+
+
+def test_check_detects_near_duplicates(tmp_path):
+    index = DedupIndex(str(tmp_path / "dedup.sqlite"))
+    assert index.check(TORTILLA) == (None, 0.0)
+    original, similarity = index.check(TORTILLA_COPY)
+    assert original == TORTILLA["url"] and similarity == 1.0
+    assert index.check(GAZPACHO)[0] is None
+    assert index.check(TORTILLA_COPY)[0] == TORTILLA["url"]   # ya registrada como duplicada
+    assert index.stats() == {"originals": 2, "duplicates": 1}
+    index.close()
+
+
+def test_check_without_add_only_matches_indexed_recipes(tmp_path):
+    index = DedupIndex(str(tmp_path / "dedup.sqlite"))
+    assert index.check(TORTILLA, add=False) == (None, 0.0)
+    assert index.check(TORTILLA_COPY, add=False) == (None, 0.0)   # la original aún no está cargada
+    assert index.stats() == {"originals": 0, "duplicates": 0}
+
+    # Se carga el lote con las dos: solo una queda como original
+    assert index.add_many([TORTILLA, TORTILLA_COPY, GAZPACHO]) == 2
+    assert index.add_many([TORTILLA]) == 0
+    assert index.check({**TORTILLA, "url": "https://c/tortilla"}, add=False)[0] == TORTILLA["url"]
+    assert index.stats() == {"originals": 2, "duplicates": 1}
+    index.close()
+
+
+def test_index_persists(tmp_path):
+    path = str(tmp_path / "dedup.sqlite")
+    index = DedupIndex(path)
+    index.add_many([TORTILLA])
+    index.close()
+    index = DedupIndex(path)
+    assert index.check(TORTILLA_COPY)[0] == TORTILLA["url"]
+    index.close()
+
+
+def test_bands_must_divide_num_perm(tmp_path):
+    with pytest.raises(ValueError):
+        DedupIndex(str(tmp_path / "dedup.sqlite"), num_perm=100, bands=16)
+
+
+def test_refuses_an_index_from_another_version(tmp_path):
+    path = str(tmp_path / "dedup.sqlite")
+    DedupIndex(path).close()
+    db = sqlite3.connect(path)
+    db.execute("PRAGMA user_version = 1")
+    db.close()
+    with pytest.raises(ValueError):
+        DedupIndex(path)
+
+
+def test_check_without_add_does_not_wait_for_writers(tmp_path):
+    path = str(tmp_path / "dedup.sqlite")
+    index = DedupIndex(path)
+    index.add_many([TORTILLA])
+    writer = sqlite3.connect(path)
+    writer.execute("BEGIN IMMEDIATE")       # otro proceso escribiendo en el índice
+    results = []
+    reader = threading.Thread(target=lambda: results.append(index.check(GAZPACHO, add=False)))
+    reader.start()
+    reader.join(2)
+    finished = not reader.is_alive()
+    writer.rollback()
+    reader.join()
+    assert finished and results == [(None, 0.0)]
+    index.close()
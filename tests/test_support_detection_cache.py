@@ -0,0 +1,63 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("cv2")
+
+from src.support_detection_cache import DetectionCache, dhash, hamming
+
+
+def gradient(width=64, height=48):
+    row = np.linspace(0, 255, width, dtype=np.uint8)
+    return np.dstack([np.tile(row, (height, 1))] * 3)
+
+
+def test_dhash_is_stable_and_close_for_similar_images():
+    frame = gradient()
+    brighter = np.clip(frame.astype(np.int16) + 3, 0, 255).astype(np.uint8)
+    assert dhash(frame) == dhash(frame.copy())
+    assert hamming(dhash(frame), dhash(brighter)) <= 4
+    assert hamming(dhash(frame), dhash(frame[:, ::-1])) > 4
+
+
+def test_exact_and_near_hits():
+    cache = DetectionCache(max_entries=8, max_distance=4)
+    cache.put("v1", 0b1011, ["tomato"])
+    assert cache.get("v1", 0b1011) == ["tomato"]
+    assert cache.get("v1", 0b1011 ^ (1 << 40) ^ (1 << 3)) == ["tomato"]
+    assert cache.get("v1", 0b1011 ^ 0b11111 << 50) is None
+    assert cache.stats()["hits"] == 2 and cache.stats()["near_hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_nearest_entry_wins():
+    cache = DetectionCache(max_distance=4)
+    cache.put("v1", 0, ["far"])
+    cache.put("v1", 0b111, ["near"])
+    assert cache.get("v1", 0b1111) == ["near"]
+
+
+def test_versions_do_not_share_entries():
+    cache = DetectionCache()
+    cache.put("v1", 42, ["egg"])
+    assert cache.get("v2", 42) is None
+    assert cache.get("v1", 42) == ["egg"]
+
+
+def test_lru_eviction_cleans_the_index():
+    cache = DetectionCache(max_entries=2)
+    a, b, c = 0, 0xFFFFFFFF00000000, 0x00000000FFFFFFFF   # a 32 bits unos de otros
+    cache.put("v1", a, ["a"])
+    cache.put("v1", b, ["b"])
+    cache.get("v1", a)                # "a" pasa a ser la más reciente
+    cache.put("v1", c, ["c"])
+    assert cache.get("v1", b) is None
+    assert cache.get("v1", a) == ["a"]
+    assert cache.stats()["evictions"] == 1 and cache.stats()["size"] == 2
+    assert all(b not in bucket for index in cache._index for bucket in index.values())
+
+
+def test_put_existing_key_replaces_value():
+    cache = DetectionCache(max_entries=2)
+    cache.put("v1", 7, ["old"])
+    cache.put("v1", 7, ["new"])
+    assert cache.get("v1", 7) == ["new"]
+    assert cache.stats()["size"] == 1
@@ -0,0 +1,47 @@
+import pytest
+
+requests = pytest.importorskip("requests")
+
+from src.support_dlq import DeadLetterStore, failure_reason
+from src.support_ratelimit import CircuitOpenError
+
+
+class EdamamError(Exception):
+    status_code = 555
+
+
+def test_failure_reason():
+    assert failure_reason(EdamamError()) == "edamam_555"
+    response = requests.Response()
+    response.status_code = 502
+    assert failure_reason(requests.HTTPError(response=response)) == "http_502"
+    assert failure_reason(CircuitOpenError("deepl", 30)) == "circuit_deepl"
+    assert failure_reason(KeyError("titulo")) == "parse"
+    assert failure_reason(RuntimeError()) == "RuntimeError"
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = DeadLetterStore(str(tmp_path / "journal" / "dead_letters.sqlite"))
+    yield store
+    store.close()
+
+
+def test_put_keeps_one_row_per_url_and_counts_attempts(store):
+    recipe = {"url": "https://a", "titulo": "Tortilla"}
+    store.put(recipe, "enrich", KeyError("x"), journal="shard-0-of-1.sqlite")
+    store.put({**recipe, "titulo": "Tortilla de patatas"}, "load", RuntimeError("boom"))
+    assert store.counts() == [("load", "RuntimeError", 1, 2)]
+    [(payload, journal)] = store.entries()
+    assert payload["titulo"] == "Tortilla de patatas"
+    assert journal == "shard-0-of-1.sqlite"   # se conserva el diario del primer fallo
+
+
+def test_entries_filters_and_remove(store):
+    store.put({"url": "https://a"}, "translate", CircuitOpenError("deepl", 5))
+    store.put({"url": "https://b"}, "enrich", KeyError("x"))
+    store.put({"url": "https://b"}, "enrich", KeyError("x"))
+    assert [p["url"] for p, _ in store.entries(reason="parse")] == ["https://b"]
+    assert [p["url"] for p, _ in store.entries(max_attempts=2)] == ["https://a"]
+    store.remove(["https://a"])
+    assert [p["url"] for p, _ in store.entries()] == ["https://b"]
@@ -0,0 +1,213 @@
+import json
+import threading
+
+import pytest
+
+for module in ("pandas", "supabase", "deep_translator", "inflect", "dotenv"):
+    pytest.importorskip(module)
+
+import src.support_etl as etl
+from src.support_etl import Checkpoint, NutritionCache, get_nutrients_cached
+
+RECIPES = [{"url": f"https://r/{i}", "titulo": f"Receta {i}"} for i in range(6)]
+
+
+@pytest.fixture
+def jsonl(tmp_path):
+    path = tmp_path / "recetas.jsonl"
+    path.write_text("".join(json.dumps(r) + "\n" + ("\n" if i == 2 else "") for i, r in enumerate(RECIPES)),
+                    encoding="utf-8")
+    return str(path)
+
+
+def urls(records):
+    return [record["url"] for record in records]
+
+
+def test_resume_after_out_of_order_marks(jsonl, tmp_path):
+    path = str(tmp_path / "leftoff.json")
+    checkpoint = Checkpoint(path, save_every=1000)
+    records = list(checkpoint.records(jsonl))
+    assert [r["position"] for r in records] == list(range(6))
+    for record in (records[0], records[1], records[3]):
+        checkpoint.mark(record["offset"])
+    checkpoint.save()
+
+    resumed = Checkpoint(path)
+    assert resumed.position == 2
+    assert urls(resumed.records(jsonl)) == ["https://r/2", "https://r/4", "https://r/5"]
+
+
+def test_skip_marks_without_yielding(jsonl, tmp_path):
+    checkpoint = Checkpoint(str(tmp_path / "leftoff.json"))
+    yielded = urls(checkpoint.records(jsonl, skip=lambda r: r["url"].endswith(("1", "4"))))
+    assert yielded == ["https://r/0", "https://r/2", "https://r/3", "https://r/5"]
+    assert checkpoint.position == 0 and len(checkpoint.done) == 2
+    for record in Checkpoint(str(tmp_path / "other.json")).records(jsonl):
+        if record["url"] in yielded:
+            checkpoint.mark(record["offset"])
+    assert checkpoint.position == 6 and checkpoint.done == set()
+
+
+def test_changed_file_is_detected(jsonl, tmp_path):
+    path = str(tmp_path / "leftoff.json")
+    checkpoint = Checkpoint(path)
+    first = next(checkpoint.records(jsonl))
+    checkpoint.mark(first["offset"])
+    checkpoint.save()
+    with open(jsonl, "r+", encoding="utf-8") as file:
+        file.write(json.dumps({"url": "https://otra", "titulo": "Otra"})[:len(json.dumps(RECIPES[0]))])
+    with pytest.raises(ValueError):
+        list(Checkpoint(path).records(jsonl))
+
+
+def test_legacy_format(jsonl, tmp_path):
+    path = tmp_path / "leftoff.json"
+    path.write_text(json.dumps({"Position": 1, "Done": [3]}), encoding="utf-8")
+    checkpoint = Checkpoint(str(path))
+    records = list(checkpoint.records(jsonl))
+    assert urls(records) == ["https://r/2", "https://r/4", "https://r/5"]
+    for record in records:
+        checkpoint.mark(record["offset"])
+    checkpoint.save()
+    saved = json.loads(path.read_text(encoding="utf-8"))
+    assert saved["Position"] == 6 and saved["Done"] == []
+
+
+def test_max_pending_bounds_the_window(jsonl, tmp_path):
+    checkpoint = Checkpoint(str(tmp_path / "leftoff.json"), max_pending=2)
+    records = checkpoint.records(jsonl)
+    first, second = next(records), next(records)
+    got = []
+    reader = threading.Thread(target=lambda: got.append(next(records)))
+    reader.start()
+    reader.join(0.2)
+    assert reader.is_alive() and not got          # espera a que se marque alguna
+    checkpoint.mark(second["offset"])
+    reader.join(0.2)
+    assert reader.is_alive()                      # la más antigua sigue pendiente
+    checkpoint.mark(first["offset"])
+    reader.join(2)
+    assert urls(got) == ["https://r/2"]
+
+
+def test_stop_event_releases_a_full_window(jsonl, tmp_path):
+    checkpoint = Checkpoint(str(tmp_path / "leftoff.json"), max_pending=1)
+    stop = threading.Event()
+    records = checkpoint.records(jsonl, stop_event=stop)
+    next(records)
+    stop.set()
+    assert list(records) == []
+
+
+def test_invalid_lines_are_reported_and_skipped(tmp_path):
+    path = tmp_path / "recetas.jsonl"
+    path.write_bytes(b'{"url": "https://r/0"}\n{"url": "https://r/1", \n[1, 2]\n{"titulo": "Sin url"}\n'
+                     b'\xff\xfe\n{"url": "https://r/2"}\n')
+    checkpoint = Checkpoint(str(tmp_path / "leftoff.json"))
+    invalid = []
+    records = list(checkpoint.records(str(path), on_invalid=lambda offset, line, e: invalid.append(line)))
+    assert urls(records) == ["https://r/0", "https://r/2"]
+    assert len(invalid) == 4
+    for record in records:
+        checkpoint.mark(record["offset"])
+    assert checkpoint.offset == path.stat().st_size and checkpoint.position == 6
+
+    with pytest.raises(ValueError):
+        list(Checkpoint(str(tmp_path / "other.json")).records(str(path)))
+
+
+class EdamamResponse:
+    def __init__(self, status_code, data=None):
+        self.status_code = status_code
+        self.data = data or {}
+
+    def json(self):
+        return self.data
+
+
+# Análisis de cada línea: (foodMatch, peso, kcal, etiquetas); None = Edamam no la interpreta
+LINES = {
+    "100 g rice": ("rice", 100, 130, ["VEGAN", "VEGETARIAN", "GLUTEN_FREE"]),
+    "1 tsp salt": ("salt", 5, 0, ["VEGAN", "VEGETARIAN", "GLUTEN_FREE"]),
+    "2 eggs": ("egg", 100, 140, ["VEGETARIAN", "GLUTEN_FREE"]),
+    "200 g chicken": ("chicken", 200, 330, ["GLUTEN_FREE"]),
+    "a pinch of love": None,
+}
+
+
+@pytest.fixture
+def edamam(monkeypatch):
+    """Edamam de mentira: 555 si alguna línea no se interpreta, y las etiquetas del lote."""
+    sent = []
+
+    def request(ing_list):
+        sent.append(list(ing_list))
+        if any(LINES[line] is None for line in ing_list):
+            return EdamamResponse(555)
+        labels = [l for l in LINES[ing_list[0]][3] if all(l in LINES[line][3] for line in ing_list)]
+        return EdamamResponse(200, {
+            "ingredients": [{"parsed": [{"foodMatch": LINES[line][0], "weight": LINES[line][1],
+                                         "nutrients": {"ENERC_KCAL": {"quantity": LINES[line][2]}}}]}
+                            for line in ing_list],
+            "healthLabels": labels,
+        })
+    monkeypatch.setattr(etl, "request_nutrition_details", request)
+    return sent
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return NutritionCache(str(tmp_path / "nutrition.sqlite"))
+
+
+def test_one_request_per_recipe(edamam, cache):
+    df, summary = get_nutrients_cached(["200 g Chicken", "1 tsp salt"], 2, cache=cache)
+    assert edamam == [["200 g chicken", "1 tsp salt"]]
+    assert list(df["Ingredient"]) == ["chicken", "salt"]
+    assert summary["calories"] == 330 and summary["weight"] == 205 and summary["Serving Size"] == 2
+    assert summary["HealthLabels"] == ["GLUTEN_FREE"]
+
+
+def test_labels_never_come_from_another_recipe(edamam, cache):
+    get_nutrients_cached(["200 g chicken", "1 tsp salt"], 1, cache=cache)
+    # La sal se analizó con el pollo: sus etiquetas no se conocen y se vuelve a pedir con el arroz
+    _, summary = get_nutrients_cached(["100 g rice", "1 tsp salt"], 1, cache=cache)
+    assert edamam[-1] == ["100 g rice", "1 tsp salt"]
+    assert summary["HealthLabels"] == ["VEGAN", "VEGETARIAN", "GLUTEN_FREE"]
+
+
+def test_lines_analysed_alone_keep_exact_labels(edamam, cache):
+    get_nutrients_cached(["2 eggs"], 1, cache=cache)
+    get_nutrients_cached(["100 g rice"], 1, cache=cache)
+    _, summary = get_nutrients_cached(["100 g rice", "2 eggs"], 1, cache=cache)
+    assert len(edamam) == 2                                   # sin petición
+    assert summary["HealthLabels"] == ["VEGETARIAN", "GLUTEN_FREE"]
+    # Solo se pide la línea nueva; las etiquetas se cruzan con las guardadas
+    _, summary = get_nutrients_cached(["100 g rice", "2 eggs", "200 g chicken"], 1, cache=cache)
+    assert edamam[-1] == ["200 g chicken"]
+    assert summary["HealthLabels"] == ["GLUTEN_FREE"]
+    assert cache.stats()["api_calls"] == 3 and cache.stats()["api_calls_saved"] == 1
+
+
+def test_555_is_split_per_line_and_negatively_cached(edamam, cache):
+    df, summary = get_nutrients_cached(["100 g rice", "a pinch of love"], 1, cache=cache)
+    assert edamam == [["100 g rice", "a pinch of love"], ["100 g rice"], ["a pinch of love"]]
+    assert list(df["Ingredient"]) == ["rice"]
+    assert cache.get_many(["a pinch of love"]) == {"a pinch of love": None}
+    # La línea no interpretable ya no se envía ni hace fallar otras recetas
+    _, summary = get_nutrients_cached(["2 eggs", "a pinch of love"], 1, cache=cache)
+    assert edamam[-1] == ["2 eggs"]
+    assert summary["HealthLabels"] == ["VEGETARIAN", "GLUTEN_FREE"]
+    assert get_nutrients_cached(["a pinch of love"], 1, cache=cache) == (555, 555)
+    assert len(edamam) == 4
+
+
+def test_errors_keep_what_was_already_analysed(monkeypatch, cache):
+    responses = iter([EdamamResponse(555), EdamamResponse(200, {
+        "ingredients": [{"parsed": [{"foodMatch": "rice", "weight": 100, "nutrients": {}}]}],
+        "healthLabels": ["VEGAN"]}), EdamamResponse(503)])
+    monkeypatch.setattr(etl, "request_nutrition_details", lambda ing_list: next(responses))
+    assert get_nutrients_cached(["100 g rice", "2 eggs"], 1, cache=cache) == (503, 503)
+    assert cache.get_many(["100 g rice"])["100 g rice"]["healthLabels"] == ["VEGAN"]
+    assert cache.get_many(["2 eggs"]) == {}
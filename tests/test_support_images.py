@@ -0,0 +1,163 @@
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+pytest.importorskip("requests")
+
+from src.support_images import find_image_url, find_image_urls, backfill_images, update_image_urls, make_session
+
+BIG_BODY = 2 * 1024 * 1024
+
+PAGES = {
+    "/og": '<html><head><meta property="og:image" content="/img/og.jpg"></head>'
+           '<body><img src="/img/other.jpg"></body></html>',
+    "/img": '<html><head><title>Receta</title></head><body><p>Paso 1</p><img src="fotos/plato.png"></body></html>',
+    "/none": "<html><head></head><body><p>Sin imagen</p></body></html>",
+}
+
+
+class PageHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path == "/big":
+            head = b'<html><head><meta property="og:image" content="https://cdn.example.com/big.jpg"></head><body>'
+            self._send(head, BIG_BODY)
+            return
+        page = PAGES.get(path)
+        if page is None:
+            self.send_error(404)
+            return
+        self._send(page.encode("utf-8"))
+
+    def _send(self, head, padding=0):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(head) + padding))
+        self.end_headers()
+        written = 0
+        try:
+            self.wfile.write(head)
+            written += len(head)
+            chunk = b"<p>" + b"x" * 8185 + b"</p>"
+            while written < len(head) + padding:
+                self.wfile.write(chunk[:len(head) + padding - written])
+                written += min(len(chunk), len(head) + padding - written)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # el cliente deja de leer en cuanto encuentra la imagen
+
+
+@pytest.fixture(scope="module")
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), PageHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def session():
+    with make_session(4, retries=0) as s:
+        yield s
+
+
+def test_og_image_wins_and_is_absolute(server, session):
+    image, n_bytes = find_image_url(session, f"{server}/og")
+    assert image == f"{server}/img/og.jpg"
+    assert n_bytes > 0
+
+
+def test_img_fallback_resolved_against_page(server, session):
+    image, _ = find_image_url(session, f"{server}/img")
+    assert image == f"{server}/fotos/plato.png"
+
+
+def test_page_without_image(server, session):
+    assert find_image_url(session, f"{server}/none")[0] is None
+
+
+def test_streaming_stops_after_the_tag(server, session):
+    image, n_bytes = find_image_url(session, f"{server}/big", chunk_size=4096)
+    assert image == "https://cdn.example.com/big.jpg"
+    assert n_bytes <= 4 * 4096
+    assert n_bytes < BIG_BODY
+
+
+def test_max_bytes_caps_the_download(server, session):
+    PAGES["/late"] = "<html><body>" + "<p>relleno</p>" * 5000 + '<img src="/tarde.jpg"></body></html>'
+    image, n_bytes = find_image_url(session, f"{server}/late", chunk_size=1024, max_bytes=8 * 1024)
+    assert image is None
+    assert n_bytes == 8 * 1024
+
+
+def test_find_image_urls_reports_errors(server):
+    results = {url: (image, error) for url, image, _, error in
+               find_image_urls([f"{server}/og", f"{server}/missing", f"{server}/none"], workers=2)}
+    assert results[f"{server}/og"] == (f"{server}/img/og.jpg", None)
+    assert results[f"{server}/none"] == (None, None)
+    assert results[f"{server}/missing"][1] is not None
+
+
+class FakeQuery:
+    def __init__(self, client, table):
+        self.client = client
+        self.table = table
+        self.calls = []
+
+    def __getattr__(self, name):
+        def method(*args, **kwargs):
+            self.calls.append((name, args, kwargs) if kwargs else (name, args))
+            return self
+        return method
+
+    def execute(self):
+        self.client.executed.append((self.table, self.calls))
+        ranges = [call[1] for call in self.calls if call[0] == "range"]
+        if ranges:
+            start, end = ranges[0]
+            return type("Response", (), {"data": self.client.rows[start:end + 1]})()
+        urls = [call[1][1] for call in self.calls if call[0] == "in_"]
+        if urls:
+            return type("Response", (), {"data": [dict(row) for row in self.client.rows if row["url"] in urls[0]]})()
+        return type("Response", (), {"data": []})()
+
+
+class FakeSupabase:
+    def __init__(self, urls):
+        self.rows = [{"url": url} for url in urls]
+        self.executed = []
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+
+def test_backfill_pages_urls_and_writes_in_batches(server):
+    urls = [f"{server}/og", f"{server}/img", f"{server}/none", f"{server}/og?b", f"{server}/img?b", f"{server}/big"]
+    batches = []
+    stats = backfill_images(FakeSupabase(urls), workers=2, batch_size=2, page_size=4, write=batches.append)
+    assert [len(b) for b in batches] == [2, 2, 1]
+    written = {row["url"]: row["img_url"] for batch in batches for row in batch}
+    assert set(written) == set(urls) - {f"{server}/none"}
+    assert written[f"{server}/img?b"] == f"{server}/fotos/plato.png"
+    assert stats["pages"] == 6 and stats["found"] == 5 and stats["errors"] == 0
+
+
+def test_update_image_urls_upserts_complete_rows_in_one_request():
+    supabase = FakeSupabase(["https://a", "https://b", "https://c"])
+    for i, row in enumerate(supabase.rows):
+        row.update(id=i, name=f"Receta {i}", img_url=None)
+    update_image_urls(supabase, [{"url": "https://a", "img_url": "https://a.jpg"},
+                                 {"url": "https://c", "img_url": "https://c.jpg"},
+                                 {"url": "https://borrada", "img_url": "https://x.jpg"}], chunk_size=2)
+    reads = [calls for _, calls in supabase.executed if calls[0][0] == "select"]
+    assert [calls[1] for calls in reads] == [("in_", ("url", ["https://a", "https://c"])),
+                                             ("in_", ("url", ["https://borrada"]))]
+    [(table, [(_, (rows,), options)])] = [(t, calls) for t, calls in supabase.executed if calls[0][0] == "upsert"]
+    assert table == "recipes" and options == {"on_conflict": "url"}
+    assert rows == [{"url": "https://a", "id": 0, "name": "Receta 0", "img_url": "https://a.jpg"},
+                    {"url": "https://c", "id": 2, "name": "Receta 2", "img_url": "https://c.jpg"}]
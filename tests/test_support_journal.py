@@ -0,0 +1,42 @@
+from src.support_journal import ShardJournal, shard_of, shard_path, journal_path, STAGES
+
+
+def test_shard_of_is_stable_and_in_range():
+    urls = [f"https://recetas.example.com/{i}" for i in range(200)]
+    shards = [shard_of(url, 4) for url in urls]
+    assert shards == [shard_of(url, 4) for url in urls]
+    assert set(shards) == {0, 1, 2, 3}
+
+
+def test_shard_paths():
+    assert shard_path("data/dap_leftoff.json", 0, 1) == "data/dap_leftoff.json"
+    assert shard_path("data/dap_leftoff.json", 1, 4) == "data/dap_leftoff.shard-1-of-4.json"
+    assert journal_path("etl_journal", 2, 4).endswith("shard-2-of-4.sqlite")
+
+
+def test_stages_and_counts(tmp_path):
+    journal = ShardJournal(str(tmp_path / "journal" / "shard-0-of-1.sqlite"))
+    assert journal.stage("https://a") is None
+    journal.set_stage("https://a", "translated")
+    assert not journal.is_final("https://a")
+    journal.set_many(["https://a", "https://b"], "loaded")
+    journal.set_stage("https://c", "failed")
+    assert journal.stage("https://a") == "loaded" and journal.is_final("https://a")
+    counts = journal.counts()
+    assert set(counts) == set(STAGES)
+    assert counts["loaded"] == 2 and counts["failed"] == 1 and counts["translated"] == 0
+    assert journal.throughput(window=60) == 3
+    assert journal.last_update() is not None
+    journal.close()
+
+
+def test_readonly_journal_sees_the_writer(tmp_path):
+    path = str(tmp_path / "shard-0-of-2.sqlite")
+    writer = ShardJournal(path)
+    writer.set_stage("https://a", "duplicate")
+    reader = ShardJournal(path, readonly=True)
+    assert reader.counts()["duplicate"] == 1
+    writer.set_stage("https://b", "skipped")
+    assert reader.counts()["skipped"] == 1
+    reader.close()
+    writer.close()
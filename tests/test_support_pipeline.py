@@ -0,0 +1,102 @@
+import time
+import threading
+
+import pytest
+
+from src.support_pipeline import Stage, run_pipeline
+
+
+def test_every_item_goes_through_all_stages():
+    done = []
+    # on_done recibe la entrada de la etapa en la que termina el elemento
+    run_pipeline(range(50), [Stage("double", lambda x: x * 2, workers=3), Stage("inc", lambda x: x + 1, workers=2)],
+                 on_done=lambda item, result: done.append((item, result)))
+    assert sorted(done) == [(i * 2, i * 2 + 1) for i in range(50)]
+
+
+def test_stage_concurrency_is_bounded():
+    active, peak = [0], [0]
+    lock = threading.Lock()
+
+    def slow(x):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.01)
+        with lock:
+            active[0] -= 1
+        return x
+
+    run_pipeline(range(30), [Stage("slow", slow, workers=3, queue_size=2)])
+    assert peak[0] == 3
+
+
+def test_none_result_drops_the_item():
+    seen, done = [], []
+    stages = [Stage("filter", lambda x: x if x % 2 else None), Stage("collect", lambda x: seen.append(x) or x)]
+    run_pipeline(range(6), stages, on_done=lambda item, result: done.append((item, result)))
+    assert sorted(seen) == [1, 3, 5]
+    assert sorted(done) == [(0, None), (1, 1), (2, None), (3, 3), (4, None), (5, 5)]
+
+
+def test_errors_are_reported_and_the_item_is_dropped():
+    errors, done = [], []
+
+    def parse(x):
+        if x == 3:
+            raise ValueError("mal")
+        return x
+
+    run_pipeline(range(5), [Stage("parse", parse)], on_done=lambda item, result: done.append(item),
+                 on_error=lambda item, stage, e: errors.append((item, stage, type(e))))
+    assert errors == [(3, "parse", ValueError)]
+    assert sorted(done) == [0, 1, 2, 4]
+
+
+def test_stop_event_stops_reading_and_skips_queued_items():
+    stop = threading.Event()
+    processed = []
+
+    def first(x):
+        if x == 2:
+            stop.set()
+        return x
+
+    run_pipeline(iter(range(1000)), [Stage("first", first, queue_size=1), Stage("last", processed.append)],
+                 stop_event=stop)
+    assert len(processed) < 10
+
+
+def test_drain_on_stop_finishes_items_already_passed_on():
+    stop = threading.Event()
+    released = threading.Event()
+    loaded = []
+
+    def transform(x):
+        if x == 5:
+            stop.set()
+            released.set()
+        return x
+
+    def load(x):
+        released.wait(1)      # todo lo anterior a la parada está ya en la cola de la carga
+        loaded.append(x)
+        return x
+
+    run_pipeline(range(100), [Stage("transform", transform, queue_size=10),
+                              Stage("load", load, queue_size=10, drain_on_stop=True)], stop_event=stop)
+    assert set(range(6)) <= set(loaded)
+
+
+def test_failing_input_still_finishes_what_was_read():
+    processed = []
+
+    def items():
+        yield from range(5)
+        raise ValueError("línea no válida")
+
+    with pytest.raises(ValueError):
+        run_pipeline(items(), [Stage("slow", lambda x: time.sleep(0.01) or x, workers=2),
+                               Stage("collect", processed.append)])
+    assert sorted(processed) == list(range(5))
+    assert not any(t.name.startswith(("slow-", "collect-")) for t in threading.enumerate())
@@ -0,0 +1,155 @@
+import time
+
+import pytest
+
+from src.support_ratelimit import RateLimiter, CircuitOpenError, exception_status, retry_after_seconds
+
+
+class Response:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def make_limiter(**kwargs):
+    options = dict(rate=1000, burst=1000, base_backoff=0.001, max_backoff=0.001, cooldown=60)
+    options.update(kwargs)
+    return RateLimiter("test", **options)
+
+
+def scripted(*outcomes):
+    """Función que devuelve (o lanza) cada resultado por turno y cuenta las llamadas."""
+    outcomes = list(outcomes)
+
+    def func():
+        func.calls += 1
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+    func.calls = 0
+    return func
+
+
+def test_retry_after_seconds():
+    assert retry_after_seconds({"Retry-After": "3"}) == 3.0
+    assert retry_after_seconds({"X-RateLimit-Reset": "-1"}) == 0.0
+    assert retry_after_seconds({}) is None
+    assert retry_after_seconds({"Retry-After": "pronto"}) is None
+    reset = retry_after_seconds({"X-RateLimit-Reset": str(int(time.time()) + 30)})   # instante epoch
+    assert 28 <= reset <= 30
+    assert retry_after_seconds({"X-RateLimit-Reset": str(int(time.time()) - 30)}) == 0.0
+
+
+def test_retry_after_is_capped_at_max_backoff():
+    limiter = make_limiter(max_backoff=0.05)
+    far = str(int(time.time()) + 10 ** 9)
+    func = scripted(Response(429, {"X-RateLimit-Reset": far}), Response(503, {"Retry-After": "3600"}), Response(200))
+    start = time.monotonic()
+    assert limiter.call(func).status_code == 200
+    assert time.monotonic() - start < 1
+
+
+def test_exception_status():
+    assert exception_status(StatusError(429)) == 429
+    error = Exception()
+    error.response = Response(503)
+    assert exception_status(error) == 503
+    error = Exception()
+    error.code = "502"
+    assert exception_status(error) == 502
+    error.code = "PGRST116"
+    assert exception_status(error) is None
+    assert exception_status(ValueError()) is None
+
+
+def test_retries_server_errors_until_success():
+    limiter = make_limiter()
+    func = scripted(Response(503), Response(500), Response(200))
+    assert limiter.call(func).status_code == 200
+    assert func.calls == 3 and limiter.retries == 2
+
+
+def test_returns_last_error_response_after_max_retries():
+    limiter = make_limiter(max_retries=2, failure_threshold=10)
+    func = scripted(*[Response(503)] * 3)
+    assert limiter.call(func).status_code == 503
+    assert func.calls == 3
+
+
+def test_ok_statuses_are_not_retried_nor_failures():
+    limiter = make_limiter(ok_statuses=(555,), failure_threshold=1)
+    assert limiter.call(scripted(Response(555))).status_code == 555
+    assert limiter.stats()["circuit"] == "closed"
+
+
+def test_throttling_halves_the_rate_and_honours_retry_after():
+    limiter = make_limiter(rate=8, burst=8, min_rate=1, max_backoff=1)
+    func = scripted(Response(429, {"Retry-After": "0.05"}), Response(200))
+    start = time.monotonic()
+    assert limiter.call(func).status_code == 200
+    assert time.monotonic() - start >= 0.05
+    assert limiter.throttled == 1
+    assert limiter.rate == pytest.approx(4 + 8 / 20)
+
+
+def test_exceptions_with_a_status_are_retried():
+    limiter = make_limiter()
+    func = scripted(StatusError(429), StatusError(503), "ok")
+    assert limiter.call(func) == "ok"
+    assert func.calls == 3 and limiter.throttled == 1
+
+
+def test_other_exceptions_are_raised_without_retrying():
+    limiter = make_limiter()
+    func = scripted(KeyError("falta"), "ok")
+    with pytest.raises(KeyError):
+        limiter.call(func)
+    assert func.calls == 1
+
+
+def test_custom_error_status():
+    limiter = make_limiter(error_status=lambda e: 429 if isinstance(e, LookupError) else None)
+    func = scripted(LookupError(), "ok")
+    assert limiter.call(func) == "ok"
+    assert limiter.throttled == 1
+
+
+def test_circuit_opens_and_a_single_probe_closes_it():
+    limiter = make_limiter(failure_threshold=2, max_retries=0, cooldown=0.05)
+    for _ in range(2):
+        limiter.call(scripted(Response(503)))
+    assert limiter.stats()["circuit"] == "open"
+    func = scripted("ok")
+    with pytest.raises(CircuitOpenError):
+        limiter.call(func)
+    assert func.calls == 0
+
+    time.sleep(0.06)
+    assert limiter.call(func) == "ok"
+    assert limiter.stats()["circuit"] == "closed"
+
+
+def test_failed_probe_reopens_the_circuit():
+    limiter = make_limiter(failure_threshold=1, max_retries=0, cooldown=0.05)
+    limiter.call(scripted(Response(503)))
+    time.sleep(0.06)
+    limiter.call(scripted(Response(503)))
+    with pytest.raises(CircuitOpenError):
+        limiter.call(scripted("ok"))
+
+
+def test_probe_is_released_when_it_raises():
+    limiter = make_limiter(failure_threshold=1, max_retries=0, cooldown=0.05)
+    limiter.call(scripted(Response(503)))
+    time.sleep(0.06)
+    with pytest.raises(KeyError):
+        limiter.call(scripted(KeyError("falta")))
+    time.sleep(0.06)
+    assert limiter.call(scripted("ok")) == "ok"   # no se queda "probando" para siempre
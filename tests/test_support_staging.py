@@ -0,0 +1,100 @@
+import os
+import time
+
+import pytest
+
+pd = pytest.importorskip("pandas")
+pytest.importorskip("pyarrow")
+
+from src.support_staging import (StagingWriter, read_table, read_rows, compact_partition, compact_staging,
+                                 table_files, staging_version)
+
+
+def write_recipe(writer, url, name, ingredients):
+    writer.write({
+        "recipes": [{"url": url, "name": name}],
+        "recipe_ingredients": [{"url": url, "ingredient": ingredient} for ingredient in ingredients],
+        "steps": [],
+    })
+    time.sleep(0.001)   # staged_at distinto entre lotes
+
+
+@pytest.fixture
+def staging(tmp_path):
+    staging_dir = str(tmp_path / "staging")
+    first = StagingWriter(staging_dir, "shard=0", compact_every=0)
+    second = StagingWriter(staging_dir, "shard=1", compact_every=0)
+    write_recipe(first, "https://a", "Tortilla", ["huevo", "patata"])
+    write_recipe(second, "https://b", "Gazpacho", ["tomate"])
+    write_recipe(second, "https://a", "Tortilla de patatas", ["huevo", "patata", "cebolla"])
+    return staging_dir
+
+
+def test_read_table_keeps_the_latest_version(staging):
+    recipes = read_table(staging, "recipes")
+    assert dict(zip(recipes["url"], recipes["name"])) == {"https://a": "Tortilla de patatas", "https://b": "Gazpacho"}
+    assert "staged_at" not in recipes.columns
+
+    ingredients = read_table(staging, "recipe_ingredients", columns=["url", "ingredient"])
+    assert sorted(map(tuple, ingredients.values.tolist())) == [
+        ("https://a", "cebolla"), ("https://a", "huevo"), ("https://a", "patata"), ("https://b", "tomate")]
+    assert list(ingredients.columns) == ["url", "ingredient"]
+
+
+def test_missing_table_is_empty(staging):
+    assert read_table(staging, "tags", columns=["url", "name"]).empty
+    assert read_rows(staging)["tags"] == []
+
+
+def test_compaction_keeps_the_result(staging):
+    before = {table: read_table(staging, table).sort_values(list(read_table(staging, table).columns))
+              .reset_index(drop=True) for table in ("recipes", "recipe_ingredients")}
+    assert len(table_files(staging, "recipes")) == 3
+    removed = compact_staging(staging)
+    assert removed["recipes"] == 2          # shard=1 tenía dos ficheros; shard=0 solo uno
+    assert len(table_files(staging, "recipes")) == 2
+    for table, df in before.items():
+        after = read_table(staging, table).sort_values(list(df.columns)).reset_index(drop=True)
+        assert after.equals(df)
+
+
+def test_reader_during_compaction_sees_no_duplicates(staging):
+    # Estado intermedio: el fichero compactado ya está escrito y los viejos aún no se han borrado
+    directory = os.path.join(staging, "recipe_ingredients", "shard=1")
+    old = set(os.listdir(directory))
+    compact_partition(directory, "recipe_ingredients")
+    new = set(os.listdir(directory))
+    assert len(new) == 1 and not new & old
+    assert len(read_table(staging, "recipe_ingredients")) == 4
+
+
+def test_writer_compacts_its_partition(tmp_path):
+    staging_dir = str(tmp_path / "staging")
+    writer = StagingWriter(staging_dir, compact_every=3)
+    for i in range(7):
+        write_recipe(writer, f"https://{i}", f"Receta {i}", ["sal"])
+    assert len(table_files(staging_dir, "recipes")) == 2
+    assert len(read_table(staging_dir, "recipes")) == 7
+
+
+def test_staging_version_changes_with_new_files(staging):
+    version = staging_version(staging, ("recipes",))
+    assert version[0] == 3
+    assert staging_version(staging, ("recipes",)) == version
+    write_recipe(StagingWriter(staging, "shard=2"), "https://c", "Paella", ["arroz"])
+    assert staging_version(staging, ("recipes",)) != version
+
+
+def test_retransform_without_child_rows_hides_the_old_ones(staging):
+    # La receta vuelve a transformarse en otra partición y ya no tiene ingredientes ni pasos
+    write_recipe(StagingWriter(staging, "shard=dlq", compact_every=0), "https://a", "Tortilla", [])
+    ingredients = read_table(staging, "recipe_ingredients", columns=["url", "ingredient"])
+    assert ingredients.values.tolist() == [["https://b", "tomate"]]
+
+    compact_staging(staging)
+    directory = os.path.join(staging, "recipe_ingredients", "shard=1")
+    assert len(os.listdir(directory)) == 1
+    assert read_table(staging, "recipe_ingredients", columns=["url", "ingredient"]).values.tolist() == \
+        [["https://b", "tomate"]]
+    compacted = pd.read_parquet(os.path.join(directory, os.listdir(directory)[0]))
+    assert compacted["url"].tolist() == ["https://b"]        # la compactación ya no las guarda
@@ -0,0 +1,42 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("torch")
+
+from src.support_tiling import make_tiles, iou_matrix, class_aware_nms, weighted_box_fusion
+
+
+def test_tiles_cover_the_image_and_touch_the_border():
+    tiles = make_tiles(1000, 1800, tile_size=800, overlap=0.2)
+    assert all(x1 - x0 <= 800 and y1 - y0 <= 800 for x0, y0, x1, y1 in tiles)
+    assert max(x1 for _, _, x1, _ in tiles) == 1800
+    assert max(y1 for _, _, _, y1 in tiles) == 1000
+    assert make_tiles(600, 700, tile_size=800) == [(0, 0, 700, 600)]
+
+
+def test_iou_matrix():
+    a = np.array([[0, 0, 10, 10]], dtype=np.float32)
+    b = np.array([[0, 0, 10, 10], [5, 0, 15, 10], [20, 20, 30, 30]], dtype=np.float32)
+    np.testing.assert_allclose(iou_matrix(a, b)[0], [1.0, 50 / 150, 0.0], rtol=1e-6)
+
+
+def test_nms_only_suppresses_within_the_same_phrase():
+    boxes = np.array([[0, 0, 10, 10], [1, 0, 11, 10], [0, 0, 10, 10], [50, 50, 60, 60]], dtype=np.float32)
+    scores = np.array([0.6, 0.9, 0.7, 0.5], dtype=np.float32)
+    phrases = ["tomato", "tomato", "onion", "tomato"]
+    assert class_aware_nms(boxes, scores, phrases, iou_threshold=0.5) == [1, 2, 3]
+
+
+def test_wbf_fuses_overlapping_boxes_of_the_same_phrase():
+    boxes = np.array([[0, 0, 10, 10], [2, 0, 12, 10], [0, 0, 10, 10]], dtype=np.float32)
+    scores = np.array([0.75, 0.25, 0.4], dtype=np.float32)
+    fused, fused_scores, fused_phrases = weighted_box_fusion(boxes, scores, ["egg", "egg", "milk"], iou_threshold=0.5)
+    assert fused_phrases == ["egg", "milk"]
+    np.testing.assert_allclose(fused_scores, [0.5, 0.4])
+    np.testing.assert_allclose(fused[0], [0.5, 0, 10.5, 10])   # media ponderada por score
+    np.testing.assert_allclose(fused[1], [0, 0, 10, 10])
+
+
+def test_wbf_without_boxes():
+    fused, scores, phrases = weighted_box_fusion(np.zeros((0, 4), np.float32), np.zeros(0, np.float32), [])
+    assert fused.shape == (0, 4) and len(scores) == 0 and phrases == []